@@ -0,0 +1,325 @@
+"""Authorized Google accounts: persisted OAuth tokens, automatic refresh and per-account quota.
+
+Every operator authorizes once through `/auth/start`. The account is stored in
+`storage.ACCOUNTS_FILE` (mode 0600), keyed by its YouTube channel id, together with:
+
+- the refresh token, the current access token and its expiry;
+- the account's cached subscription list and when it was read;
+- the Data API units spent today.
+
+- `access_token(id)` refreshes the token (refresh_token grant) shortly before it expires. If
+  Google rejects the refresh token (revoked or expired consent), the account is marked with an
+  `error` and skipped until the operator authorizes it again.
+- `charge(id, units)` records quota spent. `remaining(id)` is what is left of
+  ACCOUNT_DAILY_QUOTA today (the Data API day starts at midnight Pacific time). Charges are
+  kept in memory and added to the stored counters by `flush()`, not on every call.
+- `pick(ids)` chooses who pays for a call: the usable account with the most quota left.
+
+Several instances (monitor shards) may share the file. Every write is a read-modify-write of
+the accounts it touches under a file lock (`storage.update_accounts`), so one instance never
+overwrites another's tokens, subscription lists, errors or new accounts. Each instance re-reads
+the file whenever it changed, so an account authorized on one instance reaches every shard.
+
+Google enforces the Data API quota per Cloud project, not per account. The per-account budget
+keeps one operator's subscriptions from using up everyone's polling.
+"""
+import calendar
+import hashlib
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+from .config import ACCOUNT_DAILY_QUOTA, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, YOUTUBE_API_BASE
+from . import storage
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+# refresh access tokens this long before they expire
+REFRESH_MARGIN_SECONDS = 120
+# fields never returned by `list_accounts`
+SECRET_FIELDS = ("access_token", "refresh_token")
+
+_lock = threading.RLock()
+_accounts = None  # account id -> record: this instance's view of the stored accounts
+_stamp = None  # storage.accounts_stamp() of the file `_accounts` was read from
+_charged = {}  # (account id, quota day) -> units charged here and not yet flushed
+_refreshing = {}  # account id -> lock held while its token is refreshed
+
+
+def _load() -> dict:
+    """The stored accounts, re-read whenever the file changed (on this or another instance),
+    plus the charges not flushed yet."""
+    global _accounts, _stamp
+    stamp = storage.accounts_stamp()
+    if _accounts is None or stamp != _stamp:
+        _accounts, _stamp = storage.get_accounts(), stamp
+        for (account_id, day), units in _charged.items():
+            if account_id in _accounts:
+                _add_used(_accounts[account_id], day, units)
+    return _accounts
+
+
+def _update(account_id: str, change: Callable[[dict], None], create: bool = False) -> Optional[dict]:
+    """Apply `change` to the stored record of `account_id` (a new one with `create`) and write
+    it back; other accounts are left as stored. Returns the updated record, or None if there
+    is no such account."""
+    global _accounts
+    out = []
+
+    def apply(accounts):
+        acct = accounts.setdefault(account_id, {"added": time.time()}) if create else accounts.get(account_id)
+        if acct is not None:
+            change(acct)
+            out.append(acct)
+
+    storage.update_accounts(apply)
+    # re-read on next use, with the unflushed charges on top
+    _accounts = None
+    return out[0] if out else None
+
+
+def quota_day(now: float = None) -> str:
+    """The Data API quota day (resets at midnight America/Los_Angeles)."""
+    from zoneinfo import ZoneInfo
+
+    return datetime.fromtimestamp(now or time.time(), ZoneInfo("America/Los_Angeles")).strftime("%Y-%m-%d")
+
+
+def _epoch(expiry) -> Optional[float]:
+    # google-auth credentials carry a naive UTC datetime
+    if expiry is None:
+        return None
+    if isinstance(expiry, (int, float)):
+        return float(expiry)
+    return float(calendar.timegm(expiry.utctimetuple()))
+
+
+def _identify(token: str) -> dict:
+    """Channel id and title of the account behind `token` (channels.list mine=true, 1 unit)."""
+    import requests
+
+    r = requests.get(f"{YOUTUBE_API_BASE}/channels", params={"part": "snippet", "mine": "true"},
+                     headers={"Authorization": f"Bearer {token}"}, timeout=30)
+    r.raise_for_status()
+    items = r.json().get("items", [])
+    if not items:
+        return {}
+    return {"id": items[0]["id"], "title": items[0].get("snippet", {}).get("title")}
+
+
+def add_account(token: str, refresh_token: str = None, expiry=None, scopes: Iterable[str] = ()) -> dict:
+    """Store (or update) the account that just authorized. Returns its public record."""
+    who = _identify(token)
+    account_id = who.get("id")
+    if not account_id:
+        # a Google account without a YouTube channel: key it by its refresh token
+        account_id = "acct-" + hashlib.sha1((refresh_token or token).encode()).hexdigest()[:12]
+
+    def change(acct):
+        acct.update(
+            title=who.get("title") or acct.get("title"),
+            access_token=token,
+            expiry=_epoch(expiry),
+            scopes=list(scopes or []),
+            error=None,
+        )
+        # Google only sends a refresh token on first consent: keep the one we have
+        if refresh_token:
+            acct["refresh_token"] = refresh_token
+        # the channels.list call above
+        _add_used(acct, quota_day(), 1)
+
+    with _lock:
+        return _public(account_id, _update(account_id, change, create=True))
+
+
+def remove_account(account_id: str) -> bool:
+    global _accounts
+    removed = []
+    with _lock:
+        storage.update_accounts(lambda accounts: removed.append(accounts.pop(account_id, None)))
+        _accounts = None
+        return removed[0] is not None
+
+
+def _public(account_id: str, acct: dict) -> dict:
+    out = {k: v for k, v in acct.items() if k not in SECRET_FIELDS and k != "channels"}
+    out.update(id=account_id, subscriptions=len(acct.get("channels") or []), remaining=_remaining(acct))
+    return out
+
+
+def list_accounts() -> List[dict]:
+    """Public view of every account (no tokens)."""
+    with _lock:
+        return [_public(k, v) for k, v in sorted(_load().items())]
+
+
+def account_ids(usable: bool = True) -> List[str]:
+    """Ids of all accounts; with `usable`, only those without an auth error."""
+    with _lock:
+        return [k for k, v in sorted(_load().items()) if not (usable and v.get("error"))]
+
+
+# --- tokens --------------------------------------------------------------------
+
+
+def _refresh(refresh_token: str) -> dict:
+    """Token endpoint response for a refresh_token grant. Runs without `_lock` held."""
+    import requests
+
+    r = requests.post(TOKEN_URI, data={
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "refresh_token": refresh_token,
+        "grant_type": "refresh_token",
+    }, timeout=30)
+    if r.status_code in (400, 401):
+        # invalid_grant: consent revoked or refresh token expired
+        raise PermissionError(f"token refresh rejected: {r.text[:200]}")
+    r.raise_for_status()
+    return r.json()
+
+
+def _usable(account_id: str) -> dict:
+    acct = _load().get(account_id)
+    if acct is None:
+        raise KeyError(account_id)
+    if acct.get("error"):
+        raise RuntimeError(f"account {account_id}: {acct['error']}")
+    return acct
+
+
+def _due(acct: dict) -> bool:
+    expiry = acct.get("expiry")
+    return not acct.get("access_token") or bool(expiry and expiry - REFRESH_MARGIN_SECONDS < time.time())
+
+
+def _fail(account_id: str, error: str):
+    _update(account_id, lambda acct: acct.update(error=error))
+    raise RuntimeError(f"account {account_id}: {error}")
+
+
+def access_token(account_id: str, force_refresh: bool = False) -> str:
+    """A valid access token for `account_id`, refreshed first if it is (about to be) expired.
+
+    The token endpoint is called without `_lock` held, so a slow refresh doesn't stall other
+    accounts; a per-account guard makes concurrent callers wait for one refresh instead of
+    each starting their own."""
+    with _lock:
+        acct = _usable(account_id)
+        if not force_refresh and not _due(acct):
+            return acct["access_token"]
+        stale = acct.get("access_token")
+        guard = _refreshing.setdefault(account_id, threading.Lock())
+    with guard:
+        with _lock:
+            acct = _usable(account_id)
+            if acct.get("access_token") != stale and not _due(acct):
+                # refreshed by another caller while we waited
+                return acct["access_token"]
+            if not acct.get("refresh_token"):
+                _fail(account_id, "no refresh token: authorize the account again")
+            refresh_token = acct["refresh_token"]
+        try:
+            data = _refresh(refresh_token)
+        except PermissionError as e:
+            with _lock:
+                _fail(account_id, str(e))
+        with _lock:
+            _update(account_id, lambda acct: acct.update(
+                access_token=data["access_token"], expiry=time.time() + float(data.get("expires_in", 3600)),
+            ))
+            return data["access_token"]
+
+
+def headers(account_id: str, force_refresh: bool = False) -> dict:
+    return {"Authorization": f"Bearer {access_token(account_id, force_refresh)}"}
+
+
+# --- quota ---------------------------------------------------------------------
+
+
+def _used(acct: dict) -> int:
+    quota = acct.get("quota") or {}
+    return quota.get("used", 0) if quota.get("day") == quota_day() else 0
+
+
+def _remaining(acct: dict) -> int:
+    return max(0, ACCOUNT_DAILY_QUOTA - _used(acct))
+
+
+def _add_used(acct: dict, day: str, units: int):
+    quota = acct.get("quota") or {}
+    if quota.get("day") == day:
+        acct["quota"] = {"day": day, "used": quota.get("used", 0) + units}
+    elif day > quota.get("day", ""):
+        acct["quota"] = {"day": day, "used": units}
+
+
+def charge(account_id: str, units: int = 1):
+    """Record `units` Data API units spent by `account_id` (persisted by `flush`)."""
+    with _lock:
+        acct = _load().get(account_id)
+        if acct is not None:
+            key = (account_id, quota_day())
+            _charged[key] = _charged.get(key, 0) + units
+            _add_used(acct, key[1], units)
+
+
+def remaining(account_id: str) -> int:
+    with _lock:
+        acct = _load().get(account_id)
+        return _remaining(acct) if acct is not None else 0
+
+
+def pick(ids: Iterable[str] = None, units: int = 1) -> Optional[str]:
+    """The usable account (among `ids`, default all) with the most quota left, if any has `units`."""
+    with _lock:
+        accounts = _load()
+        best, left = None, units - 1
+        for account_id in (accounts if ids is None else ids):
+            acct = accounts.get(account_id)
+            if acct is None or acct.get("error"):
+                continue
+            r = _remaining(acct)
+            if r > left:
+                best, left = account_id, r
+        return best
+
+
+def flush():
+    """Add the units charged since the last flush to the stored counters (which other
+    instances add theirs to as well)."""
+    global _accounts
+    with _lock:
+        if not _charged:
+            return
+
+        def apply(accounts):
+            for (account_id, day), units in _charged.items():
+                if account_id in accounts:
+                    _add_used(accounts[account_id], day, units)
+
+        storage.update_accounts(apply)
+        _charged.clear()
+        _accounts = None
+
+
+# --- subscriptions -------------------------------------------------------------
+
+
+def subscriptions(account_id: str) -> List[str]:
+    with _lock:
+        return list((_load().get(account_id) or {}).get("channels") or [])
+
+
+def subscriptions_due(account_id: str, max_age: float) -> bool:
+    """True if the cached subscription list is missing or older than `max_age` seconds."""
+    with _lock:
+        acct = _load().get(account_id) or {}
+        return acct.get("channels") is None or time.time() - (acct.get("channels_read") or 0) > max_age
+
+
+def set_subscriptions(account_id: str, channels: List[str]):
+    with _lock:
+        _update(account_id, lambda acct: acct.update(channels=list(channels), channels_read=time.time()))
@@ -0,0 +1,189 @@
+"""Artifact manager: retention, disk quota and intermediate-file garbage collection.
+
+Every job dir (outputs/jobs/<video_id>) gets an `artifacts.json` manifest that labels files:
+
+- deliverable: the final short, subtitles, transcript (kept, subject to the quota),
+- intermediate: input download, partial renders (short.mp4, short_bleeped.mp4, ..., .ovN.mp4),
+  extracted audio, probe side-files and thumbnails (deleted when the job succeeds).
+
+`enforce_quota()` keeps OUTPUT_DIR under OUTPUT_QUOTA_MB by evicting the deliverables of the
+least recently used jobs; `usage()` reports space per job.
+"""
+import fnmatch
+import json
+import os
+import threading
+import time
+from typing import Iterable, List
+
+from .config import OUTPUT_DIR, OUTPUT_QUOTA_MB, KEEP_INTERMEDIATES
+
+JOBS_DIR = os.path.join(OUTPUT_DIR, "jobs")
+MANIFEST = "artifacts.json"
+
+DELIVERABLE = "deliverable"
+INTERMEDIATE = "intermediate"
+
+# files produced by the pipeline stages that are never needed once the job is done
+INTERMEDIATE_PATTERNS = [
+    "input.*",
+    "short.mp4",
+    "short_bleeped.mp4",
+    "short_censored.mp4",
+    "short_subtitled.mp4",
+    "short_with_sounds.mp4",
+    "short_with_images.mp4",
+    "*.ov[0-9]*.mp4",
+    "audio_bleep.mp3",
+    "*.probe.json",
+    "*.thumb.jpg",
+]
+
+_lock = threading.Lock()
+# job dirs with a pipeline currently running (never evicted)
+_active = set()
+
+
+def _manifest_path(job_dir: str) -> str:
+    return os.path.join(job_dir, MANIFEST)
+
+
+def _load(job_dir: str) -> dict:
+    try:
+        with open(_manifest_path(job_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}, "created": time.time(), "last_access": time.time()}
+
+
+def _save(job_dir: str, manifest: dict):
+    with open(_manifest_path(job_dir), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def classify(name: str) -> str:
+    return INTERMEDIATE if any(fnmatch.fnmatch(name, p) for p in INTERMEDIATE_PATTERNS) else DELIVERABLE
+
+
+def start_job(job_dir: str):
+    with _lock:
+        _active.add(os.path.abspath(job_dir))
+
+
+def end_job(job_dir: str):
+    with _lock:
+        _active.discard(os.path.abspath(job_dir))
+
+
+def is_active(job_dir: str) -> bool:
+    """True while a pipeline is running in `job_dir`."""
+    with _lock:
+        return os.path.abspath(job_dir) in _active
+
+
+def touch(job_dir: str):
+    """Mark a job's deliverables as recently used (e.g. reused for a duplicate upload)."""
+    if not os.path.isdir(job_dir):
+        return
+    with _lock:
+        m = _load(job_dir)
+        m["last_access"] = time.time()
+        _save(job_dir, m)
+
+
+def finalize_job(job_dir: str, deliverables: Iterable[str]) -> int:
+    """Label the job's deliverables and delete its intermediates. Returns bytes freed."""
+    with _lock:
+        m = _load(job_dir)
+        for p in deliverables:
+            if p and os.path.exists(p):
+                m["files"][os.path.relpath(p, job_dir)] = DELIVERABLE
+        freed = 0
+        for name in sorted(os.listdir(job_dir)):
+            path = os.path.join(job_dir, name)
+            if name == MANIFEST or not os.path.isfile(path):
+                continue
+            kind = m["files"].get(name) or classify(name)
+            m["files"][name] = kind
+            if kind == INTERMEDIATE and not KEEP_INTERMEDIATES:
+                freed += os.path.getsize(path)
+                os.remove(path)
+                del m["files"][name]
+        m["last_access"] = time.time()
+        m["freed_bytes"] = m.get("freed_bytes", 0) + freed
+        _save(job_dir, m)
+    return freed
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                continue
+    return total
+
+
+def usage() -> dict:
+    """Space used in OUTPUT_DIR, broken down per job."""
+    jobs = []
+    if os.path.isdir(JOBS_DIR):
+        for job in sorted(os.listdir(JOBS_DIR)):
+            job_dir = os.path.join(JOBS_DIR, job)
+            if not os.path.isdir(job_dir):
+                continue
+            m = _load(job_dir)
+            by_kind = {DELIVERABLE: 0, INTERMEDIATE: 0}
+            for name in os.listdir(job_dir):
+                path = os.path.join(job_dir, name)
+                if name == MANIFEST or not os.path.isfile(path):
+                    continue
+                by_kind[m["files"].get(name) or classify(name)] += os.path.getsize(path)
+            jobs.append({
+                "job": job,
+                "bytes": by_kind[DELIVERABLE] + by_kind[INTERMEDIATE],
+                "deliverable_bytes": by_kind[DELIVERABLE],
+                "intermediate_bytes": by_kind[INTERMEDIATE],
+                "last_access": m.get("last_access"),
+                "evicted": m.get("evicted", False),
+            })
+    return {
+        "total_bytes": _dir_bytes(OUTPUT_DIR),
+        "quota_bytes": OUTPUT_QUOTA_MB * 1024 * 1024 if OUTPUT_QUOTA_MB else None,
+        "jobs": jobs,
+    }
+
+
+def enforce_quota() -> List[str]:
+    """Evict deliverables of least recently used jobs until OUTPUT_DIR fits in the quota.
+
+    Jobs that are still running are never evicted. Returns evicted job names.
+    """
+    if not OUTPUT_QUOTA_MB:
+        return []
+    quota = OUTPUT_QUOTA_MB * 1024 * 1024
+    report = usage()
+    total = report["total_bytes"]
+    with _lock:
+        active = set(_active)
+    evicted = []
+    candidates = [j for j in report["jobs"] if j["bytes"] and os.path.abspath(os.path.join(JOBS_DIR, j["job"])) not in active]
+    for j in sorted(candidates, key=lambda j: j["last_access"] or 0):
+        if total <= quota:
+            break
+        job_dir = os.path.join(JOBS_DIR, j["job"])
+        with _lock:
+            m = _load(job_dir)
+            for name in os.listdir(job_dir):
+                path = os.path.join(job_dir, name)
+                if name != MANIFEST and os.path.isfile(path):
+                    os.remove(path)
+            m["files"] = {}
+            m["evicted"] = True
+            m["evicted_at"] = time.time()
+            _save(job_dir, m)
+        total -= j["bytes"]
+        evicted.append(j["job"])
+    return evicted
@@ -0,0 +1,47 @@
+"""Audio helpers shared by the local (CPU-only) analysis stages.
+
+`decode_pcm` asks ffmpeg for raw mono PCM on stdout and returns it as a NumPy array, so the
+analysis code never has to write an intermediate audio file. The PCM is converted block by
+block as ffmpeg writes it (through `progress.run_ffmpeg`, so the decode shows up in the job's
+progress like any other ffmpeg run) instead of being buffered whole first.
+"""
+import numpy as np
+
+from .progress import run_ffmpeg
+
+# samples to reserve when the length isn't known up front (grows by doubling)
+INITIAL_SAMPLES = 1 << 20
+
+
+def decode_pcm(path: str, sample_rate: int = 8000, max_seconds: float = None) -> np.ndarray:
+    """Decode the audio of `path` to mono float32 samples in [-1, 1].
+
+    Only the first `max_seconds` are decoded when given. Returns an empty array on failure.
+    """
+    cmd = ["ffmpeg", "-v", "error", "-nostdin"]
+    if max_seconds:
+        # as an input option -t stops reading the file early
+        cmd += ["-t", str(max_seconds)]
+    cmd += ["-i", path, "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"]
+
+    out = np.empty(int(max_seconds * sample_rate) + 1 if max_seconds else INITIAL_SAMPLES, dtype=np.float32)
+    n, odd = 0, b""
+
+    def take(block: bytes):
+        nonlocal out, n, odd
+        # a block may end in the middle of a sample: keep the odd byte for the next one
+        data = odd + block
+        even = len(data) // 2 * 2
+        odd = data[even:]
+        samples = np.frombuffer(data[:even], dtype="<i2")
+        if n + len(samples) > len(out):
+            out = np.resize(out, max(2 * len(out), n + len(samples)))
+        out[n : n + len(samples)] = samples / np.float32(32768.0)
+        n += len(samples)
+
+    try:
+        run_ffmpeg(cmd, duration=max_seconds, on_stdout=take)
+    except OSError:
+        # no ffmpeg on this machine
+        return np.zeros(0, dtype=np.float32)
+    return out[:n]
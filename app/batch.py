@@ -0,0 +1,172 @@
+"""Batch / backfill runner with a resumable manifest.
+
+Takes a list of video URLs (or a channel id, whose uploads are listed with `yt-dlp
+--flat-playlist`) and runs the pipeline over them with bounded parallelism. Progress is kept in
+a JSON manifest keyed by video id:
+
+    {"items": {"<video_id>": {"url", "status", "errors": {stage: message}, "result", ...}}}
+
+Items already `done` (or `duplicate`) are skipped on restart; failed items are retried unless
+`retry_failed=False`. Per-stage failures come from the `<stage>_error.txt` files the pipeline
+writes into the job dir, plus the exception of a job that aborted. A retry first clears the
+job dir of the failed attempt, so it sees neither its partial download nor its errors.
+
+Jobs go through the scheduler (`process.submit_video`) like live ones, so a backfill waits for
+admission control (disk, memory) instead of crowding out the live service. Videos the live
+service already processed are marked done without running again, and videos it is processing
+right now are skipped (and retried by the next run). Job dirs are only cleared when they hold
+a failed attempt of this batch.
+"""
+import glob
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List
+
+from .config import OUTPUT_DIR, SHORT_MAX_SECONDS, YTDLP_BIN
+from . import process
+
+DEFAULT_MANIFEST = os.path.join(OUTPUT_DIR, "batch_manifest.json")
+
+PENDING = "pending"
+DONE = "done"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+# the live service was processing the video: try again on the next run
+SKIPPED = "skipped"
+RUNNING = "running"
+
+
+def list_channel_videos(channel_id: str, limit: int = None) -> List[str]:
+    """Watch URLs of a channel's uploads (newest first), without downloading anything."""
+    cmd = [YTDLP_BIN, "--flat-playlist", "--print", "id"]
+    if limit:
+        cmd += ["--playlist-end", str(limit)]
+    cmd.append(f"https://www.youtube.com/channel/{channel_id}/videos")
+    r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=False)
+    ids = [l.strip() for l in (getattr(r, "stdout", None) or "").splitlines() if l.strip()]
+    return [f"https://www.youtube.com/watch?v={vid}" for vid in ids]
+
+
+def read_url_file(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [l.strip() for l in f if l.strip() and not l.strip().startswith("#")]
+
+
+def stage_errors(job_dir: str) -> dict:
+    """Collect `<stage>_error.txt` files from a job dir as {stage: message}."""
+    errors = {}
+    for p in glob.glob(os.path.join(job_dir, "*_error.txt")):
+        stage = os.path.basename(p)[: -len("_error.txt")]
+        with open(p, "r", encoding="utf-8", errors="replace") as f:
+            errors[stage] = f.read().strip()[:500]
+    return errors
+
+
+class Manifest:
+    """JSON manifest, rewritten atomically after every item so a crash loses nothing."""
+
+    def __init__(self, path: str = DEFAULT_MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"items": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def add(self, url: str) -> str:
+        vid = process.video_id_from_url(url)
+        with self._lock:
+            self.data["items"].setdefault(vid, {"url": url, "status": PENDING, "errors": {}, "attempts": 0})
+        return vid
+
+    def update(self, vid: str, **fields):
+        with self._lock:
+            self.data["items"][vid].update(fields)
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def items(self) -> dict:
+        with self._lock:
+            return {k: dict(v) for k, v in self.data["items"].items()}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def _run_one(manifest: Manifest, vid: str, url: str, max_duration: int) -> str:
+    from . import artifacts
+
+    job_dir = process.job_dir_for(url)
+    item = manifest.items()[vid]
+    if artifacts.is_active(job_dir):
+        manifest.update(vid, status=SKIPPED, errors={"batch": "being processed by the service"})
+        return SKIPPED
+    if item["status"] not in (FAILED, RUNNING) and process.is_processed(job_dir):
+        manifest.update(vid, status=DONE, errors={}, result={"processed_by": "service"}, finished=time.time())
+        return DONE
+    attempts = item.get("attempts", 0) + 1
+    if item["status"] in (FAILED, RUNNING) and item.get("attempts"):
+        # our own failed (or interrupted) attempt: partial downloads, stale `<stage>_error.txt`
+        shutil.rmtree(job_dir, ignore_errors=True)
+    manifest.update(vid, status=RUNNING, attempts=attempts, started=time.time())
+    try:
+        res = process.submit_video(url, max_duration=max_duration).result()
+    except Exception as e:
+        errors = stage_errors(job_dir)
+        errors["pipeline"] = str(e)
+        manifest.update(vid, status=FAILED, errors=errors, finished=time.time())
+        return FAILED
+    status = DUPLICATE if res.get("duplicate_of") else DONE
+    result = {"short": res.get("short"), "subtitles": res.get("subtitles"), "duplicate_of": res.get("duplicate_of")}
+    manifest.update(vid, status=status, errors=stage_errors(job_dir), result=result, finished=time.time())
+    return status
+
+
+def run_batch(
+    urls: List[str],
+    manifest_path: str = DEFAULT_MANIFEST,
+    parallelism: int = 2,
+    max_duration: int = SHORT_MAX_SECONDS,
+    retry_failed: bool = True,
+    on_progress: Callable[[dict], None] = None,
+) -> dict:
+    """Process `urls`, skipping items the manifest already has as done. Returns a summary."""
+    manifest = Manifest(manifest_path)
+    todo = []
+    for url in urls:
+        vid = manifest.add(url)
+        status = manifest.items()[vid]["status"]
+        if status in (DONE, DUPLICATE) or (status == FAILED and not retry_failed):
+            continue
+        todo.append((vid, manifest.items()[vid]["url"]))
+    # persist newly added items before starting, so a crash can resume them
+    manifest.save()
+
+    summary = {"total": len(todo), "finished": 0, DONE: 0, DUPLICATE: 0, FAILED: 0, SKIPPED: len(urls) - len(todo)}
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        futures = {pool.submit(_run_one, manifest, vid, url, max_duration): vid for vid, url in todo}
+        for fut in as_completed(futures):
+            status = fut.result()
+            summary["finished"] += 1
+            summary[status] += 1
+            elapsed = time.time() - t0
+            summary["elapsed_seconds"] = elapsed
+            summary["per_minute"] = summary["finished"] * 60.0 / elapsed if elapsed > 0 else 0.0
+            remaining = summary["total"] - summary["finished"]
+            summary["eta_seconds"] = remaining * elapsed / summary["finished"]
+            if on_progress:
+                on_progress(dict(summary, video_id=futures[fut], status=status))
+    return summary
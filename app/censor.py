@@ -4,8 +4,13 @@ Uses pydub to manipulate audio and ffmpeg for video blur and subtitle burn-in.
 """
 import os
 import tempfile
-import subprocess
-from pydub import AudioSegment, generators
+from .progress import run_ffmpeg
+from .chunked import render
+
+# a full-scale 1 kHz sine measures about -3 LUFS
+SINE_LUFS = -3.0
+# beep level without a loudness measurement, and the loudest it gets with one
+BEEP_GAIN_DB = -6.0
 
 
 def segments_to_srt(segments, flagged_indexes, out_path):
@@ -34,18 +39,35 @@ def segments_to_srt(segments, flagged_indexes, out_path):
     return out_path
 
 
+def beep_gain(video_path):
+    """Beep gain (dB) that puts the beep at the programme loudness of `video_path` (cached by the
+    probe), so it doesn't blast over a quiet video; BEEP_GAIN_DB if that can't be measured."""
+    from .probe import probe
+
+    try:
+        loudness = probe(video_path, loudness=True).loudness
+    except Exception:
+        loudness = None
+    if not loudness:
+        return BEEP_GAIN_DB
+    return min(BEEP_GAIN_DB, loudness["integrated_lufs"] - SINE_LUFS)
+
+
 def bleep_audio_for_segments(video_path, segments, flagged_indexes, out_audio_path):
     """Extract audio, replace flagged segments with a beep, and write result to out_audio_path.
 
     Returns path to modified audio file.
     """
+    from pydub import AudioSegment, generators
+
     tmpdir = tempfile.mkdtemp()
     audio_raw = os.path.join(tmpdir, "audio_raw.mp3")
     # extract audio
     cmd = ["ffmpeg", "-y", "-i", video_path, "-vn", "-acodec", "libmp3lame", "-ac", "1", "-ar", "16000", audio_raw]
-    subprocess.run(cmd, check=False)
+    run_ffmpeg(cmd)
 
     audio = AudioSegment.from_file(audio_raw)
+    gain = beep_gain(video_path)
     for idx in flagged_indexes:
         seg = segments[idx]
         start_ms = int(seg.get("start", 0) * 1000)
@@ -55,7 +77,7 @@ def bleep_audio_for_segments(video_path, segments, flagged_indexes, out_audio_pa
         duration_ms = end_ms - start_ms
         # generate beep
         sine = generators.Sine(1000)
-        beep = sine.to_audio_segment(duration=duration_ms).apply_gain(-6.0)
+        beep = sine.to_audio_segment(duration=duration_ms).apply_gain(gain)
         # replace the slice with beep
         audio = audio[:start_ms] + beep + audio[end_ms:]
 
@@ -70,7 +92,7 @@ def blur_video_segments(in_path, flagged_segments, out_path):
     """
     if not flagged_segments:
         # nothing to do; copy
-        subprocess.run(["ffmpeg", "-y", "-i", in_path, "-c", "copy", out_path], check=False)
+        run_ffmpeg(["ffmpeg", "-y", "-i", in_path, "-c", "copy", out_path])
         return out_path
 
     # Build enable expression
@@ -82,12 +104,12 @@ def blur_video_segments(in_path, flagged_segments, out_path):
     expr = "+".join(expr_parts)
     # Apply boxblur only when expr is true
     vf = f"boxblur=10:1:cr=2:enable='{expr}'"
-    cmd = ["ffmpeg", "-y", "-i", in_path, "-vf", vf, "-c:a", "copy", out_path]
-    subprocess.run(cmd, check=False)
+    # boxblur is single-threaded: long renders are split into parallel chunks
+    render(in_path, out_path, vf=vf)
     return out_path
 
 
 def replace_audio_in_video(video_in, audio_in, out_path):
     cmd = ["ffmpeg", "-y", "-i", video_in, "-i", audio_in, "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", out_path]
-    subprocess.run(cmd, check=False)
+    run_ffmpeg(cmd)
     return out_path
@@ -0,0 +1,202 @@
+"""Chunked parallel encoding for long renders.
+
+libx264 in one ffmpeg process doesn't scale linearly on many cores, and the `subtitles`,
+`boxblur` and `overlay` filters are largely single-threaded. `render()` is the single entry
+point for the video-filter encodes (trim/scale, blur, subtitles, image overlays):
+
+- short inputs (or RENDER_CHUNKED=0): one ffmpeg command, exactly as before;
+- otherwise the timeline is split into keyframe-aligned chunks (cheap input seeking, no
+  pre-roll decode), each chunk is filtered + encoded in its own ffmpeg process, the audio is
+  handled once for the whole range, and everything is joined losslessly with the concat
+  demuxer (`-c copy`).
+
+The calling stage encodes chunks itself (in the CPU slot it already holds); helpers on the
+chunk pool join in only while they get a free scheduler CPU slot, so chunking fills idle
+cores without stacking RENDER_CHUNK_WORKERS encoders on top of a busy CPU pool.
+
+Chunks run with `-copyts` so time-based filter expressions (`enable='between(t,..)'`,
+subtitle timings) still see the original timestamps; `setpts=PTS-STARTPTS` then rebases each
+chunk to zero for the concat.
+"""
+import contextvars
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence, Tuple
+
+from .config import RENDER_CHUNKED, RENDER_CHUNK_SECONDS, RENDER_CHUNK_WORKERS
+from .progress import run_ffmpeg
+from .scheduler import cpu_slots
+
+# seconds between a waiting helper's checks for a free CPU slot
+SLOT_POLL_SECONDS = 0.1
+
+_pool = None
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    # a dedicated pool: render() itself runs inside a CPU-pool stage, so helpers can't go there
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=max(1, RENDER_CHUNK_WORKERS), thread_name_prefix="chunk-pool")
+    return _pool
+
+
+def plan_chunks(keyframes: Sequence[float], start: float, end: float, chunk_seconds: float = RENDER_CHUNK_SECONDS) -> List[Tuple[float, float]]:
+    """Split [start, end) into ~chunk_seconds pieces whose boundaries sit on keyframes."""
+    bounds = [start]
+    kfs = [k for k in keyframes if start < k < end]
+    target = start + chunk_seconds
+    while target < end - chunk_seconds / 2:
+        if kfs:
+            # nearest keyframe to the target that still moves forward
+            cut = min(kfs, key=lambda k: abs(k - target))
+            if cut <= bounds[-1] + 1.0:
+                later = [k for k in kfs if k > bounds[-1] + 1.0]
+                if not later:
+                    break
+                cut = later[0]
+        else:
+            cut = target
+        if cut >= end - 1.0:
+            break
+        bounds.append(cut)
+        target = cut + chunk_seconds
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _encode_chunks(cmds: List[Tuple[list, float]]):
+    """Run the chunk encodes: the caller works through them while up to
+    RENDER_CHUNK_WORKERS - 1 helpers take chunks whenever they hold a free CPU slot."""
+    pending = list(reversed(cmds))
+    lock = threading.Lock()
+
+    def run_next() -> bool:
+        with lock:
+            if not pending:
+                return False
+            cmd, duration = pending.pop()
+        try:
+            run_ffmpeg(cmd, duration=duration)
+        except BaseException:
+            # one failed chunk fails the render: start no more
+            with lock:
+                pending.clear()
+            raise
+        return True
+
+    def helper():
+        slots = cpu_slots()
+        while pending:
+            # poll: a helper still waiting for a slot must not hold up a finished render
+            if not slots.acquire(timeout=SLOT_POLL_SECONDS):
+                continue
+            try:
+                if not run_next():
+                    return
+            finally:
+                slots.release()
+
+    helpers = []
+    for _ in range(min(RENDER_CHUNK_WORKERS, len(cmds)) - 1):
+        ctx = contextvars.copy_context()
+        helpers.append(_get_pool().submit(ctx.run, helper))
+    try:
+        while run_next():
+            pass
+    finally:
+        wait(helpers)
+    for f in helpers:
+        f.result()
+
+
+def should_chunk(duration: Optional[float]) -> bool:
+    if RENDER_CHUNKED == "0" or not duration or RENDER_CHUNK_WORKERS < 2:
+        return False
+    if RENDER_CHUNKED == "1":
+        return True
+    # auto: only worth it when there are at least two full chunks
+    return duration >= 2 * RENDER_CHUNK_SECONDS
+
+
+def _single_cmd(in_path, out_path, vf, filter_complex, extra_inputs, audio_args, video_args, start, duration):
+    cmd = ["ffmpeg", "-y"]
+    if start is not None:
+        cmd += ["-ss", f"{start:.3f}"]
+    cmd += ["-i", in_path]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    for extra in extra_inputs:
+        cmd += ["-i", extra]
+    if filter_complex:
+        cmd += ["-filter_complex", filter_complex]
+    elif vf:
+        cmd += ["-vf", vf]
+    return cmd + list(audio_args) + list(video_args) + [out_path]
+
+
+def render(
+    in_path: str,
+    out_path: str,
+    vf: str = None,
+    filter_complex: str = None,
+    extra_inputs: Sequence[str] = (),
+    audio_args: Sequence[str] = ("-c:a", "copy"),
+    video_args: Sequence[str] = (),
+    start: float = None,
+    duration: float = None,
+) -> str:
+    """Encode `in_path` through a video filter (`vf`, or a simple `filter_complex` whose extra
+    inputs are `extra_inputs`) into `out_path`, chunked across cores for long renders."""
+    from .probe import probe
+
+    span_start = start or 0.0
+    # keyframes past the span aren't needed: don't index the rest of a long source
+    info = probe(in_path, None if duration is None else span_start + duration) if os.path.exists(in_path) else None
+    span_end = None
+    if info and info.duration:
+        span_end = info.duration if duration is None else min(info.duration, span_start + duration)
+    elif duration is not None:
+        span_end = span_start + duration
+    if span_end is None or not should_chunk(span_end - span_start):
+        run_ffmpeg(_single_cmd(in_path, out_path, vf, filter_complex, extra_inputs, audio_args, video_args, start, duration))
+        return out_path
+
+    chunks = plan_chunks(info.keyframes if info else [], span_start, span_end)
+    work = out_path + ".chunks"
+    os.makedirs(work, exist_ok=True)
+    try:
+        graph = (filter_complex or vf or "null") + ",setpts=PTS-STARTPTS"
+        flag = "-filter_complex" if filter_complex else "-vf"
+        cmds, parts = [], []
+        for i, (s, e) in enumerate(chunks):
+            part = os.path.join(work, f"part{i:04d}.mp4")
+            cmd = ["ffmpeg", "-y", "-ss", f"{s:.3f}", "-t", f"{e - s:.3f}", "-copyts", "-i", in_path]
+            for extra in extra_inputs:
+                cmd += ["-i", extra]
+            cmd += [flag, graph, "-an"] + list(video_args or ["-c:v", "libx264"]) + [part]
+            cmds.append((cmd, e - s))
+            parts.append(part)
+        _encode_chunks(cmds)
+        for part in parts:
+            if not os.path.exists(part):
+                raise RuntimeError(f"chunk encode failed: {part}")
+
+        # lossless join of the video parts + audio for the whole range in one pass
+        list_path = os.path.join(work, "parts.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for part in parts:
+                f.write(f"file '{os.path.abspath(part)}'\n")
+        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        if start is not None:
+            cmd += ["-ss", f"{start:.3f}"]
+        cmd += ["-i", in_path]
+        if duration is not None:
+            cmd += ["-t", f"{span_end - span_start:.3f}"]
+        cmd += ["-map", "0:v", "-map", "1:a?", "-c:v", "copy"] + list(audio_args) + [out_path]
+        run_ffmpeg(cmd)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return out_path
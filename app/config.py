@@ -8,9 +8,120 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+# optional Data API key for metadata lookups without OAuth (e.g. WebSub-only setups)
+YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
 OAUTH_REDIRECT = os.getenv("OAUTH_REDIRECT", "http://localhost:8000/auth/callback")
 SHORT_MAX_SECONDS = int(os.getenv("SHORT_MAX_SECONDS", "120"))
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "outputs")
 
 # Ensure output dir exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Scheduler: CPU pool for encodes (sized to cores), larger I/O pool for network stages
+SCHED_CPU_WORKERS = int(os.getenv("SCHED_CPU_WORKERS") or os.cpu_count() or 1)
+SCHED_IO_WORKERS = int(os.getenv("SCHED_IO_WORKERS", "16"))
+SCHED_MAX_JOBS = int(os.getenv("SCHED_MAX_JOBS", "4"))
+# Admission control: a job only starts with this much free disk (OUTPUT_DIR) and memory
+SCHED_MIN_FREE_DISK_MB = int(os.getenv("SCHED_MIN_FREE_DISK_MB", "2048"))
+SCHED_MIN_FREE_MEM_MB = int(os.getenv("SCHED_MIN_FREE_MEM_MB", "512"))
+
+# Duplicate detection: seconds of audio to fingerprint and aligned hash matches needed for a hit
+FINGERPRINT_SECONDS = int(os.getenv("FINGERPRINT_SECONDS", "180"))
+FINGERPRINT_MIN_MATCHES = int(os.getenv("FINGERPRINT_MIN_MATCHES", "20"))
+
+# Highlights: full | prescore (only send locally pre-scored windows to GPT) | local (no API call)
+HIGHLIGHT_MODE = os.getenv("HIGHLIGHT_MODE", "prescore")
+HIGHLIGHT_CANDIDATES = int(os.getenv("HIGHLIGHT_CANDIDATES", "8"))
+HIGHLIGHT_WINDOW_SECONDS = float(os.getenv("HIGHLIGHT_WINDOW_SECONDS", "10"))
+
+# Retention: disk quota for OUTPUT_DIR in MB (0 = unlimited, LRU eviction of old deliverables)
+OUTPUT_QUOTA_MB = int(os.getenv("OUTPUT_QUOTA_MB", "0"))
+# keep intermediate files (input, partial renders) after a successful job, for debugging
+KEEP_INTERMEDIATES = os.getenv("KEEP_INTERMEDIATES", "0") == "1"
+
+# Start-up: pre-start the worker pools and load stage modules / assets in the background
+WARM_WORKERS = os.getenv("WARM_WORKERS", "1") == "1"
+
+# WebSub (push) upload detection: public URL of /websub/callback; empty disables it
+WEBSUB_CALLBACK_URL = os.getenv("WEBSUB_CALLBACK_URL", "")
+WEBSUB_HUB_URL = os.getenv("WEBSUB_HUB_URL", "https://pubsubhubbub.appspot.com/subscribe")
+WEBSUB_SECRET = os.getenv("WEBSUB_SECRET", "")
+WEBSUB_LEASE_SECONDS = int(os.getenv("WEBSUB_LEASE_SECONDS", "432000"))
+# ignore notifications for videos published longer ago than this (edits of old uploads)
+WEBSUB_MAX_AGE_HOURS = int(os.getenv("WEBSUB_MAX_AGE_HOURS", "48"))
+# slow reconciliation poll of subscriptions, in seconds (0 disables)
+MONITOR_POLL_SECONDS = int(os.getenv("MONITOR_POLL_SECONDS", "3600"))
+# Multi-account monitoring: channels (deduplicated across accounts) are split into MONITOR_SHARDS
+# shards polled by MONITOR_WORKERS threads; MONITOR_SHARD_IDS restricts this instance to some of
+# them (e.g. "0,1" on one deployment and "2,3" on another); empty = all
+MONITOR_SHARDS = int(os.getenv("MONITOR_SHARDS", "4"))
+MONITOR_SHARD_IDS = [int(s) for s in os.getenv("MONITOR_SHARD_IDS", "").split(",") if s.strip()]
+MONITOR_WORKERS = int(os.getenv("MONITOR_WORKERS", "4"))
+# uploads read per channel poll (playlistItems page size); several uploads between polls are all caught
+MONITOR_UPLOADS_DEPTH = int(os.getenv("MONITOR_UPLOADS_DEPTH", "5"))
+# how often each account's subscription list is re-read
+MONITOR_SUBS_REFRESH_SECONDS = int(os.getenv("MONITOR_SUBS_REFRESH_SECONDS", "21600"))
+# polled uploads rejected as live/upcoming/unavailable are re-checked on every poll for this long
+MONITOR_RECHECK_HOURS = int(os.getenv("MONITOR_RECHECK_HOURS", "168"))
+# Data API units each account may spend per day (the quota day starts at midnight Pacific time)
+ACCOUNT_DAILY_QUOTA = int(os.getenv("ACCOUNT_DAILY_QUOTA", "10000"))
+
+# Chunked parallel encoding: auto (long renders only) | 1 (always) | 0 (off)
+RENDER_CHUNKED = os.getenv("RENDER_CHUNKED", "auto")
+RENDER_CHUNK_SECONDS = float(os.getenv("RENDER_CHUNK_SECONDS", "20"))
+# upper bound on a render's parallel chunk encodes; helpers beyond the first only run in free
+# scheduler CPU slots (SCHED_CPU_WORKERS), so this never adds encodes on top of the CPU pool
+RENDER_CHUNK_WORKERS = int(os.getenv("RENDER_CHUNK_WORKERS") or os.cpu_count() or 1)
+
+# Metadata prefilter (videos.list) applied to new uploads before downloading
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_MIN_SECONDS = int(os.getenv("PREFILTER_MIN_SECONDS", "30"))
+# 0 = no upper limit
+PREFILTER_MAX_SECONDS = int(os.getenv("PREFILTER_MAX_SECONDS", "7200"))
+PREFILTER_REJECT_LIVE = os.getenv("PREFILTER_REJECT_LIVE", "1") == "1"
+PREFILTER_REJECT_VERTICAL = os.getenv("PREFILTER_REJECT_VERTICAL", "1") == "1"
+# comma-separated YouTube category ids: allow list (empty = all) and block list
+PREFILTER_CATEGORIES = [c.strip() for c in os.getenv("PREFILTER_CATEGORIES", "").split(",") if c.strip()]
+PREFILTER_BLOCKED_CATEGORIES = [c.strip() for c in os.getenv("PREFILTER_BLOCKED_CATEGORIES", "").split(",") if c.strip()]
+
+# Render profile of the short (frame size and frame rate the downloads are chosen for)
+RENDER_WIDTH = int(os.getenv("RENDER_WIDTH", "720"))
+RENDER_HEIGHT = int(os.getenv("RENDER_HEIGHT", "1280"))
+RENDER_FPS = float(os.getenv("RENDER_FPS", "30"))
+# yt-dlp format: auto (smallest streams that fill the render profile) or an explicit -f value, e.g. best
+DOWNLOAD_FORMAT = os.getenv("DOWNLOAD_FORMAT", "auto")
+DOWNLOAD_AUDIO_MIN_KBPS = int(os.getenv("DOWNLOAD_AUDIO_MIN_KBPS", "64"))
+# Downloader: inprocess (yt-dlp as a library: persistent sessions, info cache) | subprocess (YTDLP_BIN per download)
+DOWNLOADER = os.getenv("DOWNLOADER", "inprocess")
+# DASH/HLS fragments fetched in parallel per download
+DOWNLOAD_FRAGMENTS = int(os.getenv("DOWNLOAD_FRAGMENTS", "4"))
+# extracted info dicts are reused for this long (capped by the stream URLs' own expiry)
+INFO_CACHE_SECONDS = int(os.getenv("INFO_CACHE_SECONDS", "10800"))
+# Netscape cookie file shared by all in-process downloads (loaded at start, saved on shutdown)
+DOWNLOAD_COOKIE_FILE = os.getenv("DOWNLOAD_COOKIE_FILE", "")
+
+# Local moderation classifier: segments with P(unsafe) below / above these are decided locally,
+# the rest go to the moderation API; needs this many examples per class before it is used
+MODERATION_LOCAL = os.getenv("MODERATION_LOCAL", "1") == "1"
+MODERATION_SAFE_BELOW = float(os.getenv("MODERATION_SAFE_BELOW", "0.02"))
+MODERATION_UNSAFE_ABOVE = float(os.getenv("MODERATION_UNSAFE_ABOVE", "0.98"))
+MODERATION_MIN_EXAMPLES = int(os.getenv("MODERATION_MIN_EXAMPLES", "50"))
+
+# S3-compatible output sink (AWS S3, MinIO, ...); disabled unless endpoint, bucket and keys are set
+S3_ENDPOINT = os.getenv("S3_ENDPOINT", "")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PREFIX = os.getenv("S3_PREFIX", "shorts/")
+S3_PART_MB = int(os.getenv("S3_PART_MB", "8"))
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+# lifetime of the presigned download links (S3 allows at most 7 days)
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", "604800"))
+
+# External endpoints; overridable to point the app at local stand-ins (scripts/load_test.py)
+YOUTUBE_API_BASE = os.getenv("YOUTUBE_API_BASE", "https://www.googleapis.com/youtube/v3")
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+# Bot API base, e.g. http://127.0.0.1:8081 (empty = api.telegram.org)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "")
+YTDLP_BIN = os.getenv("YTDLP_BIN", "yt-dlp")
@@ -0,0 +1,277 @@
+"""In-process yt-dlp: persistent sessions, cached info dicts, concurrent fragments.
+
+Running the `yt-dlp` executable for every download costs the same each time. Each run starts
+an interpreter, imports the extractors, opens new connections, and extracts the watch page
+twice (once for `-J` and again for the download). Here yt-dlp runs as a library inside the
+app instead:
+
+- One long-lived `YoutubeDL` per worker thread. The IO pool's threads live as long as the app,
+  so HTTP connections are reused between downloads. All instances share one cookie jar,
+  loaded from DOWNLOAD_COOKIE_FILE if set and saved by `close()`.
+- Info dicts are cached per video id, in memory and in `OUTPUT_DIR/info_cache/<id>.json`.
+  Format selection, the download itself and any later lookup reuse the extraction instead of
+  fetching the page again. An entry lives INFO_CACHE_SECONDS, but is dropped before the signed
+  stream URLs in it expire. A download from a stale entry is retried once with a fresh
+  extraction.
+- DASH/HLS fragments are fetched DOWNLOAD_FRAGMENTS at a time.
+- Progress goes to a per-download callback (yt-dlp progress hook dicts; see
+  `progress.download_hook`).
+
+`available()` is False with DOWNLOADER=subprocess or without the yt_dlp package. `formats` then
+runs YTDLP_BIN per download as before (the load test's yt-dlp stand-in relies on this).
+`scripts/bench_downloader.py` compares the two.
+"""
+import copy
+import importlib.util
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .config import DOWNLOADER, DOWNLOAD_COOKIE_FILE, DOWNLOAD_FRAGMENTS, INFO_CACHE_SECONDS, OUTPUT_DIR
+
+CACHE_DIR = os.path.join(OUTPUT_DIR, "info_cache")
+# drop cached info this long before its stream URLs expire
+EXPIRY_MARGIN_SECONDS = 600
+# info dicts (and URL -> id mappings) kept in memory; expired files on disk are pruned at
+# most this often
+MEMORY_ENTRIES = 256
+PRUNE_EVERY_SECONDS = 3600
+
+BASE_PARAMS = {
+    "quiet": True,
+    "no_warnings": True,
+    "noprogress": True,
+    "noplaylist": True,
+    "concurrent_fragment_downloads": DOWNLOAD_FRAGMENTS,
+    "retries": 3,
+    "fragment_retries": 3,
+}
+
+_VIDEO_ID_RE = re.compile(r"(?:v=|youtu\.be/|shorts/|embed/|live/)([\w-]{11})")
+
+_local = threading.local()
+_lock = threading.Lock()
+_instances = []
+_cookiejar = None
+_memory = OrderedDict()  # video id -> {"expires", "info"}
+_url_ids = OrderedDict()  # non-YouTube URL -> video id extracted from it (LRU)
+_pruned = 0.0
+
+
+def available() -> bool:
+    return DOWNLOADER == "inprocess" and importlib.util.find_spec("yt_dlp") is not None
+
+
+def video_id(url: str) -> Optional[str]:
+    m = _VIDEO_ID_RE.search(url or "")
+    return m.group(1) if m else None
+
+
+def _ydl():
+    """This thread's YoutubeDL, created on first use."""
+    global _cookiejar
+    ydl = getattr(_local, "ydl", None)
+    if ydl is not None:
+        return ydl
+    from yt_dlp import YoutubeDL
+
+    params = dict(BASE_PARAMS)
+    if DOWNLOAD_COOKIE_FILE:
+        params["cookiefile"] = DOWNLOAD_COOKIE_FILE
+    ydl = YoutubeDL(params)
+    with _lock:
+        if _cookiejar is None:
+            _cookiejar = ydl.cookiejar
+        else:
+            # `cookiejar` is a cached property: seed it with the shared jar before any request
+            ydl.__dict__["cookiejar"] = _cookiejar
+        _instances.append(ydl)
+    # progress hooks are fixed per instance: dispatch to the callback of the running download
+    ydl.short_progress = None
+    ydl.add_progress_hook(lambda d: ydl.short_progress and ydl.short_progress(d))
+    _local.ydl = ydl
+    return ydl
+
+
+def close():
+    """Close every instance (saves the cookie file, closes pooled connections)."""
+    with _lock:
+        instances = list(_instances)
+        _instances.clear()
+    for ydl in instances:
+        try:
+            ydl.close()
+        except Exception as e:
+            print("yt-dlp close failed:", e)
+
+
+# --- info cache ------------------------------------------------------------------
+
+
+def _expires(info: dict, now: float) -> float:
+    expires = now + INFO_CACHE_SECONDS
+    # googlevideo URLs carry their expiry (unix time) in the `expire` query parameter
+    for f in info.get("formats") or []:
+        value = parse_qs(urlparse(f.get("url") or "").query).get("expire")
+        if value and value[0].isdigit():
+            expires = min(expires, int(value[0]) - EXPIRY_MARGIN_SECONDS)
+    return expires
+
+
+def _cache_path(vid: str) -> str:
+    return os.path.join(CACHE_DIR, f"{vid}.json")
+
+
+def _remember(vid: str, entry: dict):
+    with _lock:
+        _memory[vid] = entry
+        _memory.move_to_end(vid)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def cached_info(vid: str) -> Optional[dict]:
+    """A fresh cached info dict for video id `vid` (a copy), or None."""
+    with _lock:
+        entry = _memory.get(vid)
+    if entry is None:
+        try:
+            with open(_cache_path(vid), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _remember(vid, entry)
+    if entry["expires"] <= time.time():
+        forget(vid)
+        return None
+    return copy.deepcopy(entry["info"])
+
+
+def store_info(info: dict):
+    vid = info.get("id")
+    if not vid:
+        return
+    entry = {"expires": _expires(info, time.time()), "info": info}
+    _remember(vid, entry)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = _cache_path(vid) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp, _cache_path(vid))
+    prune()
+
+
+def prune(force: bool = False) -> int:
+    """Remove expired cache files (at most every PRUNE_EVERY_SECONDS). Returns how many."""
+    global _pruned
+    now = time.time()
+    with _lock:
+        if not force and now - _pruned < PRUNE_EVERY_SECONDS:
+            return 0
+        _pruned = now
+    removed = 0
+    for name in os.listdir(CACHE_DIR) if os.path.isdir(CACHE_DIR) else []:
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                expired = json.load(f)["expires"] <= now
+        except (OSError, ValueError, KeyError):
+            expired = name.endswith(".json")
+        if expired:
+            forget(name[: -len(".json")])
+            removed += 1
+    return removed
+
+
+def forget(vid: str):
+    with _lock:
+        _memory.pop(vid, None)
+    try:
+        os.remove(_cache_path(vid))
+    except OSError:
+        pass
+
+
+def _url_id(url: str) -> Optional[str]:
+    with _lock:
+        vid = _url_ids.get(url)
+        if vid is not None:
+            _url_ids.move_to_end(url)
+        return vid
+
+
+def extract_info(url: str, refresh: bool = False) -> Tuple[dict, bool]:
+    """(info dict for `url`, JSON-serializable like `yt-dlp -J`; True if it came from the cache).
+    The cache is used when it has a fresh entry and `refresh` is False."""
+    vid = video_id(url) or _url_id(url)
+    if vid and not refresh:
+        info = cached_info(vid)
+        if info is not None:
+            return info, True
+    ydl = _ydl()
+    ydl.format_selector = None
+    info = ydl.sanitize_info(ydl.extract_info(url, download=False), remove_private_keys=True)
+    store_info(info)
+    if not video_id(url) and info.get("id"):
+        with _lock:
+            _url_ids[url] = info["id"]
+            _url_ids.move_to_end(url)
+            while len(_url_ids) > MEMORY_ENTRIES:
+                _url_ids.popitem(last=False)
+    return copy.deepcopy(info), False
+
+
+# --- downloads -------------------------------------------------------------------
+
+
+def download(url: str, out_template: str, format: str = None, merge_output_format: str = None,
+             format_sort: list = None, progress: Callable[[dict], None] = None, info: dict = None,
+             from_cache: bool = False, info_path: str = None) -> str:
+    """Download `url` to `out_template` (yt-dlp output template) and return the file's path.
+
+    `info` (or the cached info dict) is downloaded directly, without extracting the page again.
+    If it came from the cache (`from_cache`) and the download fails, the page is extracted again
+    once and `info_path`, if given, is rewritten with the new info dict. `format`,
+    `merge_output_format` and `format_sort` are the `-f`, `--merge-output-format` and `-S`
+    options; `progress` gets every yt-dlp progress dict.
+    """
+    from yt_dlp.utils import DownloadError
+
+    if info is None:
+        info, from_cache = extract_info(url)
+    else:
+        info = copy.deepcopy(info)
+    ydl = _ydl()
+    ydl.params.update(
+        outtmpl={"default": out_template},
+        merge_output_format=merge_output_format,
+        format_sort=list(format_sort or []),
+    )
+    ydl.format_selector = ydl.build_format_selector(format) if format else None
+    ydl.short_progress = progress
+    try:
+        try:
+            result = ydl.process_ie_result(info, download=True)
+        except DownloadError:
+            if not from_cache:
+                raise
+            # cached stream URLs expired or were revoked early: extract again once
+            forget(info.get("id") or "")
+            info, _ = extract_info(url, refresh=True)
+            if info_path:
+                with open(info_path, "w", encoding="utf-8") as f:
+                    json.dump(info, f, ensure_ascii=False)
+            result = ydl.process_ie_result(info, download=True)
+    finally:
+        ydl.short_progress = None
+        ydl.format_selector = None
+    downloads = result.get("requested_downloads") or [{}]
+    path = downloads[0].get("filepath") or result.get("filepath")
+    if not path:
+        raise RuntimeError("yt-dlp reported no downloaded file")
+    return path
@@ -0,0 +1,155 @@
+"""Audio fingerprints for duplicate / re-upload detection.
+
+Channels often re-upload or cross-post the same content under a new video id. Before the
+expensive stages run we fingerprint the first minutes of audio and look it up in an index of
+previously processed videos; on a match the pipeline reuses the earlier short.
+
+Fingerprint (landmark style, NumPy only):
+- log-magnitude spectrogram of 8 kHz mono audio,
+- per frame, the strongest bin in a few frequency bands ("peaks"),
+- each peak is paired with the next few peaks; (f1, f2, dt) is packed into an int hash,
+  stored with the anchor frame.
+
+The index is a SQLite table keyed by hash, so lookup is one indexed query per batch of hashes.
+A match is the stored video with the most hashes agreeing on the same time offset, which
+tolerates trimmed intros and re-encodes.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .audio import decode_pcm
+from .config import OUTPUT_DIR, FINGERPRINT_SECONDS, FINGERPRINT_MIN_MATCHES
+
+DB_PATH = os.path.join(OUTPUT_DIR, "fingerprints.db")
+
+SAMPLE_RATE = 8000
+FRAME = 1024
+HOP = 512
+# frequency bands (FFT bin ranges) in which one peak per frame is picked
+BANDS = [(10, 30), (30, 80), (80, 200), (200, 512)]
+FANOUT = 4
+MAX_DT = 63
+# fraction of the query's hashes that must agree on one offset (rejects chance collisions)
+MIN_SCORE = 0.1
+
+_lock = threading.Lock()
+
+
+def _spectrogram(samples: np.ndarray) -> np.ndarray:
+    n = (len(samples) - FRAME) // HOP + 1
+    if n <= 0:
+        return np.zeros((0, FRAME // 2 + 1), dtype=np.float32)
+    idx = np.arange(FRAME)[None, :] + HOP * np.arange(n)[:, None]
+    frames = samples[idx] * np.hanning(FRAME).astype(np.float32)
+    return np.log1p(np.abs(np.fft.rfft(frames, axis=1)))
+
+
+def _peaks(spec: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (frame, bin) arrays of spectral peaks, sorted by frame."""
+    ts, fs = [], []
+    for lo, hi in BANDS:
+        band = spec[:, lo:hi]
+        if band.size == 0:
+            continue
+        val = band.max(axis=1)
+        arg = band.argmax(axis=1) + lo
+        # keep only peaks that stand out for this band (skips silence and flat noise)
+        keep = np.nonzero(val > max(np.median(val), 1e-3))[0]
+        ts.append(keep)
+        fs.append(arg[keep])
+    if not ts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    t = np.concatenate(ts)
+    f = np.concatenate(fs)
+    order = np.lexsort((f, t))
+    return t[order].astype(np.int64), f[order].astype(np.int64)
+
+
+def fingerprint_samples(samples: np.ndarray) -> List[Tuple[int, int]]:
+    """Return a list of (hash, anchor_frame) pairs for the given 8 kHz mono samples."""
+    t, f = _peaks(_spectrogram(samples))
+    out = []
+    for k in range(1, FANOUT + 1):
+        if len(t) <= k:
+            break
+        dt = t[k:] - t[:-k]
+        mask = (dt > 0) & (dt <= MAX_DT)
+        h = (f[:-k] << 16) | (f[k:] << 6) | dt
+        out.extend(zip(h[mask].tolist(), t[:-k][mask].tolist()))
+    return out
+
+
+def fingerprint_file(path: str, seconds: int = FINGERPRINT_SECONDS) -> List[Tuple[int, int]]:
+    """Fingerprint the first `seconds` of audio in `path` (empty list if it has no audio)."""
+    return fingerprint_samples(decode_pcm(path, sample_rate=SAMPLE_RATE, max_seconds=seconds))
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS hashes (hash INTEGER NOT NULL, video_id TEXT NOT NULL, t INTEGER NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (hash)")
+    conn.execute("CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, n_hashes INTEGER, result TEXT)")
+    return conn
+
+
+def add_video(video_id: str, hashes: List[Tuple[int, int]], result: dict = None):
+    """Store a video's fingerprint and its pipeline result (used to short-circuit duplicates)."""
+    with _lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM hashes WHERE video_id = ?", (video_id,))
+                conn.executemany("INSERT INTO hashes (hash, video_id, t) VALUES (?, ?, ?)", [(h, video_id, t) for h, t in hashes])
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (video_id, n_hashes, result) VALUES (?, ?, ?)",
+                    (video_id, len(hashes), json.dumps(result or {}, ensure_ascii=False)),
+                )
+        finally:
+            conn.close()
+
+
+def find_match(hashes: List[Tuple[int, int]], min_matches: int = FINGERPRINT_MIN_MATCHES) -> Optional[dict]:
+    """Return {video_id, matches, score, offset} of the best aligned match, or None."""
+    if not hashes:
+        return None
+    query = defaultdict(list)
+    for h, t in hashes:
+        query[h].append(t)
+    keys = list(query)
+    votes = Counter()
+    with _lock:
+        conn = _connect()
+        try:
+            # stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                marks = ",".join("?" * len(batch))
+                for h, vid, t_db in conn.execute(f"SELECT hash, video_id, t FROM hashes WHERE hash IN ({marks})", batch):
+                    for t_q in query[h]:
+                        votes[(vid, t_db - t_q)] += 1
+        finally:
+            conn.close()
+    if not votes:
+        return None
+    (vid, offset), count = votes.most_common(1)[0]
+    if count < min_matches or count / len(hashes) < MIN_SCORE:
+        return None
+    return {"video_id": vid, "matches": count, "score": count / len(hashes), "offset_seconds": offset * HOP / SAMPLE_RATE}
+
+
+def get_result(video_id: str) -> Optional[dict]:
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT result FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        finally:
+            conn.close()
+    if not row:
+        return None
+    return json.loads(row[0] or "{}")
@@ -0,0 +1,176 @@
+"""Target-aware yt-dlp format selection.
+
+`-f best` picks the best pre-muxed stream, often 1080p or 4K, which the trim stage then scales
+down into the 720x1280 frame: most of the downloaded bytes and decode time are thrown away.
+
+Instead we read the format list (`yt-dlp -J`, saved next to the download and reused with
+`--load-info-json`, so the video page is only extracted once) and pick:
+
+- the smallest video-only stream that still fills the render profile: scaling it into the
+  RENDER_WIDTH x RENDER_HEIGHT box (force_original_aspect_ratio=decrease) must not upscale,
+  at RENDER_FPS or the best frame rate on offer if that is lower;
+- among equal resolutions, the codec that is cheapest to decode (H.264 < VP9 < AV1), then the
+  lowest bitrate;
+- the smallest audio-only stream of at least DOWNLOAD_AUDIO_MIN_KBPS, preferring one that fits
+  the video's container.
+
+yt-dlp merges the two with a stream copy (no re-encode), into mp4 when the codecs allow it and
+mkv otherwise. If the format list can't be read, a yt-dlp sort expression with the same
+preferences is used instead.
+
+Downloads run in-process through `downloader` (cached info dict, no second page extraction)
+unless DOWNLOADER=subprocess, which runs YTDLP_BIN with the equivalent command line.
+"""
+import json
+import os
+import subprocess
+from typing import List, Optional, Tuple
+
+from .config import DOWNLOAD_FORMAT, DOWNLOAD_AUDIO_MIN_KBPS, RENDER_WIDTH, RENDER_HEIGHT, RENDER_FPS, YTDLP_BIN
+from . import downloader
+
+# relative software decode cost; unknown codecs sort last
+CODEC_COST = {"avc1": 0, "h264": 0, "vp9": 1, "vp09": 1, "hev1": 2, "hvc1": 2, "av01": 3}
+MP4_AUDIO = ("m4a", "mp4")
+
+
+def _codec_cost(vcodec: str) -> int:
+    return CODEC_COST.get((vcodec or "").split(".")[0].lower(), 4)
+
+
+def _size(f: dict, duration: Optional[float]) -> float:
+    """Bytes of a format: exact/approximate filesize, else bitrate x duration, else unknown (inf)."""
+    size = f.get("filesize") or f.get("filesize_approx")
+    if size:
+        return float(size)
+    if f.get("tbr") and duration:
+        return f["tbr"] * 1000 / 8 * duration
+    return float("inf")
+
+
+def fills_profile(width: int, height: int, target_w: int = RENDER_WIDTH, target_h: int = RENDER_HEIGHT) -> bool:
+    """True if a width x height frame fitted into the target box is not upscaled."""
+    return bool(width and height) and (width >= target_w or height >= target_h)
+
+
+def pick_formats(info: dict, target_w: int = RENDER_WIDTH, target_h: int = RENDER_HEIGHT, fps: float = RENDER_FPS) -> Optional[Tuple[dict, Optional[dict]]]:
+    """Choose (video, audio) formats from a yt-dlp info dict; audio is None for a muxed stream.
+
+    Returns None when there are no usable formats.
+    """
+    duration = info.get("duration")
+    formats = info.get("formats") or []
+    videos = [f for f in formats if f.get("vcodec") not in (None, "none") and f.get("width") and f.get("height")]
+    if not videos:
+        return None
+    video_only = [f for f in videos if f.get("acodec") in (None, "none")]
+    pool = video_only or videos
+
+    best_fps = max((f.get("fps") or 0) for f in pool)
+    want_fps = min(fps, best_fps) - 0.5 if best_fps else 0
+    fast_enough = [f for f in pool if (f.get("fps") or best_fps) >= want_fps]
+    filling = [f for f in fast_enough if fills_profile(f["width"], f["height"], target_w, target_h)]
+    if filling:
+        # smallest frame that fills the box, then cheapest decode, then fewest bytes
+        video = min(filling, key=lambda f: (f["width"] * f["height"], _codec_cost(f.get("vcodec")), _size(f, duration)))
+    else:
+        # source is smaller than the profile everywhere: take the largest frame there is
+        video = max(fast_enough, key=lambda f: (f["width"] * f["height"], -_codec_cost(f.get("vcodec")), -_size(f, duration)))
+    if video.get("acodec") not in (None, "none"):
+        return video, None
+
+    audios = [f for f in formats if f.get("acodec") not in (None, "none") and f.get("vcodec") in (None, "none")]
+    if not audios:
+        return video, None
+    enough = [f for f in audios if (f.get("abr") or f.get("tbr") or 0) >= DOWNLOAD_AUDIO_MIN_KBPS] or audios
+    mp4_video = video.get("ext") == "mp4"
+    audio = min(enough, key=lambda f: ((f.get("ext") in MP4_AUDIO) != mp4_video, _size(f, duration)))
+    return video, audio
+
+
+def merge_format(video: dict, audio: Optional[dict]) -> str:
+    """Container for the stream-copy merge: mp4 if both streams fit, else mkv."""
+    if audio is None:
+        return video.get("ext") or "mp4"
+    return "mp4" if video.get("ext") == "mp4" and audio.get("ext") in MP4_AUDIO else "mkv"
+
+
+def fallback_sort(target_w: int = RENDER_WIDTH, target_h: int = RENDER_HEIGHT, fps: float = RENDER_FPS) -> List[str]:
+    """Format sort (`-S`) without a format list: let yt-dlp sort by the same preferences."""
+    res = min(target_w, target_h)
+    return [f"res:{res}", f"fps:{int(fps)}", "vcodec:h264", "+size", "+br"]
+
+
+def fallback_args(target_w: int = RENDER_WIDTH, target_h: int = RENDER_HEIGHT, fps: float = RENDER_FPS) -> List[str]:
+    """Format arguments without a format list: let yt-dlp sort by the same preferences."""
+    return ["-f", "bv*+ba/b", "-S", ",".join(fallback_sort(target_w, target_h, fps))]
+
+
+def format_options(info: Optional[dict]) -> dict:
+    """yt-dlp options (format, merge_output_format or format_sort) for DOWNLOAD_FORMAT and `info`."""
+    if DOWNLOAD_FORMAT != "auto":
+        return {"format": DOWNLOAD_FORMAT}
+    picked = pick_formats(info) if info else None
+    if picked is None:
+        return {"format": "bv*+ba/b", "format_sort": fallback_sort()}
+    video, audio = picked
+    fmt = video["format_id"] if audio is None else f"{video['format_id']}+{audio['format_id']}"
+    return {"format": fmt, "merge_output_format": merge_format(video, audio)}
+
+
+def fetch_info(url: str, info_path: str) -> Optional[dict]:
+    """Extract the info dict once (`yt-dlp -J`, or the downloader's cache) and save it for
+    `--load-info-json` and later stages."""
+    return _fetch_info(url, info_path)[0]
+
+
+def _fetch_info(url: str, info_path: str) -> Tuple[Optional[dict], bool]:
+    """`fetch_info`, plus whether the info dict came from the downloader's cache."""
+    if downloader.available():
+        try:
+            info, from_cache = downloader.extract_info(url)
+        except Exception as e:
+            print("Info extraction failed:", e)
+            return None, False
+        with open(info_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        return info, from_cache
+    r = subprocess.run(
+        [YTDLP_BIN, "-J", "--no-playlist", url], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=False
+    )
+    out = getattr(r, "stdout", None)
+    if not out:
+        return None, False
+    try:
+        info = json.loads(out)
+    except ValueError:
+        return None, False
+    with open(info_path, "w", encoding="utf-8") as f:
+        f.write(out)
+    return info, False
+
+
+def download(url: str, out_template: str, progress=None):
+    """Download `url` to `out_template` (yt-dlp output template) with the selected formats.
+    `progress` receives yt-dlp progress dicts (in-process downloads only)."""
+    if not downloader.available():
+        return subprocess.run(download_command(url, out_template), check=False)
+    info_path = os.path.join(os.path.dirname(out_template), "input.info.json")
+    info, from_cache = _fetch_info(url, info_path)
+    return downloader.download(url, out_template, progress=progress, info=info, from_cache=from_cache,
+                               info_path=info_path, **format_options(info))
+
+
+def download_command(url: str, out_template: str) -> List[str]:
+    """yt-dlp command for `url` according to DOWNLOAD_FORMAT (`auto` or an explicit -f value)."""
+    if DOWNLOAD_FORMAT != "auto":
+        return [YTDLP_BIN, "-f", DOWNLOAD_FORMAT, "-o", out_template, url]
+    info_path = os.path.join(os.path.dirname(out_template), "input.info.json")
+    opts = format_options(fetch_info(url, info_path))
+    if "format_sort" in opts:
+        return [YTDLP_BIN] + fallback_args() + ["-o", out_template, url]
+    return [
+        YTDLP_BIN, "--load-info-json", info_path,
+        "-f", opts["format"], "--merge-output-format", opts["merge_output_format"],
+        "-o", out_template,
+    ]
@@ -0,0 +1,231 @@
+"""Stage graph runner.
+
+A pipeline is declared as a list of `Stage`s, each naming the values it reads (`inputs`) and
+the values it produces (`outputs`). `run()` starts every stage whose inputs are available at
+the same time, each in the scheduler pool for its kind, so independent work (moderation next
+to highlight extraction, asset discovery, the SRT write, the thumbnail, ...) overlaps and a job
+takes as long as its longest chain instead of the sum of its stages.
+
+Failures:
+- a stage with a `fallback` writes `<stage>_error.txt` to the job dir and publishes the
+  fallback's outputs instead, so the stages that depend on it still run;
+- a stage without a fallback is fatal: nothing new is started, the running stages are awaited
+  and the error is re-raised;
+- a stage may raise `Stop(result)` to end the job early with `result` (e.g. a duplicate).
+
+Every run records per-stage timings and the critical path: starting from the last stage to
+finish, follow the input that became available last back to the start. Shortening anything
+off that path does not make the job faster.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .scheduler import CPU, IO, submit_stage
+from . import progress
+
+OK = "ok"
+FALLBACK = "fallback"
+FAILED = "failed"
+STOPPED = "stopped"
+SKIPPED = "skipped"
+
+
+class Stop(Exception):
+    """Raised by a stage to finish the whole run early with `result`."""
+
+    def __init__(self, result: Any):
+        super().__init__("stopped early")
+        self.result = result
+        self.report = None
+
+
+@dataclass
+class Stage:
+    """One node of the graph.
+
+    `fn` is called with the `inputs` as keyword arguments. It returns the value of its single
+    output, a tuple for several outputs, or anything (ignored) without outputs. `after` lists
+    values that must exist before the stage starts but are not passed to it. `fallback`, if
+    set, is called with the same keyword arguments when `fn` raises and returns the outputs
+    to publish instead; without one a failure is fatal.
+    """
+
+    name: str
+    fn: Callable
+    inputs: Sequence[str] = ()
+    outputs: Sequence[str] = ()
+    kind: str = IO
+    fallback: Optional[Callable] = None
+    after: Sequence[str] = ()
+
+    @property
+    def needs(self) -> Tuple[str, ...]:
+        return tuple(self.inputs) + tuple(self.after)
+
+
+def validate(stages: List[Stage], given: Sequence[str] = ()):
+    """Check names are unique, every input has exactly one source and there are no cycles."""
+    names = [s.name for s in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("duplicate stage names")
+    producer = {}
+    for s in stages:
+        if s.kind not in (CPU, IO):
+            raise ValueError(f"stage {s.name}: unknown kind {s.kind}")
+        for out in s.outputs:
+            if out in producer or out in given:
+                raise ValueError(f"value {out!r} has more than one source")
+            producer[out] = s.name
+    for s in stages:
+        missing = [n for n in s.needs if n not in producer and n not in given]
+        if missing:
+            raise ValueError(f"stage {s.name}: no stage produces {missing}")
+    # Kahn's algorithm over the stages
+    available = set(given)
+    left = list(stages)
+    while left:
+        ready = [s for s in left if all(n in available for n in s.needs)]
+        if not ready:
+            raise ValueError(f"dependency cycle between {[s.name for s in left]}")
+        for s in ready:
+            available.update(s.outputs)
+        left = [s for s in left if s not in ready]
+
+
+def _as_outputs(stage: Stage, value) -> Dict[str, Any]:
+    if not stage.outputs:
+        return {}
+    if len(stage.outputs) == 1:
+        return {stage.outputs[0]: value}
+    if not isinstance(value, tuple) or len(value) != len(stage.outputs):
+        raise TypeError(f"stage {stage.name} must return a {len(stage.outputs)}-tuple")
+    return dict(zip(stage.outputs, value))
+
+
+def _write_error(job_dir: Optional[str], name: str, error: Exception):
+    if not job_dir:
+        return
+    with open(os.path.join(job_dir, f"{name}_error.txt"), "w", encoding="utf-8") as f:
+        f.write(str(error))
+
+
+def _execute(stage: Stage, kwargs: dict, job_dir: Optional[str]) -> dict:
+    """Run one stage in its pool thread; never raises (the outcome is returned)."""
+    record = progress.begin_stage(stage.name)
+    started = time.monotonic()
+    outcome = {"status": OK, "started": started, "outputs": {}, "error": None}
+    try:
+        outcome["outputs"] = _as_outputs(stage, stage.fn(**kwargs))
+    except Stop as e:
+        outcome.update(status=STOPPED, error=e)
+    except Exception as e:
+        outcome["error"] = e
+        if stage.fallback is None:
+            outcome["status"] = FAILED
+        else:
+            _write_error(job_dir, stage.name, e)
+            try:
+                outcome["outputs"] = _as_outputs(stage, stage.fallback(**kwargs))
+                outcome["status"] = FALLBACK
+            except Exception as fe:
+                outcome.update(status=FAILED, error=fe)
+    outcome["finished"] = time.monotonic()
+    progress.end_stage(record, outcome["status"])
+    return outcome
+
+
+def critical_path(timings: Dict[str, dict]) -> List[str]:
+    """Stage names on the critical path, first to last (see module docstring)."""
+    done = {n: t for n, t in timings.items() if t.get("end") is not None}
+    if not done:
+        return []
+    path = [max(done, key=lambda n: done[n]["end"])]
+    while done[path[-1]].get("after"):
+        path.append(done[path[-1]]["after"])
+    return path[::-1]
+
+
+def run(stages: List[Stage], values: Dict[str, Any] = None, job_dir: str = None) -> Tuple[Dict[str, Any], dict]:
+    """Run the graph. Returns (values, report); `values` holds every stage output.
+
+    Raises the first fatal stage error, or `Stop` (with `.report` set) if a stage stopped the run.
+    """
+    values = dict(values or {})
+    validate(stages, list(values))
+    producer = {out: s.name for s in stages for out in s.outputs}
+    t0 = time.monotonic()
+    # when each value became available (given values at 0)
+    ready_at = {k: t0 for k in values}
+    pending = list(stages)
+    running = {}
+    timings = {}
+    abort = None
+    while pending or running:
+        if abort is None:
+            for s in [s for s in pending if all(n in values for n in s.needs)]:
+                pending.remove(s)
+                kwargs = {n: values[n] for n in s.inputs}
+                # the input that arrived last is the one this stage waited on
+                last = max(s.needs, key=lambda n: ready_at[n], default=None)
+                timings[s.name] = {
+                    "ready": max((ready_at[n] for n in s.needs), default=t0),
+                    "after": producer.get(last) if last is not None else None,
+                }
+                running[submit_stage(s.kind, _execute, s, kwargs, job_dir)] = s
+        if not running:
+            break
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+        for fut in done:
+            s = running.pop(fut)
+            outcome = fut.result()
+            timings[s.name].update(start=outcome["started"], end=outcome["finished"], status=outcome["status"])
+            if outcome["error"] is not None and outcome["status"] != STOPPED:
+                timings[s.name]["error"] = str(outcome["error"])[:500]
+            if outcome["status"] in (FAILED, STOPPED):
+                abort = abort or outcome["error"]
+                continue
+            for k, v in outcome["outputs"].items():
+                values[k] = v
+                ready_at[k] = outcome["finished"]
+
+    for s in pending:
+        timings[s.name] = {"status": SKIPPED}
+    report = _report(timings, t0)
+    progress.set_critical_path({k: report[k] for k in ("critical_path", "critical_seconds", "wall_seconds")})
+    if isinstance(abort, Stop):
+        abort.report = report
+    if abort is not None:
+        raise abort
+    return values, report
+
+
+def _report(timings: Dict[str, dict], t0: float) -> dict:
+    path = critical_path(timings)
+    stages = {}
+    for name, t in timings.items():
+        row = {"status": t["status"]}
+        if t.get("end") is not None:
+            row.update(
+                start=round(t["start"] - t0, 3),
+                end=round(t["end"] - t0, 3),
+                seconds=round(t["end"] - t["start"], 3),
+                # time spent ready but waiting for a pool thread
+                queued=round(t["start"] - t["ready"], 3),
+                after=t.get("after"),
+            )
+        if t.get("error"):
+            row["error"] = t["error"]
+        stages[name] = row
+    ends = [r["end"] for r in stages.values() if "end" in r]
+    wall = max(ends) if ends else 0.0
+    return {
+        "wall_seconds": round(wall, 3),
+        # what the same stages would take one after another
+        "busy_seconds": round(sum(r.get("seconds", 0.0) for r in stages.values()), 3),
+        "critical_path": path,
+        "critical_seconds": round(sum(stages[n]["seconds"] + stages[n]["queued"] for n in path), 3),
+        "stages": stages,
+    }
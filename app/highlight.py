@@ -3,21 +3,55 @@
 The helper sends a prompt with the transcript and asks GPT to return a JSON array of highlights:
 [{"start": 12.3, "end": 14.7, "label": "funny", "caption": "Punchline: ..."}, ...]
 
+When local pre-scored candidate windows (see `prescore.py`) are passed in, only the transcript
+slices inside those windows are sent, with timestamps. `HIGHLIGHT_MODE` selects:
+- full: send the whole transcript (old behaviour),
+- prescore: send only the candidate slices (default),
+- local: never call the API; candidates become highlights directly (also the offline fallback).
+
 This is a best-effort heuristic for prototyping.
 """
 import os
 import httpx
 import json
-from .config import OPENAI_API_KEY
+from .config import OPENAI_API_KEY, OPENAI_API_BASE, HIGHLIGHT_MODE
+
+OPENAI_CHAT_URL = f"{OPENAI_API_BASE}/chat/completions"
+
+
+def _candidate_transcript(segments: list, candidates: list) -> str:
+    from .prescore import segments_in_windows
+
+    lines = []
+    for s in segments_in_windows(segments, candidates):
+        start = float(s.get("start", 0.0))
+        end = float(s.get("end", start))
+        lines.append(f"[{start:.1f}-{end:.1f}] {s.get('text', '').strip()}")
+    return "\n".join(lines)
+
+
+def local_highlights(segments: list, candidates: list, max_highlights: int = 5) -> list:
+    """Turn pre-scored candidate windows into highlights without calling the API."""
+    from .prescore import segments_in_windows
 
-OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+    out = []
+    for c in sorted(candidates, key=lambda c: c["score"], reverse=True)[:max_highlights]:
+        text = " ".join((s.get("text") or "").strip() for s in segments_in_windows(segments or [], [c]))
+        out.append({"start": c["start"], "end": c["end"], "label": c.get("label", "other"), "caption": text[:120]})
+    return sorted(out, key=lambda h: h["start"])
 
 
-def extract_highlights(transcript_text: str, max_highlights: int = 5) -> list:
+def extract_highlights(transcript_text: str, max_highlights: int = 5, segments: list = None, candidates: list = None) -> list:
     """Return a list of highlights with start/end/label/caption.
 
     If the API fails, returns an empty list.
     """
+    if candidates and (HIGHLIGHT_MODE == "local" or not OPENAI_API_KEY):
+        return local_highlights(segments, candidates, max_highlights)
+    if HIGHLIGHT_MODE == "prescore" and candidates and segments:
+        sliced = _candidate_transcript(segments, candidates)
+        if sliced:
+            transcript_text = sliced
     if not OPENAI_API_KEY or not transcript_text:
         return []
 
@@ -0,0 +1,675 @@
+"""End-to-end load-test harness with local stand-ins for the external services.
+
+Stand-ins (one local HTTP server plus a fake `yt-dlp` executable), each with a configurable
+latency (mean seconds, +/- jitter) and error rate:
+
+- YouTube Data API: `channels` (mine=true: the account behind the bearer token),
+  `subscriptions` (paged; each of the stand-in accounts follows its own overlapping share of
+  the N fake channels), `playlistItems` (a channel's uploads, newest first), `search` (latest
+  upload only) and `videos.list` (metadata that passes the prefilter);
+- OpenAI: transcriptions (verbose_json segments), moderations and chat completions
+  (highlights);
+- Telegram Bot API: every method answers ok; `sendVideo` calls are counted;
+- yt-dlp: `-J` prints an info dict, a download writes a real clip (a shared test-pattern video
+  with per-video noise audio, so fingerprints don't collide) when ffmpeg is available.
+
+The app is pointed at them through YOUTUBE_API_BASE, OPENAI_API_BASE, TELEGRAM_API_BASE and
+YTDLP_BIN (`StandIns.env()`), either in this process (`serve_in_process`) or as a separately
+started server. `run_load()` then publishes bursts of uploads and drives them through
+`/monitor/run_once` (detection by polling, retried while uploads are still undetected) or
+`/simulate_video`, samples `/scheduler/stats` and the app's resource use, and reports:
+
+- latency percentiles: upload -> detection (job queued), detection -> start, start ->
+  notification sent, and upload -> notification end to end;
+- throughput (finished jobs per minute), queue depth over time, per-stage durations;
+- resource use (CPU, RSS incl. ffmpeg children, threads, fds) and stand-in call/error counts
+  (with the Data API quota units spent).
+
+Nothing here imports the app's config: the environment must be set up before the app is.
+Usage: `python scripts/load_test.py --help`.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+SERVICES = ("youtube", "openai", "telegram", "yt-dlp")
+# Data API quota cost per call
+QUOTA_UNITS = {"subscriptions": 1, "playlistItems": 1, "channels": 1, "search": 100, "videos": 1}
+PERCENTILES = (50, 90, 95, 99)
+
+_SENTENCES = [
+    "halo semuanya selamat datang kembali di channel ini",
+    "hari ini kita akan mencoba sesuatu yang baru",
+    "ini momen lucu banget sampai ketawa",
+    "jangan lupa like dan subscribe ya",
+    "oke sekarang kita masuk ke bagian yang penting",
+    "wah ternyata hasilnya di luar dugaan",
+    "terima kasih sudah menonton sampai akhir",
+    "coba tebak apa yang terjadi selanjutnya",
+]
+
+FAKE_YTDLP = r'''#!{python}
+"""yt-dlp stand-in for the load test (see app/loadtest.py)."""
+import json, os, random, re, shutil, subprocess, sys, time, zlib
+
+latency = float(os.environ.get("LOADTEST_YTDLP_LATENCY", "1.0"))
+jitter = float(os.environ.get("LOADTEST_YTDLP_JITTER", "0.5"))
+error_rate = float(os.environ.get("LOADTEST_YTDLP_ERROR_RATE", "0"))
+seconds = float(os.environ.get("LOADTEST_MEDIA_SECONDS", "60"))
+base = os.environ.get("LOADTEST_BASE_MEDIA", "")
+
+args = sys.argv[1:]
+time.sleep(max(0.0, random.uniform(latency * (1 - jitter), latency * (1 + jitter))))
+if random.random() < error_rate:
+    sys.stderr.write("ERROR: stand-in download failure\n")
+    sys.exit(1)
+
+
+def video_id(url):
+    m = re.search(r"(?:v=|youtu\.be/|shorts/)([\w-]{{6,}})", url)
+    return m.group(1) if m else "unknown"
+
+
+if "-J" in args:
+    vid = video_id(args[-1])
+    print(json.dumps({{
+        "id": vid, "title": f"load test {{vid}}", "channel_id": "UCloadtest", "channel": "load test",
+        "duration": seconds, "upload_date": time.strftime("%Y%m%d"),
+        "formats": [{{"format_id": "18", "ext": "mp4", "width": 1280, "height": 720, "fps": 30,
+                     "vcodec": "avc1.64001f", "acodec": "mp4a.40.2", "tbr": 1500}}],
+    }}))
+    sys.exit(0)
+
+if "--load-info-json" in args:
+    with open(args[args.index("--load-info-json") + 1], "r", encoding="utf-8") as f:
+        vid = json.load(f)["id"]
+else:
+    vid = video_id(args[-1])
+out = args[args.index("-o") + 1].replace("%(ext)s", "mp4")
+if base and os.path.exists(base) and shutil.which("ffmpeg"):
+    # shared video, per-video noise audio: cheap to make and fingerprints stay distinct
+    seed = zlib.crc32(vid.encode()) & 0x7FFFFFFF
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", base,
+         "-f", "lavfi", "-i", f"anoisesrc=seed={{seed}}:duration={{seconds}}:amplitude=0.3",
+         "-map", "0:v", "-map", "1:a", "-c:v", "copy", "-c:a", "aac", "-shortest", out],
+        check=True,
+    )
+else:
+    with open(out, "wb") as f:
+        f.write(os.urandom(1024))
+'''
+
+
+@dataclass
+class Profile:
+    """Latency (mean seconds, +/- `jitter` as a fraction of it) and error rate of a stand-in."""
+
+    latency: float = 0.05
+    jitter: float = 0.5
+    error_rate: float = 0.0
+
+    def delay(self) -> float:
+        return max(0.0, random.uniform(self.latency * (1 - self.jitter), self.latency * (1 + self.jitter)))
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def parse_profiles(latency: str = "", errors: str = "", jitter: float = 0.5) -> Dict[str, Profile]:
+    """Profiles from `service=value` lists, e.g. latency "openai=1.5,yt-dlp=3", errors "openai=0.02"."""
+    profiles = {s: Profile(jitter=jitter) for s in SERVICES}
+    for spec, field in ((latency, "latency"), (errors, "error_rate")):
+        for item in filter(None, (p.strip() for p in (spec or "").split(","))):
+            name, _, value = item.partition("=")
+            if name not in profiles:
+                raise ValueError(f"unknown service {name!r} (one of {', '.join(SERVICES)})")
+            setattr(profiles[name], field, float(value))
+    return profiles
+
+
+class StandIns:
+    """Local stand-ins for the YouTube Data API, OpenAI, Telegram and yt-dlp."""
+
+    def __init__(self, channels: int = 50, profiles: Dict[str, Profile] = None, media_seconds: float = 60.0,
+                 work_dir: str = None, flag_rate: float = 0.02, seed: int = 0, accounts: int = 1):
+        self.profiles = profiles or parse_profiles()
+        self.media_seconds = media_seconds
+        self.flag_rate = flag_rate
+        self.work_dir = work_dir
+        self.channels = [f"UCload{i:04d}" for i in range(channels)]
+        self._rng = random.Random(seed)
+        # account token -> subscribed channels: every channel has one owner, plus ~1/3 of the
+        # other accounts following it too (overlap the app must deduplicate)
+        self.accounts = {f"loadtest-{a}": [] for a in range(max(1, accounts))}
+        tokens = list(self.accounts)
+        for i, ch in enumerate(self.channels):
+            for a, token in enumerate(tokens):
+                if a == i % len(tokens) or self._rng.random() < 1 / 3:
+                    self.accounts[token].append(ch)
+        self.uploads = {}  # channel id -> video ids, newest first
+        self.listed = set()  # video ids returned by any channel listing
+        self.last_listed = {}  # channel id -> time of its last successful listing
+        self.published = {}  # video id -> time published
+        self.channel_of = {}  # video id -> channel id
+        self.calls = {}
+        self.errors = {}
+        self.notifications = []  # (time, method)
+        self._lock = threading.Lock()
+        self._next = 0
+        self._server = None
+        self.url = None
+
+    # --- lifecycle -----------------------------------------------------------
+
+    def start(self) -> "StandIns":
+        handler = type("Handler", (_Handler,), {"standins": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, name="loadtest-standins", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def prepare(self) -> str:
+        """Write the yt-dlp stand-in (and its base clip, if ffmpeg is installed) to `work_dir/bin`."""
+        bin_dir = os.path.join(self.work_dir, "bin")
+        os.makedirs(bin_dir, exist_ok=True)
+        ytdlp = os.path.join(bin_dir, "yt-dlp")
+        with open(ytdlp, "w", encoding="utf-8") as f:
+            f.write(FAKE_YTDLP.format(python=sys.executable))
+        os.chmod(ytdlp, 0o755)
+        base = os.path.join(bin_dir, "base.mp4")
+        if shutil.which("ffmpeg") and not os.path.exists(base):
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+                 "-i", f"testsrc2=size=1280x720:rate=30:duration={self.media_seconds}",
+                 "-c:v", "libx264", "-preset", "ultrafast", "-g", "60", base],
+                check=True,
+            )
+        return ytdlp
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points the app at the stand-ins."""
+        p = self.profiles["yt-dlp"]
+        bin_dir = os.path.join(self.work_dir, "bin")
+        return {
+            "YOUTUBE_API_BASE": f"{self.url}/youtube/v3",
+            "OPENAI_API_BASE": f"{self.url}/openai/v1",
+            "OPENAI_API_KEY": "loadtest",
+            "TELEGRAM_API_BASE": f"{self.url}/telegram",
+            "TELEGRAM_BOT_TOKEN": "0:loadtest",
+            "TELEGRAM_CHAT_ID": "1",
+            # the stand-in is an executable: downloads must go through YTDLP_BIN
+            "DOWNLOADER": "subprocess",
+            "YTDLP_BIN": os.path.join(bin_dir, "yt-dlp"),
+            "LOADTEST_YTDLP_LATENCY": str(p.latency),
+            "LOADTEST_YTDLP_JITTER": str(p.jitter),
+            "LOADTEST_YTDLP_ERROR_RATE": str(p.error_rate),
+            "LOADTEST_MEDIA_SECONDS": str(self.media_seconds),
+            "LOADTEST_BASE_MEDIA": os.path.join(bin_dir, "base.mp4"),
+        }
+
+    # --- uploads -------------------------------------------------------------
+
+    def new_video(self, channel_id: str = None) -> str:
+        with self._lock:
+            self._next += 1
+            vid = f"lt{self._next:09d}"
+            self.published[vid] = time.time()
+            if channel_id:
+                self.uploads.setdefault(channel_id, []).insert(0, vid)
+                self.channel_of[vid] = channel_id
+        return vid
+
+    def publish(self, n: int) -> List[str]:
+        """A burst: `n` distinct channels upload a new video now."""
+        chosen = self._rng.sample(self.channels, min(n, len(self.channels)))
+        return [self.new_video(ch) for ch in chosen]
+
+    def missed(self, vid: str) -> bool:
+        """True if `vid` can no longer be found by polling: its channel was listed after the
+        upload but the listing didn't include it (superseded by newer uploads)."""
+        with self._lock:
+            ch = self.channel_of.get(vid)
+            return (ch is not None and vid not in self.listed
+                    and self.last_listed.get(ch, 0) > self.published[vid])
+
+    def _listing(self, channel_id: str, n: int) -> List[str]:
+        with self._lock:
+            vids = self.uploads.get(channel_id, [])[:n]
+            self.listed.update(vids)
+            self.last_listed[channel_id] = time.time()
+            return vids
+
+    def count(self, service: str, key: str, error: bool = False):
+        with self._lock:
+            bucket = self.errors if error else self.calls
+            bucket.setdefault(service, {})
+            bucket[service][key] = bucket[service].get(key, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            yt = self.calls.get("youtube", {})
+            return {
+                "calls": json.loads(json.dumps(self.calls)),
+                "errors": json.loads(json.dumps(self.errors)),
+                "youtube_quota_units": sum(QUOTA_UNITS.get(k, 1) * n for k, n in yt.items()),
+                "telegram_videos": sum(1 for _, m in self.notifications if m == "sendVideo"),
+                "profiles": {k: asdict(v) for k, v in self.profiles.items()},
+            }
+
+    # --- responses -----------------------------------------------------------
+
+    def youtube(self, endpoint: str, query: dict, authorization: str = None):
+        token = (authorization or "").replace("Bearer ", "", 1)
+        if endpoint == "channels":
+            if token not in self.accounts:
+                return {"items": []}
+            return {"items": [{"id": f"UCacct{token.rsplit('-', 1)[1]}", "snippet": {"title": token}}]}
+        if endpoint == "subscriptions":
+            # tokens the stand-in doesn't know (e.g. a hand-started app) see every channel
+            channels = self.accounts.get(token, self.channels)
+            start = int(query.get("pageToken", ["0"])[0])
+            size = int(query.get("maxResults", ["5"])[0])
+            page = {"items": [{"snippet": {"title": ch, "resourceId": {"kind": "youtube#channel", "channelId": ch}}}
+                              for ch in channels[start:start + size]]}
+            if start + size < len(channels):
+                page["nextPageToken"] = str(start + size)
+            return page
+        if endpoint == "playlistItems":
+            playlist = query.get("playlistId", [""])[0]
+            vids = self._listing("UC" + playlist[2:], int(query.get("maxResults", ["5"])[0]))
+            return {"items": [{"contentDetails": {"videoId": vid}} for vid in vids]}
+        if endpoint == "search":
+            vids = self._listing(query.get("channelId", [""])[0], 1)
+            return {"items": [{"id": {"kind": "youtube#video", "videoId": vid}} for vid in vids]}
+        if endpoint == "videos":
+            ids = ",".join(query.get("id", [])).split(",")
+            minutes = max(1, int(self.media_seconds // 60))
+            return {"items": [{
+                "id": vid,
+                "snippet": {"title": f"load test {vid}", "categoryId": "22", "liveBroadcastContent": "none", "tags": []},
+                "contentDetails": {"duration": f"PT{minutes}M"},
+                "player": {"embedWidth": "480", "embedHeight": "270"},
+            } for vid in ids if vid in self.published]}
+        return None
+
+    def transcription(self) -> dict:
+        segments = []
+        t = 0.0
+        while t < self.media_seconds:
+            end = min(self.media_seconds, t + 5.0)
+            segments.append({"start": t, "end": end, "text": random.choice(_SENTENCES)})
+            t = end
+        return {"text": " ".join(s["text"] for s in segments), "segments": segments}
+
+    def moderation(self) -> dict:
+        return {"results": [{"flagged": random.random() < self.flag_rate}]}
+
+    def chat(self) -> dict:
+        start = round(random.uniform(0, max(0.0, self.media_seconds - 5)), 1)
+        content = json.dumps([{"start": start, "end": start + 3, "label": "funny", "caption": "Momen lucu"}])
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    standins: StandIns = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        s = self.standins
+        if parts[:2] == ["youtube", "v3"] and len(parts) == 3:
+            service, key = "youtube", parts[2]
+        elif parts[:2] == ["openai", "v1"]:
+            service, key = "openai", "/".join(parts[2:])
+        elif parts and parts[0] == "telegram" and len(parts) == 3:
+            service, key = "telegram", parts[2]
+        else:
+            return self._send(404, {"error": "unknown stand-in path"})
+
+        profile = s.profiles[service]
+        time.sleep(profile.delay())
+        if profile.fails():
+            s.count(service, key, error=True)
+            return self._send(503 if service == "youtube" else 500, {"error": {"message": "stand-in failure"}})
+        s.count(service, key)
+
+        if service == "youtube":
+            body = s.youtube(key, parse_qs(url.query), self.headers.get("Authorization"))
+        elif key == "audio/transcriptions":
+            body = s.transcription()
+        elif key == "moderations":
+            body = s.moderation()
+        elif key == "chat/completions":
+            body = s.chat()
+        else:
+            # Bot API: every method succeeds and returns a minimal Message
+            with s._lock:
+                s.notifications.append((time.time(), key))
+            body = {"ok": True, "result": {"message_id": len(s.notifications), "date": int(time.time()),
+                                           "chat": {"id": 1, "type": "private"}}}
+        if body is None:
+            return self._send(404, {"error": "unknown endpoint"})
+        self._send(200, body)
+
+    do_GET = _route
+    do_POST = _route
+
+
+# --- the app under test -------------------------------------------------------
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_process(env: Dict[str, str], port: int = None, accounts: int = 1) -> str:
+    """Start the FastAPI app in this process with `env` applied and `accounts` stand-in
+    accounts authorized. Returns its base URL."""
+    os.environ.update(env)
+    import uvicorn
+    from . import main, accounts as app_accounts
+
+    # the stand-in Data API accepts these tokens; they never need refreshing
+    for a in range(accounts):
+        app_accounts.add_account(f"loadtest-{a}", "loadtest", time.time() + 365 * 86400)
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="loadtest-app", daemon=True).start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("app did not start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+# --- measurements -------------------------------------------------------------
+
+
+def percentiles(values: List[float], ps=PERCENTILES) -> Optional[dict]:
+    """Nearest-rank percentiles plus mean/max, or None without values."""
+    if not values:
+        return None
+    xs = sorted(values)
+    out = {f"p{p}": round(xs[min(len(xs) - 1, max(0, -(-p * len(xs) // 100) - 1))], 3) for p in ps}
+    out.update(mean=round(sum(xs) / len(xs), 3), max=round(xs[-1], 3), n=len(xs))
+    return out
+
+
+def _proc_stat(pid: int) -> Optional[List[str]]:
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # the command name may contain spaces: split after its closing parenthesis
+            return f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def sample_resources(pid: int) -> dict:
+    """CPU seconds (incl. reaped children such as ffmpeg), RSS, threads and fds of `pid` (Linux)."""
+    stat = _proc_stat(pid)
+    if stat is None:
+        return {}
+    tick = os.sysconf("SC_CLK_TCK")
+    # fields after the name start at state (field 3): utime=14, stime=15, cutime=16, cstime=17, threads=20
+    cpu = sum(int(stat[i]) for i in (11, 12, 13, 14)) / tick
+    children_rss = 0.0
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            child = _proc_stat(int(entry))
+            if child and child[1] == str(pid):
+                children_rss += _rss_mb(int(entry))
+    try:
+        fds = len(os.listdir(f"/proc/{pid}/fd"))
+    except OSError:
+        fds = None
+    return {
+        "cpu_seconds": cpu,
+        "rss_mb": round(_rss_mb(pid), 1),
+        "children_rss_mb": round(children_rss, 1),
+        "threads": int(stat[17]),
+        "fds": fds,
+        "load1": os.getloadavg()[0],
+    }
+
+
+class Sampler(threading.Thread):
+    """Samples queue depth (`/scheduler/stats`) and resource use every `every` seconds."""
+
+    def __init__(self, client, every: float = 1.0, pid: int = None):
+        super().__init__(name="loadtest-sampler", daemon=True)
+        self.client = client
+        self.every = every
+        self.pid = pid
+        self.samples = []
+        self._halt = threading.Event()
+        self.t0 = time.time()
+
+    def sample(self):
+        row = {"t": round(time.time() - self.t0, 2)}
+        try:
+            row.update(self.client.get("/scheduler/stats").json())
+        except Exception:
+            pass
+        if self.pid:
+            row.update(sample_resources(self.pid))
+        self.samples.append(row)
+
+    def run(self):
+        while not self._halt.wait(self.every):
+            self.sample()
+
+    def stop(self):
+        self._halt.set()
+        self.join(timeout=5)
+        self.sample()
+
+
+def _job(client, vid: str) -> Optional[dict]:
+    r = client.get(f"/jobs/{vid}")
+    return r.json() if r.status_code == 200 else None
+
+
+def _stage_end(job: dict, name: str) -> Optional[float]:
+    for s in job.get("stages", []):
+        if s.get("name") == name and s.get("finished") and s.get("status", "ok") == "ok":
+            return s["finished"]
+    return None
+
+
+def summarize(jobs: Dict[str, Optional[dict]], published: Dict[str, float], samples: List[dict],
+              standins: dict = None, missed: List[str] = ()) -> dict:
+    """Latency percentiles, throughput, queue depth and resource use from the collected jobs."""
+    detect, wait, processing, e2e, stage_secs = [], [], [], [], {}
+    finished = []
+    status = {"done": 0, "failed": 0, "running": 0, "queued": 0, "undetected": 0, "missed": 0}
+    for vid, job in jobs.items():
+        if job is None:
+            status["missed" if vid in missed else "undetected"] += 1
+            continue
+        status[job["status"]] = status.get(job["status"], 0) + 1
+        t_pub, t_queued, t_start = published[vid], job.get("queued"), job.get("started")
+        t_notified = _stage_end(job, "notify")
+        if t_queued:
+            detect.append(t_queued - t_pub)
+        if t_queued and t_start:
+            wait.append(t_start - t_queued)
+        if t_start and t_notified:
+            processing.append(t_notified - t_start)
+        if t_notified:
+            e2e.append(t_notified - t_pub)
+        if job["status"] in ("done", "failed"):
+            finished.append(job.get("updated") or 0)
+        for s in job.get("stages", []):
+            if s.get("finished"):
+                stage_secs.setdefault(s["name"], []).append(s["finished"] - s["started"])
+    window = (max(finished) - min(published.values())) if finished and published else 0
+    depth = [s.get("queued", 0) for s in samples]
+    cpu = [s["cpu_seconds"] for s in samples if "cpu_seconds" in s]
+    span = samples[-1]["t"] - samples[0]["t"] if len(samples) > 1 else 0
+    return {
+        "videos": len(jobs),
+        "status": status,
+        "notified": len(e2e),
+        "latency_seconds": {
+            "detect": percentiles(detect),
+            "queue_wait": percentiles(wait),
+            "processing": percentiles(processing),
+            "end_to_end": percentiles(e2e),
+        },
+        "throughput_per_minute": round(len(finished) / window * 60, 3) if window > 0 else None,
+        "queue_depth": {
+            "max": max(depth) if depth else None,
+            "mean": round(sum(depth) / len(depth), 2) if depth else None,
+            "timeline": [{k: s.get(k) for k in ("t", "queued", "running", "completed", "failed")} for s in samples],
+        },
+        "resources": {
+            "cpu_seconds": round(cpu[-1] - cpu[0], 2) if cpu else None,
+            "mean_cpu_percent": round((cpu[-1] - cpu[0]) / span * 100, 1) if cpu and span else None,
+            "peak_rss_mb": max((s.get("rss_mb", 0) for s in samples), default=None),
+            "peak_children_rss_mb": max((s.get("children_rss_mb", 0) for s in samples), default=None),
+            "peak_threads": max((s.get("threads", 0) for s in samples), default=None),
+            "peak_fds": max((s.get("fds") or 0 for s in samples), default=None),
+            "timeline": [{k: s.get(k) for k in ("t", "cpu_seconds", "rss_mb", "children_rss_mb", "threads", "load1")}
+                         for s in samples if "cpu_seconds" in s],
+        },
+        "stage_seconds": {k: percentiles(v, (50, 95)) for k, v in sorted(stage_secs.items())},
+        "stand_ins": standins or {},
+    }
+
+
+def run_load(app_url: str, standins: StandIns, bursts: int = 3, burst_size: int = 20, interval: float = 60.0,
+             mode: str = "monitor", timeout: float = 1800.0, poll_every: float = 15.0, sample_every: float = 1.0,
+             pid: int = None, on_progress=None) -> dict:
+    """Publish `bursts` bursts of `burst_size` uploads `interval` seconds apart and drive them
+    through the app (`mode`: monitor | simulate) until every job ends or `timeout` passes."""
+    import httpx
+
+    if mode not in ("monitor", "simulate"):
+        raise ValueError("mode must be monitor or simulate")
+    client = httpx.Client(base_url=app_url, timeout=30)
+    sampler = Sampler(client, sample_every, pid)
+    sampler.sample()
+    sampler.start()
+    expected = []
+    started = time.time()
+    next_burst, next_poll, burst = started, 0.0, 0
+    try:
+        while True:
+            now = time.time()
+            if burst < bursts and now >= next_burst:
+                if mode == "monitor":
+                    expected += standins.publish(burst_size)
+                    next_poll = now
+                else:
+                    for _ in range(burst_size):
+                        vid = standins.new_video()
+                        expected.append(vid)
+                        client.post("/simulate_video", params={"video_id": vid})
+                burst += 1
+                next_burst = now + interval
+            jobs = {vid: _job(client, vid) for vid in expected}
+            # uploads a poll listed past (superseded by newer ones) can't be detected any more
+            missed = [v for v, j in jobs.items() if j is None and standins.missed(v)]
+            undetected = [v for v, j in jobs.items() if j is None and v not in missed]
+            pending = undetected + [v for v, j in jobs.items() if j is not None and j["status"] not in ("done", "failed")]
+            # detection only happens on a poll: repeat it while uploads are still unseen
+            # (stand-in API errors make a poll miss channels, like the real reconciliation loop)
+            if mode == "monitor" and undetected and now >= next_poll:
+                client.post("/monitor/run_once")
+                next_poll = now + poll_every
+            if on_progress:
+                on_progress({"elapsed": now - started, "bursts": burst, "expected": len(expected),
+                             "pending": len(pending), "undetected": len(undetected), "missed": len(missed)})
+            if burst >= bursts and not pending:
+                break
+            if now - started > timeout:
+                break
+            time.sleep(0.5)
+    finally:
+        sampler.stop()
+    jobs = {vid: _job(client, vid) for vid in expected}
+    try:
+        # Data API units each app account spent (channels shared by accounts are polled once)
+        app_accounts = {a["id"]: (a.get("quota") or {}).get("used", 0) for a in client.get("/accounts").json()["accounts"]}
+    except Exception:
+        app_accounts = {}
+    client.close()
+    missed = [v for v, j in jobs.items() if j is None and standins.missed(v)]
+    report = summarize(jobs, {v: standins.published[v] for v in expected}, sampler.samples, standins.summary(), missed)
+    report["stand_ins"]["account_quota_units"] = app_accounts
+    report["config"] = {"mode": mode, "bursts": bursts, "burst_size": burst_size, "interval": interval,
+                        "channels": len(standins.channels), "accounts": len(standins.accounts),
+                        "subscriptions": sum(len(c) for c in standins.accounts.values()),
+                        "media_seconds": standins.media_seconds,
+                        "timed_out": time.time() - started > timeout}
+    return report
+
+
+def compare(before: dict, after: dict) -> List[str]:
+    """Lines comparing the headline numbers of two reports (e.g. before/after a change)."""
+    lines = []
+
+    def row(label, a, b):
+        if a is None or b is None:
+            lines.append(f"{label:<28} {a!s:>10} -> {b!s:>10}")
+            return
+        pct = (b - a) / a * 100 if a else 0.0
+        lines.append(f"{label:<28} {a:>10.3f} -> {b:>10.3f} ({pct:+.1f}%)")
+
+    for key in ("detect", "processing", "end_to_end"):
+        for p in ("p50", "p95"):
+            a = (before["latency_seconds"].get(key) or {}).get(p)
+            b = (after["latency_seconds"].get(key) or {}).get(p)
+            row(f"{key} {p} (s)", a, b)
+    row("throughput (jobs/min)", before.get("throughput_per_minute"), after.get("throughput_per_minute"))
+    row("max queue depth", before["queue_depth"].get("max"), after["queue_depth"].get("max"))
+    row("cpu seconds", before["resources"].get("cpu_seconds"), after["resources"].get("cpu_seconds"))
+    row("peak rss (MB)", before["resources"].get("peak_rss_mb"), after["resources"].get("peak_rss_mb"))
+    return lines
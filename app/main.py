@@ -1,12 +1,33 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import RedirectResponse, JSONResponse
-from . import oauth, youtube_monitor, process
-from .config import SHORT_MAX_SECONDS
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, BackgroundTasks, Response
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from . import accounts, downloader, oauth, youtube_monitor, process, scheduler, artifacts, websub, progress, storage, transcript_index
+from .config import SHORT_MAX_SECONDS, WARM_WORKERS, WEBSUB_CALLBACK_URL
 from .telegram_test_endpoint import router as telegram_test_router
 
-app.include_router(telegram_test_router)
 
-app = FastAPI(title="yt-short-proto")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm the worker pools in the background so /health is served right away
+    if WARM_WORKERS:
+        threading.Thread(target=process.warm_workers, name="warm-workers", daemon=True).start()
+    # WebSub lease renewal + slow polling fallback
+    stop = threading.Event()
+    if WEBSUB_CALLBACK_URL:
+        threading.Thread(target=websub.run_renewal_loop, args=(stop,), name="websub-renew", daemon=True).start()
+    threading.Thread(target=youtube_monitor.run_reconciliation_loop, args=(stop,), name="monitor-poll", daemon=True).start()
+    yield
+    stop.set()
+    # save the shared download cookie jar, close pooled connections
+    downloader.close()
+
+
+app = FastAPI(title="yt-short-proto", lifespan=lifespan)
+
+app.include_router(telegram_test_router)
 
 
 @app.get("/health")
@@ -25,22 +46,139 @@ async def auth_callback(request: Request):
     code = request.query_params.get("code")
     if not code:
         return JSONResponse({"error": "missing code"}, status_code=400)
-    oauth.finish_flow(code)
-    return JSONResponse({"status": "authorized"})
+    account = oauth.finish_flow(code)
+    return JSONResponse({"status": "authorized", "account": account})
+
+
+@app.get("/accounts")
+async def accounts_list():
+    # authorized accounts: subscriptions, quota left today, auth errors (no tokens)
+    return {"accounts": accounts.list_accounts()}
+
+
+@app.delete("/accounts/{account_id}")
+async def accounts_remove(account_id: str):
+    if not accounts.remove_account(account_id):
+        return JSONResponse({"error": "unknown account"}, status_code=404)
+    return {"status": "removed", "account": account_id}
 
 
 @app.post("/monitor/run_once")
 async def monitor_run_once(background_tasks: BackgroundTasks):
     # Run a single check for new uploads (dev)
-    if not oauth.TOKENS.get("access_token"):
+    if not accounts.account_ids():
         return JSONResponse({"error": "not authorized"}, status_code=400)
     background_tasks.add_task(youtube_monitor.check_subscriptions_once)
     return {"status": "monitor_queued"}
 
 
 @app.post("/simulate_video")
-async def simulate_video(background_tasks: BackgroundTasks):
-    # Dev helper: simulate a new upload to trigger processing
-    test_url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
-    background_tasks.add_task(process.handle_new_video, test_url, max_duration=SHORT_MAX_SECONDS)
+async def simulate_video(background_tasks: BackgroundTasks, video_id: str = "dQw4w9WgXcQ"):
+    # Dev helper: simulate a new upload to trigger processing (distinct ids run as separate jobs)
+    test_url = f"https://www.youtube.com/watch?v={video_id}"
+    # the scheduler runs the job's stages in the CPU / I/O pools
+    background_tasks.add_task(process.submit_video, test_url, max_duration=SHORT_MAX_SECONDS)
     return {"status": "queued", "url": test_url}
+
+
+@app.get("/websub/callback")
+async def websub_verify(request: Request):
+    # hub verification of (un)subscribe requests: echo hub.challenge for topics we asked for
+    ok, challenge = websub.verify_challenge(dict(request.query_params))
+    if not ok:
+        return PlainTextResponse("unknown subscription", status_code=404)
+    return PlainTextResponse(challenge)
+
+
+@app.post("/websub/callback")
+async def websub_notify(request: Request, background_tasks: BackgroundTasks):
+    body = await request.body()
+    if not websub.verify_signature(body, request.headers.get("X-Hub-Signature")):
+        # per spec: acknowledge, but ignore content with a bad signature
+        return Response(status_code=202)
+    # the prefilter and token refresh block: acknowledge now, handle in the threadpool
+    background_tasks.add_task(websub.handle_notification, body)
+    return Response(status_code=204)
+
+
+@app.post("/websub/subscribe")
+def websub_subscribe(channel_id: str):
+    # dev helper: subscribe one channel without waiting for the next poll
+    # (plain def: the hub POST runs in the threadpool, not on the event loop)
+    return {"accepted": websub.subscribe(channel_id), "channel_id": channel_id}
+
+
+@app.get("/jobs")
+async def jobs_list():
+    return progress.list_jobs()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    # current stage, percent complete, encode fps and ETA of a job
+    job = progress.get_job(job_id)
+    if job is None:
+        return JSONResponse({"error": "unknown job"}, status_code=404)
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: the job snapshot, then every stage / encode update until it ends."""
+    job = progress.get_job(job_id)
+    if job is None:
+        return JSONResponse({"error": "unknown job"}, status_code=404)
+    q = progress.subscribe(job_id)
+
+    async def stream():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(job)}\n\n"
+            if job["status"] in ("done", "failed"):
+                return
+            while True:
+                try:
+                    ev = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # keep-alive comment for proxies
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {ev.get('type', 'message')}\ndata: {json.dumps(ev)}\n\n"
+                if ev.get("type") == "status" and ev.get("status") in ("done", "failed"):
+                    return
+        finally:
+            progress.unsubscribe(q)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return scheduler.stats()
+
+
+@app.get("/storage/usage")
+async def storage_usage():
+    # disk use per job (deliverables vs intermediates) and the configured quota
+    return artifacts.usage()
+
+
+@app.get("/transcripts/search")
+def transcripts_search(q: str, channel_id: str = None, video_id: str = None, limit: int = 20):
+    # matching moments across all indexed transcripts, with timestamps and a link to the moment
+    # (plain def: the SQLite queries run in the threadpool, not on the event loop)
+    return {"query": q, "results": transcript_index.search(q, limit=limit, channel_id=channel_id, video_id=video_id)}
+
+
+@app.get("/transcripts/{video_id}")
+def transcript(video_id: str, start: float = None, end: float = None):
+    # indexed transcript of a past video (optionally a time range), e.g. to build a short from it
+    video = transcript_index.get_video(video_id)
+    if video is None:
+        return JSONResponse({"error": "not indexed"}, status_code=404)
+    return {"video": video, "segments": transcript_index.get_segments(video_id, start, end)}
+
+
+@app.get("/prefilter/rejections")
+async def prefilter_rejections():
+    # uploads the metadata prefilter skipped, with the rule that rejected them
+    return storage.get_rejections()
@@ -4,11 +4,14 @@ Functions:
 - moderate_text(text) -> bool/response: call OpenAI moderation endpoint
 - moderate_segments(segments) -> list of flagged segment indexes
 - load_local_keywords() -> list of keywords
+- get_keywords() -> cached, lower-cased keywords (re-read only when the file changes)
+
+Segments that miss the keywords are pre-sorted by the local classifier in `moderation_model.py`.
 """
 import os
 import httpx
 from typing import List
-from .config import OPENAI_API_KEY
+from .config import OPENAI_API_KEY, OPENAI_API_BASE, MODERATION_LOCAL
 
 KEYWORDS_FILE = os.path.join(os.path.dirname(__file__), "..", "sara_keywords.txt")
 
@@ -21,7 +24,21 @@ def load_local_keywords() -> List[str]:
     return kws
 
 
-MODERATION_URL = "https://api.openai.com/v1/moderations"
+_keyword_cache = {"mtime": None, "keywords": []}
+
+
+def get_keywords() -> List[str]:
+    try:
+        mtime = os.path.getmtime(KEYWORDS_FILE)
+    except OSError:
+        mtime = None
+    if mtime != _keyword_cache["mtime"] or mtime is None:
+        _keyword_cache["keywords"] = [k.lower() for k in load_local_keywords()]
+        _keyword_cache["mtime"] = mtime
+    return _keyword_cache["keywords"]
+
+
+MODERATION_URL = f"{OPENAI_API_BASE}/moderations"
 
 
 def moderate_text(text: str) -> dict:
@@ -42,9 +59,14 @@ def moderate_text(text: str) -> dict:
 def moderate_segments(segments: List[dict]) -> List[int]:
     """Given segments (each with 'start','end','text'), return list of indexes flagged as SARA.
 
-    Strategy: run OpenAI moderation per segment if key present, and also check local keyword list.
+    Strategy: check the local keyword list, then the local classifier (`moderation_model`);
+    only segments it is uncertain about (or all, while there is no model yet) go to the OpenAI
+    moderation endpoint. API verdicts are recorded as training data for the classifier.
     """
-    kws = [k.lower() for k in load_local_keywords()]
+    from . import moderation_model
+
+    kws = get_keywords()
+    model = moderation_model.get_model() if MODERATION_LOCAL else None
     flagged = []
     for i, s in enumerate(segments):
         txt = s.get("text", "")
@@ -55,8 +77,16 @@ def moderate_segments(segments: List[dict]) -> List[int]:
             if k and k in lower:
                 is_flagged = True
                 break
+        # local classifier: clear cases are decided without an API call
+        if not is_flagged and model is not None:
+            label, _ = moderation_model.classify(model, txt)
+            if label == moderation_model.UNSAFE:
+                flagged.append(i)
+                continue
+            if label == moderation_model.SAFE:
+                continue
         # moderation API
-        if not is_flagged and OPENAI_API_KEY:
+        if not is_flagged and OPENAI_API_KEY and txt.strip():
             res = moderate_text(txt)
             # best-effort: check `results` or `model` response; OpenAI moderation returns `results` list
             try:
@@ -65,6 +95,7 @@ def moderate_segments(segments: List[dict]) -> List[int]:
                     r0 = results[0]
                     if r0.get("flagged"):
                         is_flagged = True
+                    moderation_model.record_verdict(txt, is_flagged)
             except Exception:
                 pass
         if is_flagged:
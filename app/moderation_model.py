@@ -0,0 +1,285 @@
+"""Local moderation prefilter: character n-gram naive Bayes (pure Python).
+
+Most transcript segments ("halo semuanya") are obviously fine, yet every segment that missed
+the keyword list used to go to the remote moderation endpoint. This classifier sorts segments
+into three bins before that call:
+
+- `safe`      (P(unsafe) < MODERATION_SAFE_BELOW):   not sent, not flagged;
+- `unsafe`    (P(unsafe) > MODERATION_UNSAFE_ABOVE): flagged without an API call;
+- `uncertain` (in between):                          sent to the API as before.
+
+Training data:
+- every line of `sara_keywords.txt` as an unsafe example;
+- past verdicts of the moderation API, appended to `moderation_verdicts.jsonl` by
+  `moderation.moderate_segments` (text + flagged), last verdict per text wins.
+
+Features are character 2-4-grams of the lower-cased text with whitespace collapsed, which
+copes with Indonesian affixes, slang spellings and typos without a tokenizer. `explain()` lists
+the n-grams that pushed a text towards unsafe. Text made mostly of n-grams the model has never
+seen is always uncertain, since naive Bayes is confidently wrong on it.
+
+Until both classes have MODERATION_MIN_EXAMPLES examples there is no model and every segment
+goes to the API, which is also how the verdicts to train on are collected. Retrain with
+`python scripts/train_moderation.py` (writes the model and a cross-validated evaluation report).
+"""
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import (
+    OUTPUT_DIR,
+    MODERATION_SAFE_BELOW,
+    MODERATION_UNSAFE_ABOVE,
+    MODERATION_MIN_EXAMPLES,
+)
+
+MODEL_PATH = os.path.join(OUTPUT_DIR, "moderation_model.json")
+VERDICTS_PATH = os.path.join(OUTPUT_DIR, "moderation_verdicts.jsonl")
+REPORT_PATH = os.path.join(OUTPUT_DIR, "moderation_eval.json")
+
+NGRAM_RANGE = (2, 4)
+ALPHA = 0.5
+# keep the model file small: only the most frequent n-grams
+MAX_VOCAB = 50000
+# naive Bayes is overconfident on text unlike anything it was trained on: below this share of
+# known n-grams a segment is always uncertain
+MIN_COVERAGE = 0.8
+
+SAFE = "safe"
+UNSAFE = "unsafe"
+UNCERTAIN = "uncertain"
+
+_lock = threading.Lock()
+_model_cache = {"mtime": None, "model": None}
+_WS = re.compile(r"\s+")
+
+
+def ngrams(text: str) -> Counter:
+    t = " " + _WS.sub(" ", (text or "").lower()).strip() + " "
+    out = Counter()
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(t) - n + 1):
+            out[t[i:i + n]] += 1
+    return out
+
+
+# --- training data ----------------------------------------------------------
+
+
+def record_verdict(text: str, flagged: bool, source: str = "api"):
+    """Append a moderation verdict (training data for the next retrain)."""
+    if not text or not text.strip():
+        return
+    line = json.dumps({"text": text, "flagged": bool(flagged), "source": source, "ts": time.time()}, ensure_ascii=False)
+    with _lock:
+        with open(VERDICTS_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def load_verdicts(path: str = None) -> List[Tuple[str, bool]]:
+    """(text, flagged) pairs from the verdict log; the latest verdict for a text wins."""
+    path = path or VERDICTS_PATH
+    if not os.path.exists(path):
+        return []
+    latest = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                v = json.loads(line)
+            except ValueError:
+                continue
+            text = (v.get("text") or "").strip()
+            if text:
+                latest[text] = bool(v.get("flagged"))
+    return list(latest.items())
+
+
+def training_examples(keywords: Iterable[str] = None, verdicts: List[Tuple[str, bool]] = None) -> List[Tuple[str, bool]]:
+    if keywords is None:
+        from .moderation import load_local_keywords
+
+        keywords = load_local_keywords()
+    if verdicts is None:
+        verdicts = load_verdicts()
+    return [(k, True) for k in keywords if k.strip()] + list(verdicts)
+
+
+# --- model ------------------------------------------------------------------
+
+
+def train(examples: List[Tuple[str, bool]]) -> dict:
+    """Fit the multinomial naive Bayes model on (text, unsafe) examples."""
+    counts = {SAFE: Counter(), UNSAFE: Counter()}
+    docs = Counter()
+    for text, unsafe in examples:
+        cls = UNSAFE if unsafe else SAFE
+        counts[cls].update(ngrams(text))
+        docs[cls] += 1
+    total = counts[SAFE] + counts[UNSAFE]
+    vocab = [g for g, _ in total.most_common(MAX_VOCAB)]
+    keep = set(vocab)
+    model = {
+        "trained_at": time.time(),
+        "docs": {SAFE: docs[SAFE], UNSAFE: docs[UNSAFE]},
+        "vocab_size": len(vocab),
+        "counts": {c: {g: n for g, n in counts[c].items() if g in keep} for c in (SAFE, UNSAFE)},
+    }
+    model["totals"] = {c: sum(model["counts"][c].values()) for c in (SAFE, UNSAFE)}
+    return model
+
+
+def usable(model: Optional[dict]) -> bool:
+    return bool(model) and min(model["docs"][SAFE], model["docs"][UNSAFE]) >= MODERATION_MIN_EXAMPLES
+
+
+def _contributions(model: dict, text: str) -> Dict[str, float]:
+    """Per-n-gram log-likelihood ratio (unsafe vs safe), times its count in `text`."""
+    v = model["vocab_size"]
+    cs, cu = model["counts"][SAFE], model["counts"][UNSAFE]
+    ds = model["totals"][SAFE] + ALPHA * v
+    du = model["totals"][UNSAFE] + ALPHA * v
+    out = {}
+    for g, n in ngrams(text).items():
+        if g not in cs and g not in cu:
+            continue
+        out[g] = n * (math.log((cu.get(g, 0) + ALPHA) / du) - math.log((cs.get(g, 0) + ALPHA) / ds))
+    return out
+
+
+def predict(model: dict, text: str) -> float:
+    """P(unsafe | text)."""
+    docs = model["docs"]
+    prior = math.log((docs[UNSAFE] + 1) / (docs[SAFE] + 1))
+    z = prior + sum(_contributions(model, text).values())
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-min(z, 700)))
+    e = math.exp(max(z, -700))
+    return e / (1.0 + e)
+
+
+def coverage(model: dict, text: str) -> float:
+    """Share of the text's n-grams (by count) that the model has seen."""
+    grams = ngrams(text)
+    total = sum(grams.values())
+    if not total:
+        return 0.0
+    cs, cu = model["counts"][SAFE], model["counts"][UNSAFE]
+    return sum(n for g, n in grams.items() if g in cs or g in cu) / total
+
+
+def classify(model: dict, text: str, safe_below: float = None, unsafe_above: float = None) -> Tuple[str, float]:
+    """Return (safe | unsafe | uncertain, P(unsafe))."""
+    safe_below = MODERATION_SAFE_BELOW if safe_below is None else safe_below
+    unsafe_above = MODERATION_UNSAFE_ABOVE if unsafe_above is None else unsafe_above
+    if not (text or "").strip():
+        return SAFE, 0.0
+    p = predict(model, text)
+    if coverage(model, text) < MIN_COVERAGE:
+        return UNCERTAIN, p
+    if p < safe_below:
+        return SAFE, p
+    if p > unsafe_above:
+        return UNSAFE, p
+    return UNCERTAIN, p
+
+
+def explain(model: dict, text: str, k: int = 5) -> List[Tuple[str, float]]:
+    """The k n-grams that pushed `text` most towards unsafe (positive) or safe (negative)."""
+    contrib = _contributions(model, text)
+    return sorted(contrib.items(), key=lambda kv: -abs(kv[1]))[:k]
+
+
+def save_model(model: dict, path: str = None):
+    path = path or MODEL_PATH
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def get_model() -> Optional[dict]:
+    """The saved model (re-read when the file changes), or None if missing / too little data."""
+    try:
+        mtime = os.path.getmtime(MODEL_PATH)
+    except OSError:
+        _model_cache.update(mtime=None, model=None)
+        return None
+    if mtime != _model_cache["mtime"]:
+        try:
+            with open(MODEL_PATH, "r", encoding="utf-8") as f:
+                model = json.load(f)
+        except (OSError, ValueError):
+            model = None
+        _model_cache.update(mtime=mtime, model=model if usable(model) else None)
+    return _model_cache["model"]
+
+
+# --- evaluation -------------------------------------------------------------
+
+
+def evaluate(examples: List[Tuple[str, bool]], keywords: Iterable[str] = (), folds: int = 5, seed: int = 0) -> dict:
+    """k-fold cross-validation over `examples` (keywords stay in every training fold).
+
+    Reports how many segments the model would decide locally, how often those decisions
+    disagree with the API verdict, and how many unsafe segments it would wave through.
+    """
+    data = list(examples)
+    random.Random(seed).shuffle(data)
+    folds = max(2, min(folds, len(data))) if len(data) >= 2 else 0
+    kw = [(k, True) for k in keywords if k.strip()]
+    tally = Counter()
+    for f in range(folds):
+        test = data[f::folds]
+        train_set = [e for i, e in enumerate(data) if i % folds != f] + kw
+        model = train(train_set)
+        for text, unsafe in test:
+            label, _ = classify(model, text)
+            tally[(label, unsafe)] += 1
+    n = sum(tally.values())
+    decided = n - tally[(UNCERTAIN, True)] - tally[(UNCERTAIN, False)]
+    wrong = tally[(SAFE, True)] + tally[(UNSAFE, False)]
+    unsafe_total = tally[(SAFE, True)] + tally[(UNSAFE, True)] + tally[(UNCERTAIN, True)]
+    return {
+        "examples": n,
+        "folds": folds,
+        "thresholds": {"safe_below": MODERATION_SAFE_BELOW, "unsafe_above": MODERATION_UNSAFE_ABOVE},
+        "confusion": {f"{label}/{'unsafe' if u else 'safe'}": c for (label, u), c in sorted(tally.items())},
+        "api_fraction": (n - decided) / n if n else None,
+        "local_fraction": decided / n if n else None,
+        "local_accuracy": (decided - wrong) / decided if decided else None,
+        # unsafe segments classified safe: never reach the API, never get censored
+        "missed_unsafe": tally[(SAFE, True)],
+        "missed_unsafe_rate": tally[(SAFE, True)] / unsafe_total if unsafe_total else None,
+        # safe segments the model would censor on its own
+        "false_unsafe": tally[(UNSAFE, False)],
+    }
+
+
+def retrain(folds: int = 5, save: bool = True) -> dict:
+    """Evaluate on the current data, fit on all of it and save model + report. Returns the report."""
+    from .moderation import load_local_keywords
+
+    keywords = load_local_keywords()
+    verdicts = load_verdicts()
+    report = evaluate(verdicts, keywords, folds=folds)
+    model = train(training_examples(keywords, verdicts))
+    report.update(
+        trained_at=model["trained_at"],
+        keywords=len(keywords),
+        verdicts=len(verdicts),
+        docs=model["docs"],
+        vocab_size=model["vocab_size"],
+        usable=usable(model),
+        min_examples=MODERATION_MIN_EXAMPLES,
+    )
+    if save:
+        save_model(model)
+        with open(REPORT_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
@@ -1,20 +1,21 @@
 """Minimal OAuth helpers (dev scaffold).
 
 This uses google_auth_oauthlib to create an authorization URL and exchange code for tokens.
-For production, persist refresh tokens securely.
+Each authorization adds (or updates) an account in `accounts`, which persists the refresh
+token and keeps the access token fresh; any number of operator accounts can be authorized.
+google_auth_oauthlib is imported on first use so it doesn't slow down app start-up.
 """
-from google_auth_oauthlib.flow import Flow
 from .config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, OAUTH_REDIRECT
-
-# For demo we keep tokens in memory
-TOKENS = {}
+from . import accounts
 
 SCOPES = [
     "https://www.googleapis.com/auth/youtube.readonly"
 ]
 
 
-def get_authorize_url():
+def _flow():
+    from google_auth_oauthlib.flow import Flow
+
     flow = Flow.from_client_config(
         {
             "installed": {
@@ -22,34 +23,25 @@ def get_authorize_url():
                 "client_secret": GOOGLE_CLIENT_SECRET,
                 "redirect_uris": [OAUTH_REDIRECT],
                 "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "token_uri": accounts.TOKEN_URI,
             }
         },
         scopes=SCOPES,
     )
     flow.redirect_uri = OAUTH_REDIRECT
-    auth_url, _ = flow.authorization_url(access_type="offline", include_granted_scopes="true")
+    return flow
+
+
+def get_authorize_url():
+    # prompt=consent: Google only returns a refresh token when the consent screen is shown,
+    # so re-authorizing an account (e.g. after revoking access) still yields one
+    auth_url, _ = _flow().authorization_url(access_type="offline", include_granted_scopes="true", prompt="consent")
     return auth_url
 
 
 def finish_flow(code: str):
-    flow = Flow.from_client_config(
-        {
-            "installed": {
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "redirect_uris": [OAUTH_REDIRECT],
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-            }
-        },
-        scopes=SCOPES,
-    )
-    flow.redirect_uri = OAUTH_REDIRECT
+    """Exchange `code` for tokens and store the account. Returns its public record."""
+    flow = _flow()
     flow.fetch_token(code=code)
     creds = flow.credentials
-    TOKENS["access_token"] = creds.token
-    TOKENS["refresh_token"] = creds.refresh_token
-    TOKENS["scopes"] = creds.scopes
-    # In production, persist tokens to DB or secure store
-    return TOKENS
+    return accounts.add_account(creds.token, creds.refresh_token, creds.expiry, creds.scopes)
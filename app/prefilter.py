@@ -0,0 +1,162 @@
+"""Metadata prefilter for new uploads, applied before anything is downloaded.
+
+New video ids (from polling or WebSub) are looked up with `videos.list` in batches of 50 ids
+per call (one quota unit each) and checked against configurable rules:
+
+- live status: live streams, upcoming streams and premieres are rejected (PREFILTER_REJECT_LIVE);
+- duration: outside [PREFILTER_MIN_SECONDS, PREFILTER_MAX_SECONDS] (e.g. multi-hour streams);
+- category: not in PREFILTER_CATEGORIES (allow list) or in PREFILTER_BLOCKED_CATEGORIES;
+- already vertical: the upload is already a Short (PREFILTER_REJECT_VERTICAL). The aspect ratio
+  comes from the `player` part (embed size requested with maxHeight), with a `#shorts` tag
+  fallback.
+
+Rejections are recorded in the state store (`storage.record_rejection`). Live/upcoming videos
+(and ids the API doesn't return yet) are also forgotten as "seen", so the notification sent
+when the stream ends can enqueue them again. If the API can't be reached, every video is let
+through (the prefilter only saves work).
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .config import (
+    PREFILTER_ENABLED,
+    PREFILTER_MIN_SECONDS,
+    PREFILTER_MAX_SECONDS,
+    PREFILTER_REJECT_LIVE,
+    PREFILTER_REJECT_VERTICAL,
+    PREFILTER_CATEGORIES,
+    PREFILTER_BLOCKED_CATEGORIES,
+    YOUTUBE_API_KEY,
+    YOUTUBE_API_BASE,
+)
+from . import storage
+
+BATCH_SIZE = 50
+PARTS = "snippet,contentDetails,liveStreamingDetails,player"
+# reasons that may change later (stream ends, premiere airs, upload finishes processing):
+# don't keep the id as seen
+RETRYABLE = ("live", "upcoming", "unavailable")
+# Shorts are at most 3 minutes; a vertical video longer than that is treated as a normal upload
+SHORTS_MAX_SECONDS = 180
+
+_DURATION_RE = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$")
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """ISO 8601 duration (`PT1H2M3S`, `P1DT2H`) to seconds; None if missing or malformed."""
+    m = _DURATION_RE.match(value or "")
+    if not m or not value or value in ("P", "PT"):
+        return None
+    days, hours, minutes, seconds = m.groups()
+    return int(days or 0) * 86400 + int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds or 0)
+
+
+def _auth(calls: int = 1) -> Tuple[Optional[dict], dict]:
+    """(headers, params) for `calls` Data API calls: the authorized account with the most quota
+    left (charged for them), else the API key."""
+    from . import accounts
+
+    account_id = accounts.pick(units=calls)
+    if account_id:
+        try:
+            headers = accounts.headers(account_id)
+        except Exception as e:
+            print("Prefilter account unavailable:", e)
+        else:
+            accounts.charge(account_id, calls)
+            return headers, {}
+    if YOUTUBE_API_KEY:
+        return {}, {"key": YOUTUBE_API_KEY}
+    return None, {}
+
+
+def fetch_metadata(video_ids: List[str], headers: dict = None, params: dict = None) -> Dict[str, dict]:
+    """`videos.list` items keyed by id, 50 ids per call. Ids the API doesn't return are missing."""
+    import requests
+
+    out = {}
+    for i in range(0, len(video_ids), BATCH_SIZE):
+        batch = video_ids[i:i + BATCH_SIZE]
+        q = dict(params or {}, part=PARTS, id=",".join(batch), maxResults=BATCH_SIZE, maxHeight=720)
+        r = requests.get(f"{YOUTUBE_API_BASE}/videos", headers=headers or {}, params=q, timeout=30)
+        if r.status_code != 200:
+            raise RuntimeError(f"videos.list failed ({r.status_code}): {r.text[:200]}")
+        for item in r.json().get("items", []):
+            out[item["id"]] = item
+    return out
+
+
+def _is_vertical(item: dict, duration: Optional[float]) -> bool:
+    player = item.get("player") or {}
+    try:
+        w, h = int(player.get("embedWidth") or 0), int(player.get("embedHeight") or 0)
+    except ValueError:
+        w = h = 0
+    if w and h:
+        return h > w and (duration is None or duration <= SHORTS_MAX_SECONDS)
+    snippet = item.get("snippet") or {}
+    text = " ".join([snippet.get("title", ""), snippet.get("description", "")] + snippet.get("tags", [])).lower()
+    return "#shorts" in text and (duration is None or duration <= SHORTS_MAX_SECONDS)
+
+
+def evaluate(item: dict) -> Optional[Tuple[str, str]]:
+    """Apply the rules to one `videos.list` item. Returns (reason, details) or None to accept."""
+    snippet = item.get("snippet") or {}
+    live = item.get("liveStreamingDetails") or {}
+    broadcast = snippet.get("liveBroadcastContent", "none")
+    if PREFILTER_REJECT_LIVE:
+        if broadcast == "live" or (live.get("actualStartTime") and not live.get("actualEndTime")):
+            return "live", "stream is live"
+        if broadcast == "upcoming" or (live.get("scheduledStartTime") and not live.get("actualStartTime")):
+            return "upcoming", f"scheduled for {live.get('scheduledStartTime', '?')}"
+
+    duration = parse_duration((item.get("contentDetails") or {}).get("duration"))
+    if duration is not None:
+        if duration < PREFILTER_MIN_SECONDS:
+            return "too_short", f"{duration:.0f}s < {PREFILTER_MIN_SECONDS}s"
+        if PREFILTER_MAX_SECONDS and duration > PREFILTER_MAX_SECONDS:
+            return "too_long", f"{duration:.0f}s > {PREFILTER_MAX_SECONDS}s"
+
+    category = snippet.get("categoryId")
+    if category and PREFILTER_CATEGORIES and category not in PREFILTER_CATEGORIES:
+        return "category", f"category {category} not allowed"
+    if category and category in PREFILTER_BLOCKED_CATEGORIES:
+        return "category", f"category {category} blocked"
+
+    if PREFILTER_REJECT_VERTICAL and _is_vertical(item, duration):
+        return "vertical", "already a Short"
+    return None
+
+
+def filter_videos(video_ids: List[str]) -> Tuple[List[str], Dict[str, dict]]:
+    """Split new video ids into (accepted, {rejected_id: {reason, details}}), recording rejections."""
+    if not PREFILTER_ENABLED or not video_ids:
+        return list(video_ids), {}
+    headers, params = _auth(-(-len(video_ids) // BATCH_SIZE))
+    if headers is None:
+        # no credentials for the Data API: nothing to check against
+        return list(video_ids), {}
+    try:
+        meta = fetch_metadata(list(video_ids), headers, params)
+    except Exception as e:
+        print("Prefilter unavailable, accepting all:", e)
+        return list(video_ids), {}
+
+    accepted, rejected = [], {}
+    for vid in video_ids:
+        item = meta.get(vid)
+        if item is None:
+            # private, deleted or not processed yet
+            verdict = ("unavailable", "not returned by videos.list")
+        else:
+            verdict = evaluate(item)
+        if verdict is None:
+            accepted.append(vid)
+            continue
+        reason, details = verdict
+        title = ((item or {}).get("snippet") or {}).get("title")
+        rejected[vid] = {"reason": reason, "details": details}
+        storage.record_rejection(vid, reason, details, title=title)
+        if reason in RETRYABLE:
+            storage.forget_video_seen(vid)
+    return accepted, rejected
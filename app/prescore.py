@@ -0,0 +1,152 @@
+"""Local, CPU-only highlight pre-scoring.
+
+Scores fixed windows of the clip's audio + transcript segments with cheap signals so that only
+the most promising transcript slices are sent to the chat model (or no call is made at all in
+`HIGHLIGHT_MODE=local`):
+
+- loudness peaks: share of 0.5s frames clearly louder than the video's integrated loudness
+  (measured once and cached by the probe; the median frame level if that failed),
+- speech-rate change: words/second in the window vs the video's median rate,
+- laughter / applause: noisy broadband energy (high spectral flatness, 1-4 kHz heavy).
+
+Each signal is z-normalised across windows and summed; the best non-overlapping windows are
+returned as candidates {start, end, score, signals, label}.
+"""
+from typing import List
+
+import numpy as np
+
+from .audio import decode_pcm
+from .config import HIGHLIGHT_CANDIDATES, HIGHLIGHT_WINDOW_SECONDS
+
+SAMPLE_RATE = 8000
+FRAME_SECONDS = 0.5
+# frames per FFT block: bounds the spectrum buffer (the samples themselves are capped by
+# only decoding the clip)
+BLOCK_FRAMES = 600
+WEIGHTS = {"loudness": 1.0, "speech_rate": 0.7, "laughter": 1.2}
+
+
+def frame_features(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> dict:
+    """Per-frame RMS (dB), spectral flatness and 1-4 kHz energy ratio."""
+    flen = int(sample_rate * FRAME_SECONDS)
+    n = len(samples) // flen
+    if n == 0:
+        empty = np.zeros(0, dtype=np.float32)
+        return {"rms_db": empty, "flatness": empty, "band_ratio": empty}
+    frames = samples[: n * flen].reshape(n, flen)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    freqs = np.fft.rfftfreq(flen, 1.0 / sample_rate)
+    band = (freqs >= 1000) & (freqs <= 4000)
+    flat, ratio = [], []
+    for i in range(0, n, BLOCK_FRAMES):
+        spec = np.abs(np.fft.rfft(frames[i : i + BLOCK_FRAMES], axis=1)) ** 2 + 1e-12
+        flat.append(np.exp(np.mean(np.log(spec), axis=1)) / np.mean(spec, axis=1))
+        ratio.append(spec[:, band].sum(axis=1) / spec.sum(axis=1))
+    return {
+        "rms_db": 20 * np.log10(rms + 1e-6),
+        "flatness": np.concatenate(flat),
+        "band_ratio": np.concatenate(ratio),
+    }
+
+
+def _zscore(x: np.ndarray) -> np.ndarray:
+    sd = x.std()
+    if sd < 1e-9:
+        return np.zeros_like(x)
+    return (x - x.mean()) / sd
+
+
+def _speech_rates(segments: List[dict], starts: np.ndarray, window: float) -> np.ndarray:
+    rates = np.zeros(len(starts))
+    for s in segments:
+        s0 = float(s.get("start", 0.0))
+        s1 = max(float(s.get("end", s0 + 1.0)), s0 + 0.1)
+        words = len((s.get("text") or "").split())
+        # spread each segment's words over the windows it overlaps
+        ov = np.clip(np.minimum(starts + window, s1) - np.maximum(starts, s0), 0, None)
+        rates += words * ov / (s1 - s0)
+    return rates / window
+
+
+def score_windows(features: dict, segments: List[dict], window: float = HIGHLIGHT_WINDOW_SECONDS,
+                  reference_db: float = None, duration: float = None) -> List[dict]:
+    """Score overlapping windows (hop = window/2). Returns a list sorted by start time.
+    `reference_db` is the programme level loud frames are measured against (default: the
+    median frame level); with `duration` no window reaches past it."""
+    rms = features["rms_db"]
+    n = len(rms)
+    total = n * FRAME_SECONDS
+    if segments:
+        total = max(total, max(float(s.get("end", 0.0)) for s in segments))
+    if duration is not None:
+        total = min(total, duration)
+    if total <= 0:
+        return []
+    hop = window / 2
+    starts = np.arange(0.0, max(total - window, 0.0) + 1e-6, hop)
+    per = int(window / FRAME_SECONDS)
+
+    loud_thr = (reference_db if reference_db is not None else np.median(rms) if n else 0.0) + 6.0
+    # noisy, bright and not quiet: laughter / applause / cheering
+    laugh_frames = (features["flatness"] > 0.3) & (features["band_ratio"] > 0.35) & (rms > np.median(rms) if n else False)
+
+    loud, laugh = np.zeros(len(starts)), np.zeros(len(starts))
+    for i, st in enumerate(starts):
+        a = int(st / FRAME_SECONDS)
+        b = min(a + per, n)
+        if b > a:
+            loud[i] = np.mean(rms[a:b] > loud_thr)
+            laugh[i] = np.mean(laugh_frames[a:b])
+    rates = _speech_rates(segments or [], starts, window)
+    med = np.median(rates[rates > 0]) if np.any(rates > 0) else 0.0
+    rate_change = np.abs(rates - med) / med if med > 0 else np.zeros(len(starts))
+
+    signals = {"loudness": loud, "speech_rate": rate_change, "laughter": laugh}
+    score = sum(WEIGHTS[k] * _zscore(v) for k, v in signals.items())
+    out = []
+    for i, st in enumerate(starts):
+        sig = {k: round(float(v[i]), 3) for k, v in signals.items()}
+        if sig["laughter"] >= 0.2:
+            label = "funny"
+        elif sig["loudness"] >= 0.3:
+            label = "important"
+        else:
+            label = "other"
+        out.append({"start": float(st), "end": float(min(st + window, total)), "score": float(score[i]), "signals": sig, "label": label})
+    return out
+
+
+def pick_candidates(windows: List[dict], top_k: int = HIGHLIGHT_CANDIDATES) -> List[dict]:
+    """Greedy top-k non-overlapping windows, returned in time order."""
+    picked = []
+    for w in sorted(windows, key=lambda w: w["score"], reverse=True):
+        if len(picked) >= top_k:
+            break
+        if all(w["end"] <= p["start"] or w["start"] >= p["end"] for p in picked):
+            picked.append(w)
+    return sorted(picked, key=lambda w: w["start"])
+
+
+def candidate_windows(media_path: str, segments: List[dict], clip_duration: float = None,
+                      top_k: int = HIGHLIGHT_CANDIDATES) -> List[dict]:
+    """Decode the clip (the first `clip_duration` seconds of the job's audio) and return the
+    top candidate windows inside it."""
+    from .probe import probe
+
+    features = frame_features(decode_pcm(media_path, sample_rate=SAMPLE_RATE, max_seconds=clip_duration))
+    loudness = probe(media_path, until=clip_duration, loudness=True).loudness
+    reference = loudness["integrated_lufs"] if loudness else None
+    windows = score_windows(features, segments, reference_db=reference, duration=clip_duration)
+    return pick_candidates(windows, top_k=top_k)
+
+
+def segments_in_windows(segments: List[dict], windows: List[dict]) -> List[dict]:
+    """Transcript segments overlapping any candidate window."""
+    out = []
+    for s in segments:
+        s0 = float(s.get("start", 0.0))
+        s1 = float(s.get("end", s0))
+        if any(s0 < w["end"] and s1 > w["start"] for w in windows):
+            out.append(s)
+    return out
@@ -0,0 +1,219 @@
+"""Cached media probe (ffprobe once per file).
+
+`probe(path)` returns a `MediaInfo` with duration, streams, frame rate and keyframe timestamps.
+Finding keyframes reads every packet of the video stream, so a caller that only works on the
+first N seconds asks for `probe(path, until=N)` and only that part of the file is read
+(`-read_intervals`); a later call needing more extends the index. `until=0` skips the scan for
+callers that only need the duration or the streams.
+
+Loudness stats (EBU R128 via ffmpeg `loudnorm`) need an audio decode, so they are only measured
+when asked for with `probe(path, loudness=True)`, over the same `until` window, and then
+cached like the rest.
+
+Results are cached in memory and in a `<file>.probe.json` side-file next to the artifact, keyed
+by size and mtime, so every stage (trim, thumbnail, chunked encodes, ...) can make seek and
+sizing decisions without re-probing the file.
+"""
+import json
+import os
+import re
+import subprocess
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+_cache = {}
+_lock = threading.Lock()
+
+
+@dataclass
+class MediaInfo:
+    path: str
+    size: int = 0
+    mtime: float = 0.0
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    video_codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    streams: List[dict] = field(default_factory=list)
+    keyframes: List[float] = field(default_factory=list)
+    # keyframes are indexed up to this time (None: the whole file)
+    keyframes_until: Optional[float] = None
+    # {"integrated_lufs", "true_peak_db", "lra", "threshold_lufs", "until"}
+    loudness: Optional[dict] = None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+    @property
+    def is_vertical(self) -> bool:
+        return bool(self.width and self.height and self.height > self.width)
+
+    def keyframe_before(self, t: float) -> float:
+        """Latest keyframe at or before `t` (0.0 if unknown): a cut there needs no pre-roll decode."""
+        best = 0.0
+        for k in self.keyframes:
+            if k > t + 1e-3:
+                break
+            best = k
+        return best
+
+    def keyframe_after(self, t: float) -> Optional[float]:
+        for k in self.keyframes:
+            if k >= t - 1e-3:
+                return k
+        return None
+
+
+def _sidecar(path: str) -> str:
+    return path + ".probe.json"
+
+
+def _parse_rate(rate: str) -> Optional[float]:
+    try:
+        num, _, den = (rate or "").partition("/")
+        value = float(num) / float(den or 1)
+        return value or None
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _run_json(cmd: List[str]) -> dict:
+    r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=False)
+    out = getattr(r, "stdout", None)
+    if not out:
+        return {}
+    try:
+        return json.loads(out)
+    except ValueError:
+        return {}
+
+
+def _probe_streams(info: MediaInfo):
+    j = _run_json(["ffprobe", "-v", "error", "-print_format", "json", "-show_format", "-show_streams", info.path])
+    info.streams = j.get("streams", [])
+    try:
+        info.duration = float(j.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        info.duration = None
+    for s in info.streams:
+        if s.get("codec_type") == "video" and info.video_codec is None and not s.get("disposition", {}).get("attached_pic"):
+            info.video_codec = s.get("codec_name")
+            info.width = s.get("width")
+            info.height = s.get("height")
+            info.fps = _parse_rate(s.get("avg_frame_rate")) or _parse_rate(s.get("r_frame_rate"))
+        elif s.get("codec_type") == "audio" and info.audio_codec is None:
+            info.audio_codec = s.get("codec_name")
+
+
+def _window(info: MediaInfo, until: Optional[float]) -> Optional[float]:
+    # a window reaching the end of the file is the whole file
+    return None if until is None or (info.duration and until >= info.duration) else max(0.0, until)
+
+
+def _covers(have: Optional[float], want: Optional[float]) -> bool:
+    return have is None or (want is not None and want <= have)
+
+
+def _probe_keyframes(info: MediaInfo, until: Optional[float] = None):
+    until = _window(info, until)
+    info.keyframes_until = until
+    if until == 0:
+        info.keyframes = []
+        return
+    # packet flags give keyframe positions without decoding any frames
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0"]
+    if until is not None:
+        cmd += ["-read_intervals", f"%+{until:.3f}"]
+    cmd += ["-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", info.path]
+    r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=False)
+    out = getattr(r, "stdout", None) or b""
+    kfs = []
+    for line in out.decode("utf-8", "replace").splitlines():
+        pts, _, flags = line.partition(",")
+        if flags.startswith("K"):
+            try:
+                kfs.append(float(pts))
+            except ValueError:
+                continue
+    info.keyframes = sorted(kfs)
+
+
+def _measure_loudness(info: MediaInfo, until: Optional[float] = None):
+    until = _window(info, until)
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner"]
+    if until is not None:
+        # as an input option -t stops reading the file early
+        cmd += ["-t", f"{until:.3f}"]
+    cmd += ["-i", info.path, "-vn", "-af", "loudnorm=print_format=json", "-f", "null", "-"]
+    r = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=False)
+    err = (getattr(r, "stderr", None) or b"").decode("utf-8", "replace")
+    m = re.search(r"\{[^{}]*\"input_i\"[^{}]*\}", err)
+    if not m:
+        return
+    try:
+        j = json.loads(m.group(0))
+        info.loudness = {
+            "integrated_lufs": float(j["input_i"]),
+            "true_peak_db": float(j["input_tp"]),
+            "lra": float(j["input_lra"]),
+            "threshold_lufs": float(j["input_thresh"]),
+            "until": until,
+        }
+    except (KeyError, ValueError):
+        return
+
+
+def _load_sidecar(path: str, size: int, mtime: float) -> Optional[MediaInfo]:
+    try:
+        with open(_sidecar(path), "r", encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get("size") == size and d.get("mtime") == mtime:
+            return MediaInfo(**d)
+    except (OSError, ValueError, TypeError):
+        pass
+    return None
+
+
+def _save_sidecar(info: MediaInfo):
+    try:
+        with open(_sidecar(info.path), "w", encoding="utf-8") as f:
+            json.dump(asdict(info), f)
+    except OSError:
+        pass
+
+
+def probe(path: str, until: float = None, loudness: bool = False) -> MediaInfo:
+    """Return (cached) MediaInfo for `path`. Fields stay None when ffprobe can't read the file.
+    Keyframes are indexed (and with `loudness`, loudness is measured) up to `until` seconds
+    (default: the whole file)."""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    with _lock:
+        info = _cache.get(key)
+    if info is None or info.size != st.st_size or info.mtime != st.st_mtime:
+        info = _load_sidecar(path, st.st_size, st.st_mtime)
+    changed = False
+    if info is None:
+        info = MediaInfo(path=path, size=st.st_size, mtime=st.st_mtime)
+        _probe_streams(info)
+        if info.video_codec:
+            _probe_keyframes(info, until)
+        changed = True
+    elif info.video_codec and not _covers(info.keyframes_until, until):
+        # indexed a shorter window before: extend it
+        _probe_keyframes(info, until)
+        changed = True
+    if loudness and info.has_audio and (info.loudness is None or not _covers(info.loudness.get("until"), until)):
+        _measure_loudness(info, until)
+        changed = True
+    # only cache what ffprobe could actually read
+    if info.duration is not None:
+        if changed:
+            _save_sidecar(info)
+        with _lock:
+            _cache[key] = info
+    return info
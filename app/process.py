@@ -3,191 +3,518 @@
 Current scaffold implements download and a simple trim-to-length step. Later steps
 will fill in transcription, moderation, highlight extraction, subtitles, and soundboard.
 """
-import subprocess
 import os
 import glob
-from .config import OUTPUT_DIR, SHORT_MAX_SECONDS
+import re
+from .config import OUTPUT_DIR, SHORT_MAX_SECONDS, HIGHLIGHT_MODE, RENDER_WIDTH, RENDER_HEIGHT
+from .scheduler import CPU, IO
+from .graph import Stage, Stop
+from . import graph, progress
 
 
 def _latest_downloaded_file(tmp_dir: str):
-    files = glob.glob(os.path.join(tmp_dir, "input.*"))
+    # skip side-files such as the cached probe (`input.mp4.probe.json`)
+    files = [p for p in glob.glob(os.path.join(tmp_dir, "input.*")) if not p.endswith(".json")]
     if not files:
         return None
     # pick the first match
     return files[0]
 
 
-def handle_new_video(youtube_url: str, max_duration: int = SHORT_MAX_SECONDS):
-    # 1) Download video (yt-dlp)
-    out_dir = os.path.join(OUTPUT_DIR, "tmp")
+def video_id_from_url(youtube_url: str) -> str:
+    m = re.search(r"(?:v=|youtu\.be/|shorts/)([\w-]{6,})", youtube_url)
+    if m:
+        return m.group(1)
+    return re.sub(r"[^\w-]+", "_", youtube_url)[-64:]
+
+
+def job_dir_for(youtube_url: str) -> str:
+    """Per-job working dir so concurrent jobs don't overwrite each other's files."""
+    return os.path.join(OUTPUT_DIR, "jobs", video_id_from_url(youtube_url))
+
+
+# imported in the workers at start-up so the first job doesn't pay for them
+WARM_MODULES = [
+    "app.transcribe",
+    "app.moderation",
+    "app.censor",
+    "app.subtitles",
+    "app.highlight",
+    "app.soundboard",
+    "app.visual_overlay",
+    "app.telegram",
+    "app.probe",
+    "app.fingerprint",
+    "app.prescore",
+    "app.artifacts",
+    "app.formats",
+    "app.transcript_index",
+    "app.sink",
+    "app.graph",
+    "app.downloader",
+    "pydub",
+    "telegram",
+    "yt_dlp",
+]
+
+
+def warm_workers():
+    """Pre-start the scheduler pools, import the stage modules and load assets / keyword matchers."""
+    import importlib
+    from .scheduler import prestart
+
+    prestart()
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print("warm-up import failed:", name, e)
+    from .moderation import get_keywords
+    from .soundboard import discover_sounds
+
+    get_keywords()
+    discover_sounds()
+
+
+def submit_video(youtube_url: str, max_duration: int = SHORT_MAX_SECONDS):
+    """Queue `handle_new_video` on the scheduler in its own job dir; returns a Future."""
+    from .scheduler import submit_job
+
+    progress.queue_job(video_id_from_url(youtube_url), youtube_url)
+    return submit_job(handle_new_video, youtube_url, max_duration=max_duration, out_dir=job_dir_for(youtube_url))
+
+
+def handle_new_video(youtube_url: str, max_duration: int = SHORT_MAX_SECONDS, out_dir: str = None):
+    """Run the full pipeline for one video.
+
+    The stages form a dependency graph (`pipeline_stages`, run by graph.py): every stage
+    whose inputs are ready runs at once, network-bound stages in the I/O pool and encodes in
+    the CPU pool, so the stages of one job overlap as well as concurrent jobs.
+    """
+    from . import artifacts
+
+    if out_dir is None:
+        out_dir = os.path.join(OUTPUT_DIR, "tmp")
     os.makedirs(out_dir, exist_ok=True)
-    out_path = os.path.join(out_dir, "input.%(ext)s")
-    cmd = ["yt-dlp", "-f", "best", "-o", out_path, youtube_url]
-    subprocess.run(cmd, check=False)
+    # a running job's dir is never evicted by the quota
+    artifacts.start_job(out_dir)
+    token = progress.start_job(video_id_from_url(youtube_url), youtube_url)
+    error = None
+    try:
+        return _run_pipeline(youtube_url, max_duration, out_dir)
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        progress.finish_job(token, error)
+        artifacts.end_job(out_dir)
+
+
+# --- stages -----------------------------------------------------------------
+# Each function takes its inputs as keyword arguments (see `pipeline_stages`) and looks up
+# the stage modules at call time.
 
+_FUNNY_LABEL = "funny"
+
+
+def _download(url, out_dir):
+    # smallest streams that still fill the render profile, see formats.py
+    from .formats import download
+
+    download(url, os.path.join(out_dir, "input.%(ext)s"), progress=progress.download_hook())
     in_file = _latest_downloaded_file(out_dir)
     if not in_file:
         raise RuntimeError("download failed or no file found")
+    return in_file
+
+
+def _require(path):
+    """`path` if the encode wrote it; ffmpeg runs unchecked, so a failed encode raises here and
+    the stage's fallback takes over instead of passing on a file that doesn't exist."""
+    if not path or not os.path.exists(path) or os.path.getsize(path) == 0:
+        raise RuntimeError(f"no output written: {path}")
+    return path
+
+
+def _fingerprint(in_file, video_id, out_dir):
+    """Duplicate / re-upload detection: fingerprint the first minutes of audio and reuse the
+    previously rendered short if the same content was already processed."""
+    from . import artifacts, fingerprint
+
+    fp_hashes = fingerprint.fingerprint_file(in_file)
+    match = fingerprint.find_match(fp_hashes)
+    if match and match["video_id"] != video_id:
+        previous = fingerprint.get_result(match["video_id"])
+        if previous and previous.get("short") and os.path.exists(previous["short"]):
+            artifacts.touch(os.path.dirname(previous["short"]))
+            open(os.path.join(out_dir, "processed.txt"), "w").write(f"duplicate of {match['video_id']}")
+            raise Stop(dict(previous, duplicate_of=match["video_id"], match_score=match["score"]))
+    return fp_hashes
+
+
+def _probe(in_file, max_duration):
+    """Clip window: the first `max_duration` seconds, or less if the video is shorter. The probe
+    (cached next to the input) only indexes keyframes inside the window, for the chunked trim."""
+    from .probe import probe
+
+    duration = float(max_duration)
+    media = probe(in_file, until=duration)
+    if media.duration:
+        duration = max(0.0, min(duration, media.duration))
+    return 0.0, duration
+
+
+def _trim(in_file, clip_start, clip_duration, out_dir):
+    # `-ss` before `-i` seeks in the demuxer instead of decoding from the start
+    from .chunked import render
 
-    # 2) Create a short by trimming to max_duration seconds (simple heuristic: start at 0)
     short_path = os.path.join(out_dir, "short.mp4")
-    ffmpeg_cmd = [
-        "ffmpeg",
-        "-y",
-        "-i",
+    render(
         in_file,
-        "-ss",
-        "0",
-        "-t",
-        str(max_duration),
-        "-vf",
-        "scale=720:1280:force_original_aspect_ratio=decrease,pad=720:1280:-1:-1:black",
-        "-c:a",
-        "aac",
-        "-c:v",
-        "libx264",
         short_path,
+        vf=f"scale={RENDER_WIDTH}:{RENDER_HEIGHT}:force_original_aspect_ratio=decrease,pad={RENDER_WIDTH}:{RENDER_HEIGHT}:-1:-1:black",
+        audio_args=["-c:a", "aac"],
+        video_args=["-c:v", "libx264"],
+        start=clip_start,
+        duration=clip_duration,
+    )
+    return _require(short_path)
+
+
+def _transcribe(in_file, clip_duration, out_dir):
+    """Whisper transcript plus its segments (saved by the helper as *.segments.json)."""
+    import json
+    from .transcribe import transcribe_from_video
+
+    transcript_text = transcribe_from_video(in_file, language="id")
+    transcript_path = os.path.join(out_dir, "transcript.txt")
+    with open(transcript_path, "w", encoding="utf-8") as f:
+        f.write(transcript_text)
+    # default to a single full-range segment
+    segments = [{"start": 0.0, "end": clip_duration, "text": transcript_text}]
+    seg_files = glob.glob(os.path.join(out_dir, "*.segments.json"))
+    if seg_files:
+        try:
+            with open(seg_files[0], "r", encoding="utf-8") as sf:
+                segments = json.load(sf)
+        except Exception:
+            pass
+    return transcript_text, transcript_path if transcript_text else None, segments
+
+
+def _index(video_id, url, out_dir, segments, transcript_text):
+    """Index the timestamped transcript (searchable later without re-transcribing)."""
+    if transcript_text:
+        from . import transcript_index
+
+        transcript_index.index_job(video_id, segments, out_dir, url=url, language="id")
+
+
+def _moderation(segments):
+    from .moderation import moderate_segments
+
+    return moderate_segments(segments)
+
+
+def _srt(segments, flagged_idxs, out_dir):
+    """Subtitles with flagged segments redacted (none if moderation could not run)."""
+    if flagged_idxs is None:
+        return None
+    from .censor import segments_to_srt
+
+    srt_path = os.path.join(out_dir, "subtitles.srt")
+    segments_to_srt(segments, flagged_idxs, srt_path)
+    return srt_path
+
+
+def _bleep(short_path, segments, flagged_idxs, out_dir):
+    if not flagged_idxs:
+        return None
+    from .censor import bleep_audio_for_segments
+
+    bleeped_audio = os.path.join(out_dir, "audio_bleep.mp3")
+    bleep_audio_for_segments(short_path, segments, flagged_idxs, bleeped_audio)
+    return _require(bleeped_audio)
+
+
+def _replace_audio(short_path, bleeped_audio, out_dir):
+    if not bleeped_audio:
+        return short_path
+    from .censor import replace_audio_in_video
+
+    bleeped_video = os.path.join(out_dir, "short_bleeped.mp4")
+    replace_audio_in_video(short_path, bleeped_audio, bleeped_video)
+    return _require(bleeped_video)
+
+
+def _blur(bleeped_video, segments, flagged_idxs, out_dir):
+    if not flagged_idxs:
+        return bleeped_video
+    from .censor import blur_video_segments
+
+    censored_video = os.path.join(out_dir, "short_censored.mp4")
+    blur_video_segments(bleeped_video, [segments[i] for i in flagged_idxs], censored_video)
+    return _require(censored_video)
+
+
+def _thumbnail(short_path, segments, flagged_idxs, out_dir):
+    """Preview frame from the trimmed short, away from flagged segments (not blurred there)."""
+    if not os.path.exists(short_path):
+        return None
+    from .telegram import _generate_thumbnail
+
+    avoid = [(segments[i].get("start", 0.0), segments[i].get("end", 0.0)) for i in flagged_idxs or []]
+    return _require(_generate_thumbnail(short_path, os.path.join(out_dir, "short.thumb.jpg"), avoid))
+
+
+def _prescore(in_file, clip_duration, segments):
+    # local pre-scoring picks candidate windows so only those slices go to the model; the
+    # short is the first clip_duration seconds, so nothing after that is decoded or offered
+    if HIGHLIGHT_MODE == "full":
+        return []
+    from .prescore import candidate_windows
+
+    return candidate_windows(in_file, segments, clip_duration=clip_duration)
+
+
+def _highlights(transcript_text, segments, candidates):
+    from .highlight import extract_highlights
+
+    return extract_highlights(transcript_text, segments=segments, candidates=candidates)
+
+
+def _assets():
+    """Sound files by label and the image overlays for highlight labels."""
+    from .soundboard import discover_sounds
+
+    img_dir = os.path.join(os.path.dirname(__file__), "..", "assets", "images")
+    return discover_sounds(), glob.glob(os.path.join(img_dir, f"{_FUNNY_LABEL}.*"))
+
+
+def _detect_sounds(segments):
+    # keyword-based sound events from the transcript
+    from .soundboard import detect_sound_events
+
+    return detect_sound_events(segments)
+
+
+def _events(highlights, keyword_events, sound_map, funny_images):
+    """Sound events (with files) and image overlay events from keywords and highlight labels."""
+    sound_events = list(keyword_events)
+    img_events = []
+    for h in highlights:
+        if h.get("label", "").lower() != _FUNNY_LABEL:
+            continue
+        start = h.get("start", 0.0)
+        end = h.get("end", start + 2.0)
+        # the soundboard maps the label to a file, assets/images/funny.* is overlaid
+        sound_events.append({"start": start, "sound_file": None, "label": _FUNNY_LABEL})
+        if funny_images:
+            img_events.append({"start": start, "end": end, "image": funny_images[0]})
+    concrete_events = []
+    for e in sound_events:
+        if e.get("sound_file"):
+            concrete_events.append(e)
+        elif e.get("label") in sound_map:
+            concrete_events.append({"start": e.get("start"), "sound_file": sound_map[e["label"]]})
+    return concrete_events, img_events
+
+
+def _render_paths(out_dir, sound_events, image_events):
+    """(subtitled, with_sounds, final) paths; a step without events passes its input on."""
+    subtitled = os.path.join(out_dir, "short_subtitled.mp4")
+    with_sounds = os.path.join(out_dir, "short_with_sounds.mp4") if sound_events else subtitled
+    final_target = os.path.join(out_dir, "short_with_images.mp4") if image_events else with_sounds
+    return subtitled, with_sounds, final_target
+
+
+def _stream(video_id, out_dir, sound_events, image_events):
+    """Upload the last render to object storage while ffmpeg is still writing it (if configured)."""
+    from . import sink
+
+    return sink.start_stream(video_id, _render_paths(out_dir, sound_events, image_events)[2])
+
+
+def _subtitles(censored_video, srt_path, out_dir):
+    from .subtitles import burn_subtitles_into_video
+
+    subtitled = os.path.join(out_dir, "short_subtitled.mp4")
+    burn_subtitles_into_video(censored_video, srt_path, subtitled)
+    return _require(subtitled)
+
+
+def _soundboard(subtitled, out_dir, sound_events, image_events):
+    if not sound_events:
+        return subtitled
+    from .soundboard import overlay_soundboard
+
+    with_sounds = _render_paths(out_dir, sound_events, image_events)[1]
+    overlay_soundboard(subtitled, sound_events, with_sounds)
+    return _require(with_sounds)
+
+
+def _image_overlay(with_sounds, out_dir, sound_events, image_events):
+    if not image_events:
+        return with_sounds
+    from .visual_overlay import overlay_images_on_video
+
+    final_target = _render_paths(out_dir, sound_events, image_events)[2]
+    overlay_images_on_video(with_sounds, image_events, final_target)
+    return _require(final_target)
+
+
+def _upload(video_id, final_short, stream, srt_path, transcript_path):
+    """Finish the streamed upload (or upload the short now) and get presigned links."""
+    from . import sink
+
+    if stream is None and not sink.enabled():
+        return {}
+    return sink.publish(video_id, final_short, stream, extra=[srt_path, transcript_path])
+
+
+def _abort_stream(stream, **_):
+    if stream is not None:
+        stream.abort()
+    return {}
+
+
+PROCESSED_MARKER = "processed.txt"
+
+
+def is_processed(out_dir: str) -> bool:
+    """True if a pipeline run in `out_dir` got as far as its final render."""
+    return os.path.exists(os.path.join(out_dir, PROCESSED_MARKER))
+
+
+def _mark_processed(out_dir):
+    # marker file for dev
+    open(os.path.join(out_dir, PROCESSED_MARKER), "w").write("done")
+
+
+def _notify(final_short, transcript_path, highlights, remote, thumb_path):
+    from .telegram import send_short_notification
+
+    # presigned URLs are long: only the short's fits the 1024-char caption
+    links = {"short": remote["short"]["url"]} if "short" in remote else None
+    send_short_notification(final_short, transcript_path, highlights, links=links, thumb_path=thumb_path)
+    return True
+
+
+def _artifacts(out_dir, final_short, srt_path, transcript_path):
+    """Keep deliverables, drop intermediates (input, partial renders) and apply the disk quota."""
+    from . import artifacts
+
+    freed = artifacts.finalize_job(out_dir, [final_short, srt_path, transcript_path])
+    artifacts.enforce_quota()
+    return freed
+
+
+def _keep(name):
+    """Fallback that passes the stage's input `name` through unchanged."""
+    return lambda **kw: kw[name]
+
+
+def _const(value):
+    """Fallback that publishes a fixed value (a tuple for several outputs)."""
+    return lambda **kw: value
+
+
+def pipeline_stages() -> list:
+    """The pipeline as a graph: values given by the job are url, video_id, out_dir, max_duration.
+
+    Stages without a fallback (download, probe, trim) fail the job; every other stage
+    falls back to a neutral output (no subtitles, the uncensored/unrendered input, no
+    highlights, ...) and writes `<stage>_error.txt`.
+    """
+    from . import sink
+
+    # with a sink the stream must be tailing the final render (which may be the subtitled
+    # one) before its encode starts; without one the burn needn't wait for the events
+    stream_first = ("stream",) if sink.enabled() else ()
+    return [
+        Stage("download", _download, ("url", "out_dir"), ("in_file",), IO),
+        Stage("fingerprint", _fingerprint, ("in_file", "video_id", "out_dir"), ("fp_hashes",), CPU, _const([])),
+        Stage("probe", _probe, ("in_file", "max_duration"), ("clip_start", "clip_duration"), IO),
+        # expensive stages wait for the duplicate check, so a re-upload costs no encode or API call
+        Stage("trim", _trim, ("in_file", "clip_start", "clip_duration", "out_dir"), ("short_path",), CPU, after=("fp_hashes",)),
+        Stage(
+            "transcribe", _transcribe, ("in_file", "clip_duration", "out_dir"),
+            ("transcript_text", "transcript_path", "segments"), IO, _const(("", None, [])), after=("fp_hashes",),
+        ),
+        Stage("index", _index, ("video_id", "url", "out_dir", "segments", "transcript_text"), (), IO, _const(None)),
+        Stage("moderation", _moderation, ("segments",), ("flagged_idxs",), IO, _const(None)),
+        Stage("srt", _srt, ("segments", "flagged_idxs", "out_dir"), ("srt_path",), IO, _const(None)),
+        Stage("bleep", _bleep, ("short_path", "segments", "flagged_idxs", "out_dir"), ("bleeped_audio",), CPU, _const(None)),
+        Stage("replace_audio", _replace_audio, ("short_path", "bleeped_audio", "out_dir"), ("bleeped_video",), CPU, _keep("short_path")),
+        Stage("blur", _blur, ("bleeped_video", "segments", "flagged_idxs", "out_dir"), ("censored_video",), CPU, _keep("bleeped_video")),
+        Stage("thumbnail", _thumbnail, ("short_path", "segments", "flagged_idxs", "out_dir"), ("thumb_path",), CPU, _const(None)),
+        Stage("prescore", _prescore, ("in_file", "clip_duration", "segments"), ("candidates",), CPU, _const([])),
+        Stage("highlights", _highlights, ("transcript_text", "segments", "candidates"), ("highlights",), IO, _const([])),
+        Stage("assets", _assets, (), ("sound_map", "funny_images"), IO, _const(({}, []))),
+        Stage("detect_sounds", _detect_sounds, ("segments",), ("keyword_events",), IO, _const([])),
+        Stage(
+            "events", _events, ("highlights", "keyword_events", "sound_map", "funny_images"),
+            ("sound_events", "image_events"), IO, _const(([], [])),
+        ),
+        Stage("stream", _stream, ("video_id", "out_dir", "sound_events", "image_events"), ("stream",), IO, _const(None)),
+        Stage(
+            "subtitles", _subtitles, ("censored_video", "srt_path", "out_dir"),
+            ("subtitled",), CPU, _keep("censored_video"), after=stream_first,
+        ),
+        Stage("soundboard", _soundboard, ("subtitled", "out_dir", "sound_events", "image_events"), ("with_sounds",), CPU, _keep("subtitled")),
+        Stage(
+            "image_overlay", _image_overlay, ("with_sounds", "out_dir", "sound_events", "image_events"),
+            ("final_short",), CPU, _keep("with_sounds"),
+        ),
+        Stage("upload", _upload, ("video_id", "final_short", "stream", "srt_path", "transcript_path"), ("remote",), IO, _abort_stream),
+        Stage("processed", _mark_processed, ("out_dir",), (), IO, after=("final_short", "remote")),
+        Stage(
+            "notify", _notify, ("final_short", "transcript_path", "highlights", "remote", "thumb_path"),
+            ("notified",), IO, _const(False),
+        ),
+        # runs last: it deletes the intermediates (thumbnail, partial renders) the others read
+        Stage(
+            "artifacts", _artifacts, ("out_dir", "final_short", "srt_path", "transcript_path"),
+            ("freed_bytes",), IO, _const(None), after=("notified", "remote", "thumb_path"),
+        ),
     ]
-    subprocess.run(ffmpeg_cmd, check=False)
 
-    # 3) Transcribe audio using OpenAI Whisper (via HTTP helper)
-    try:
-        from .transcribe import transcribe_from_video
-
-        # transcribe and get segments (if available). We expect transcribe_from_video to return raw text,
-        # but we'll also try to get more structured segments if available from the JSON response.
-        transcript_text = transcribe_from_video(in_file, language="id")
-        transcript_path = os.path.join(out_dir, "transcript.txt")
-        with open(transcript_path, "w", encoding="utf-8") as f:
-            f.write(transcript_text)
-
-        # try to load segments if the transcribe helper saved them
-        seg_path = os.path.join(out_dir, "audio.segments.json")
-        # Default to a single full-range segment
-        segments = [{"start": 0.0, "end": float(max_duration), "text": transcript_text}]
-        # The transcribe helper saves segments next to the audio temp file with .segments.json suffix
-        # Try to find any .segments.json in the temp dir
-        import glob, json
-
-        seg_files = glob.glob(os.path.join(out_dir, "*.segments.json"))
-        if seg_files:
-            try:
-                with open(seg_files[0], "r", encoding="utf-8") as sf:
-                    segments = json.load(sf)
-            except Exception:
-                pass
-    except Exception as e:
-        with open(os.path.join(out_dir, "transcribe_error.txt"), "w", encoding="utf-8") as f:
-            f.write(str(e))
-        transcript_text = ""
-        segments = []
 
-    # 4) Moderation (SARA) detection & censoring (bleep + redact + blur)
-    try:
-        from .moderation import moderate_segments
-        from .censor import segments_to_srt, bleep_audio_for_segments, blur_video_segments, replace_audio_in_video
-
-        flagged_idxs = moderate_segments(segments)
-        flagged_segments = [segments[i] for i in flagged_idxs]
-
-        # Create subtitles (SRT) with redaction
-        srt_path = os.path.join(out_dir, "subtitles.srt")
-        segments_to_srt(segments, flagged_idxs, srt_path)
-
-        if flagged_idxs:
-            # 4a) Bleep audio for flagged segments
-            bleeped_audio = os.path.join(out_dir, "audio_bleep.mp3")
-            bleep_audio_for_segments(short_path, segments, flagged_idxs, bleeped_audio)
-            # 4b) Replace audio in video
-            bleeped_video = os.path.join(out_dir, "short_bleeped.mp4")
-            replace_audio_in_video(short_path, bleeped_audio, bleeped_video)
-            # 4c) Blur video during flagged segments
-            censored_video = os.path.join(out_dir, "short_censored.mp4")
-            blur_video_segments(bleeped_video, flagged_segments, censored_video)
-            final_video = censored_video
-        else:
-            final_video = short_path
-    except Exception as e:
-        # on errors continue with the trimmed short
-        with open(os.path.join(out_dir, "censor_error.txt"), "w", encoding="utf-8") as f:
-            f.write(str(e))
-        final_video = short_path
+def _run_pipeline(youtube_url: str, max_duration: int, out_dir: str):
+    import json
 
-    # 5) Burn-in subtitles
+    video_id = video_id_from_url(youtube_url)
+    given = {"url": youtube_url, "video_id": video_id, "out_dir": out_dir, "max_duration": max_duration}
     try:
-        from .subtitles import burn_subtitles_into_video
-        from .soundboard import detect_sound_events, overlay_soundboard
-        from .highlight import extract_highlights
-        from .visual_overlay import overlay_images_on_video
-
-        subtitled = os.path.join(out_dir, "short_subtitled.mp4")
-        burn_subtitles_into_video(final_video, srt_path, subtitled)
-
-        # 5a) extract highlights (labels like 'funny' will be used to overlay sound/images)
-        highlights = extract_highlights(transcript_text)
-
-        # 5b) Convert highlights into sound events and image overlay events
-        sound_events = detect_sound_events(segments)  # existing keyword-based detection
-        # also add events from highlight labels
-        img_events = []
-        for h in highlights:
-            lbl = h.get("label", "").lower()
-            start = h.get("start", 0.0)
-            end = h.get("end", start + 2.0)
-            # if label is funny, try to add default sound 'funny' if available
-            if lbl == "funny":
-                # schedule sound at highlight start; soundboard overlay will map keyword 'funny' to a file
-                sound_events.append({"start": start, "sound_file": None, "label": "funny"})
-                # schedule image overlay: look for assets/images/funny.*
-                img_dir = os.path.join(os.path.dirname(__file__), "..", "assets", "images")
-                import glob
-
-                img_files = glob.glob(os.path.join(img_dir, "funny.*"))
-                if img_files:
-                    img_events.append({"start": start, "end": end, "image": img_files[0]})
-        # merge and apply sounds
-        # map sound_events entries with label to actual files via soundboard discover
-        from .soundboard import discover_sounds
-
-        mapping = discover_sounds()
-        concrete_events = []
-        for e in sound_events:
-            if e.get("sound_file"):
-                concrete_events.append(e)
-            else:
-                lbl = e.get("label")
-                if lbl and lbl in mapping:
-                    concrete_events.append({"start": e.get("start"), "sound_file": mapping[lbl]})
-
-        if concrete_events:
-            with_sounds = os.path.join(out_dir, "short_with_sounds.mp4")
-            overlay_soundboard(subtitled, concrete_events, with_sounds)
-        else:
-            with_sounds = subtitled
-
-        # apply image overlays if any
-        if img_events:
-            with_images = os.path.join(out_dir, "short_with_images.mp4")
-            overlay_images_on_video(with_sounds, img_events, with_images)
-            final_with_sounds = with_images
-        else:
-            final_with_sounds = with_sounds
+        values, report = graph.run(pipeline_stages(), given, job_dir=out_dir)
+    except Stop as stop:
+        return stop.result
 
-    except Exception as e:
-        with open(os.path.join(out_dir, "subtitle_sound_error.txt"), "w", encoding="utf-8") as f:
-            f.write(str(e))
-        final_with_sounds = final_video
+    # per-stage timings and the critical path of this job
+    with open(os.path.join(out_dir, "stages.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
 
-    # 6) create a marker file for dev
-    open(os.path.join(out_dir, "processed.txt"), "w").write("done")
+    result = {
+        "short": values["final_short"],
+        "transcript_file": values["transcript_path"],
+        "subtitles": values["srt_path"],
+        "highlights": values["highlights"],
+        "critical_path": report["critical_path"],
+        "wall_seconds": report["wall_seconds"],
+    }
+    if values["remote"]:
+        result["remote"] = values["remote"]
+    if values["freed_bytes"] is not None:
+        result["freed_bytes"] = values["freed_bytes"]
 
-    # 7) Send notification via Telegram (if configured)
-    try:
-        from .telegram import send_short_notification
-        send_short_notification(final_with_sounds, transcript_path if transcript_text else None, highlights)
-    except Exception as e:
-        # write a non-fatal notification error for inspection
-        with open(os.path.join(out_dir, "telegram_error.txt"), "w", encoding="utf-8") as f:
-            f.write(str(e))
+    # remember this video's fingerprint so later re-uploads can reuse the short
+    if values["fp_hashes"]:
+        try:
+            from . import fingerprint
+
+            fingerprint.add_video(video_id, values["fp_hashes"], result)
+        except Exception as e:
+            with open(os.path.join(out_dir, "fingerprint_error.txt"), "w", encoding="utf-8") as f:
+                f.write(str(e))
 
-    return {"short": final_with_sounds, "transcript_file": transcript_path if transcript_text else None, "subtitles": srt_path, "highlights": highlights}
+    return result
@@ -0,0 +1,299 @@
+"""Live job progress: in-process event bus + ffmpeg `-progress` streaming.
+
+- The current job id travels in a ContextVar (the scheduler copies the context into its pool
+  threads), so any stage can report progress without extra arguments.
+- `download_hook()` turns yt-dlp progress callbacks into `download` events.
+- `run_ffmpeg(cmd)` runs ffmpeg with `-progress pipe:<fd>` and parses its key=value blocks
+  incrementally on a reader thread: percent complete, encode fps, speed and ETA. Raw output
+  on stdout (`-`) can be consumed block by block through `on_stdout`.
+- Stages of one job may overlap (see graph.py): each stage record is bound to its own context
+  through `current_stage`, so encode updates are attributed to the stage that ran ffmpeg.
+- Every stage transition and encode update is published on the bus. `get_job()` gives the
+  latest snapshot (GET /jobs/{id}); `subscribe()` yields an asyncio queue of events for the
+  SSE stream (GET /jobs/{id}/events).
+"""
+import asyncio
+import contextvars
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, List, Optional
+
+current_job = contextvars.ContextVar("current_job", default=None)
+# the stage record ({name, started, finished}) of the stage running in this context
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+# finished jobs kept for GET /jobs
+MAX_JOBS = 500
+# bytes per read of an ffmpeg stdout consumed through `on_stdout`
+STDOUT_BLOCK = 1 << 16
+
+_lock = threading.Lock()
+_jobs = {}
+_subscribers = []  # (loop, asyncio.Queue, job_id or None)
+
+
+def publish(event: dict):
+    """Apply `event` to the job snapshot and fan it out to all subscribers (thread-safe)."""
+    job_id = event.get("job_id")
+    event.setdefault("ts", time.time())
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            for k in ("stage", "running", "status", "percent", "fps", "speed", "eta_seconds", "error", "critical_path"):
+                if k in event:
+                    job[k] = event[k]
+            job["updated"] = event["ts"]
+        subs = list(_subscribers)
+    for loop, q, want in subs:
+        if want is None or want == job_id:
+            try:
+                loop.call_soon_threadsafe(q.put_nowait, dict(event))
+            except RuntimeError:
+                # subscriber's loop is gone
+                continue
+
+
+def queue_job(job_id: str, url: str = None):
+    with _lock:
+        _jobs[job_id] = {"job_id": job_id, "url": url, "status": "queued", "stage": None, "percent": None,
+                         "fps": None, "speed": None, "eta_seconds": None, "running": [], "stages": [], "queued": time.time()}
+        if len(_jobs) > MAX_JOBS:
+            done = [k for k, v in _jobs.items() if v["status"] in ("done", "failed")]
+            for k in done[: len(_jobs) - MAX_JOBS]:
+                del _jobs[k]
+    publish({"job_id": job_id, "type": "status", "status": "queued"})
+
+
+def start_job(job_id: str, url: str = None):
+    """Mark the job running and bind it to the current context. Returns a reset token."""
+    with _lock:
+        known = job_id in _jobs
+    if not known:
+        queue_job(job_id, url)
+    with _lock:
+        _jobs[job_id]["started"] = time.time()
+    publish({"job_id": job_id, "type": "status", "status": "running"})
+    return current_job.set(job_id)
+
+
+def finish_job(token, error: str = None):
+    job_id = current_job.get()
+    _close_stages(job_id)
+    status = "failed" if error else "done"
+    event = {"job_id": job_id, "type": "status", "status": status, "stage": None, "running": [], "eta_seconds": 0}
+    if error:
+        event["error"] = error
+    publish(event)
+    current_stage.set(None)
+    current_job.reset(token)
+
+
+def _close_stages(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job:
+            for s in job["stages"]:
+                if s.get("finished") is None:
+                    s["finished"] = time.time()
+
+
+def begin_stage(name: str) -> Optional[dict]:
+    """Start a stage of the current job without closing the other running ones.
+
+    Returns its record (also bound to `current_stage` in this context) for `end_stage`.
+    """
+    job_id = current_job.get()
+    if job_id is None:
+        return None
+    record = {"name": name, "started": time.time(), "finished": None}
+    with _lock:
+        job = _jobs.get(job_id)
+        running = []
+        if job is not None:
+            job["stages"].append(record)
+            running = [s["name"] for s in job["stages"] if s.get("finished") is None]
+    current_stage.set(record)
+    publish({"job_id": job_id, "type": "stage", "stage": name, "running": running, "percent": None, "fps": None,
+             "speed": None, "eta_seconds": None})
+    return record
+
+
+def end_stage(record: Optional[dict], status: str = "ok"):
+    """Close a record returned by `begin_stage` (status: ok, fallback, failed, stopped)."""
+    job_id = current_job.get()
+    if record is None or job_id is None:
+        return
+    with _lock:
+        record["finished"] = time.time()
+        record["status"] = status
+        job = _jobs.get(job_id)
+        running = [s["name"] for s in job["stages"] if s.get("finished") is None] if job else []
+    publish({"job_id": job_id, "type": "stage_end", "ended": record["name"], "result": status, "running": running,
+             "stage": running[-1] if running else None})
+
+
+def set_stage(name: str):
+    """Publish a stage transition for the current job (closes the stage started in this context)."""
+    previous = current_stage.get()
+    if previous is not None and previous.get("finished") is None:
+        end_stage(previous)
+    begin_stage(name)
+
+
+def set_critical_path(report: dict):
+    """Attach a graph run's critical path (see graph.py) to the current job's snapshot."""
+    job_id = current_job.get()
+    if job_id is not None:
+        publish({"job_id": job_id, "type": "critical_path", "critical_path": report})
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with _lock:
+        job = _jobs.get(job_id)
+        return None if job is None else dict(job, stages=[dict(s) for s in job["stages"]])
+
+
+def list_jobs() -> List[dict]:
+    with _lock:
+        return [{k: v for k, v in j.items() if k != "stages"} for j in _jobs.values()]
+
+
+def subscribe(job_id: str = None) -> asyncio.Queue:
+    """Register an asyncio queue (on the running loop) that receives events for `job_id`."""
+    q = asyncio.Queue()
+    with _lock:
+        _subscribers.append((asyncio.get_running_loop(), q, job_id))
+    return q
+
+
+def unsubscribe(q: asyncio.Queue):
+    with _lock:
+        _subscribers[:] = [s for s in _subscribers if s[1] is not q]
+
+
+def download_hook(min_interval: float = 0.5):
+    """yt-dlp progress hook publishing `download` events for the job and stage of the calling
+    context (bound now: yt-dlp may call it from its fragment threads), at most every
+    `min_interval` seconds."""
+    job_id = current_job.get()
+    record = current_stage.get()
+    stage = record["name"] if record else None
+    last = [0.0]
+
+    def hook(d: dict):
+        now = time.time()
+        finished = d.get("status") == "finished"
+        if job_id is None or (not finished and now - last[0] < min_interval):
+            return
+        last[0] = now
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        done = d.get("downloaded_bytes")
+        event = {"job_id": job_id, "type": "download", "stage": stage, "downloaded_bytes": done,
+                 "total_bytes": total, "bytes_per_second": d.get("speed"), "eta_seconds": d.get("eta")}
+        if finished:
+            event["percent"] = 100.0
+        elif total and done is not None:
+            event["percent"] = round(min(done / total, 1.0) * 100, 1)
+        publish(event)
+
+    return hook
+
+
+def _expected_duration(cmd: List[str]) -> Optional[float]:
+    """Output duration of an ffmpeg command: its -t, else the probed duration of the first input."""
+    for i, arg in enumerate(cmd[:-1]):
+        if arg == "-t":
+            try:
+                return float(cmd[i + 1])
+            except ValueError:
+                break
+    if "-i" in cmd:
+        src = cmd[cmd.index("-i") + 1]
+        if os.path.exists(src):
+            try:
+                from .probe import probe
+
+                # duration only: no keyframe scan
+                return probe(src, until=0).duration
+            except Exception:
+                return None
+    return None
+
+
+def _read_progress(rfd: int, job_id: str, stage: str, duration: Optional[float], t0: float):
+    block = {}
+    with os.fdopen(rfd, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            key, _, value = line.strip().partition("=")
+            block[key] = value
+            if key != "progress":
+                continue
+            event = {"job_id": job_id, "type": "encode", "stage": stage}
+            try:
+                out_time = int(block.get("out_time_us") or block.get("out_time_ms") or 0) / 1e6
+            except ValueError:
+                out_time = 0.0
+            try:
+                event["fps"] = float(block.get("fps") or 0)
+            except ValueError:
+                pass
+            event["speed"] = block.get("speed", "").strip() or None
+            event["out_time"] = out_time
+            if value == "end":
+                event["percent"] = 100.0
+                event["eta_seconds"] = 0.0
+            elif duration:
+                pct = max(0.0, min(out_time / duration, 1.0))
+                event["percent"] = round(pct * 100, 1)
+                elapsed = time.time() - t0
+                event["eta_seconds"] = round(elapsed * (1 - pct) / pct, 1) if pct > 0 else None
+            publish(event)
+            block = {}
+
+
+def _run(cmd: List[str], on_stdout: Optional[Callable[[bytes], None]], **kwargs):
+    if on_stdout is None:
+        return subprocess.run(cmd, check=False, **kwargs)
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, **kwargs) as p:
+        for block in iter(lambda: p.stdout.read(STDOUT_BLOCK), b""):
+            on_stdout(block)
+    return subprocess.CompletedProcess(cmd, p.returncode)
+
+
+def run_ffmpeg(cmd: List[str], duration: float = None, on_stdout: Callable[[bytes], None] = None):
+    """Run an ffmpeg command (like `subprocess.run(cmd, check=False)`) while streaming its progress.
+
+    Progress is only parsed when a job is bound to the current context and the platform can
+    pass an extra pipe fd to the child (not on Windows). Outputs that are being streamed to
+    object storage are written as fragmented MP4 (see `sink.fragment_output`). With
+    `on_stdout`, stdout is read as it arrives and handed over in blocks instead of buffered.
+    """
+    from .sink import fragment_output
+
+    cmd = fragment_output(cmd)
+    job_id = current_job.get()
+    if job_id is None or os.name == "nt" or not cmd or os.path.basename(cmd[0]) != "ffmpeg":
+        return _run(cmd, on_stdout)
+    with _lock:
+        job = _jobs.get(job_id)
+        stage = job["stage"] if job else None
+    record = current_stage.get()
+    if record is not None:
+        stage = record["name"]
+    rfd, wfd = os.pipe()
+    full = [cmd[0], "-progress", f"pipe:{wfd}", "-nostats"] + list(cmd[1:])
+    reader = threading.Thread(
+        target=_read_progress,
+        args=(rfd, job_id, stage, duration or _expected_duration(cmd), time.time()),
+        name=f"ffmpeg-progress-{job_id}",
+        daemon=True,
+    )
+    reader.start()
+    try:
+        return _run(full, on_stdout, pass_fds=(wfd,))
+    finally:
+        # the child has exited: closing our write end lets the reader hit EOF
+        os.close(wfd)
+        reader.join(timeout=5)
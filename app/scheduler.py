@@ -0,0 +1,197 @@
+"""Stage-aware resource scheduler (dev).
+
+Pipeline stages are either network-bound (yt-dlp, Whisper, moderation, GPT, Telegram) or
+CPU-bound (ffmpeg encodes, pydub). Instead of running a whole job in one sequential thread,
+each stage is handed to the pool that matches its kind:
+
+- CPU pool: sized to the number of cores, used for encodes. Each CPU stage holds one of
+  SCHED_CPU_WORKERS CPU slots; extra encoders a stage starts itself (render chunks) take a
+  free slot each, so the machine never runs more encodes than the pool has workers.
+- I/O pool: larger, used for network calls (threads spend most of their time waiting).
+
+Jobs themselves run on a small job pool and only orchestrate stages, so while one job is
+encoding the next one can already be downloading or waiting on the API. Before a job starts
+it must pass admission control (free disk in OUTPUT_DIR and available memory); otherwise it
+waits in the queue.
+"""
+import contextvars
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from .config import (
+    OUTPUT_DIR,
+    SCHED_CPU_WORKERS,
+    SCHED_IO_WORKERS,
+    SCHED_MAX_JOBS,
+    SCHED_MIN_FREE_DISK_MB,
+    SCHED_MIN_FREE_MEM_MB,
+)
+
+CPU = "cpu"
+IO = "io"
+
+# seconds between admission checks while a job is waiting for resources
+ADMISSION_POLL_SECONDS = 2.0
+
+_lock = threading.Lock()
+_pools = {}
+_cpu_slots = None
+_stats = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+
+_POOL_SIZES = {
+    CPU: lambda: SCHED_CPU_WORKERS,
+    IO: lambda: SCHED_IO_WORKERS,
+    "job": lambda: SCHED_MAX_JOBS,
+}
+
+
+def _get_pool(kind: str) -> ThreadPoolExecutor:
+    if kind not in _POOL_SIZES:
+        raise ValueError(f"unknown pool kind: {kind}")
+    with _lock:
+        pool = _pools.get(kind)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=max(1, _POOL_SIZES[kind]()), thread_name_prefix=f"{kind}-pool")
+            _pools[kind] = pool
+        return pool
+
+
+def cpu_slots() -> threading.Semaphore:
+    """The CPU slots shared by CPU stages and the extra encoders they start."""
+    global _cpu_slots
+    with _lock:
+        if _cpu_slots is None:
+            _cpu_slots = threading.BoundedSemaphore(max(1, SCHED_CPU_WORKERS))
+        return _cpu_slots
+
+
+def _in_slot(fn: Callable, *args, **kwargs):
+    with cpu_slots():
+        return fn(*args, **kwargs)
+
+
+def _in_pool(kind: str) -> bool:
+    return threading.current_thread().name.startswith(f"{kind}-pool")
+
+
+def prestart():
+    """Start every pool thread now instead of on first use (called at app start-up)."""
+    for kind in _POOL_SIZES:
+        pool = _get_pool(kind)
+        n = max(1, _POOL_SIZES[kind]())
+        # each task waits until all n are running, which forces the pool to spawn n threads
+        barrier = threading.Barrier(n)
+        futures = [pool.submit(barrier.wait, 5) for _ in range(n)]
+        for f in futures:
+            try:
+                f.result()
+            except threading.BrokenBarrierError:
+                pass
+
+
+def run_stage(kind: str, fn: Callable, *args, **kwargs):
+    """Run `fn(*args, **kwargs)` in the pool for `kind` (CPU or IO) and return its result.
+
+    Blocks the calling (job) thread until the stage finishes; exceptions are re-raised in the
+    caller. If we are already running inside that pool the stage runs inline to avoid deadlock.
+    """
+    if _in_pool(kind):
+        return fn(*args, **kwargs)
+    return submit_stage(kind, fn, *args, **kwargs).result()
+
+
+def submit_stage(kind: str, fn: Callable, *args, **kwargs) -> Future:
+    """Like `run_stage` but without waiting: returns a Future (already done if run inline)."""
+    if _in_pool(kind):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            fut.set_exception(e)
+        return fut
+    # carry context variables (e.g. the current job id) into the worker thread
+    ctx = contextvars.copy_context()
+    if kind == CPU:
+        return _get_pool(kind).submit(ctx.run, _in_slot, fn, *args, **kwargs)
+    return _get_pool(kind).submit(ctx.run, fn, *args, **kwargs)
+
+
+def free_disk_mb(path: str = OUTPUT_DIR) -> float:
+    return shutil.disk_usage(path).free / (1024 * 1024)
+
+
+def free_memory_mb() -> Optional[float]:
+    """Return available memory in MB, or None if it cannot be determined on this platform."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def can_admit() -> Tuple[bool, str]:
+    """Admission control: (ok, reason). A job is admitted only with enough disk and memory."""
+    disk = free_disk_mb()
+    if disk < SCHED_MIN_FREE_DISK_MB:
+        return False, f"low disk: {disk:.0f}MB free in {OUTPUT_DIR}"
+    mem = free_memory_mb()
+    if mem is not None and mem < SCHED_MIN_FREE_MEM_MB:
+        return False, f"low memory: {mem:.0f}MB available"
+    return True, "ok"
+
+
+def _run_job(fn: Callable, args, kwargs):
+    while True:
+        ok, _reason = can_admit()
+        if ok:
+            break
+        time.sleep(ADMISSION_POLL_SECONDS)
+    with _lock:
+        _stats["queued"] -= 1
+        _stats["running"] += 1
+    try:
+        result = fn(*args, **kwargs)
+    except Exception:
+        with _lock:
+            _stats["failed"] += 1
+        raise
+    else:
+        with _lock:
+            _stats["completed"] += 1
+        return result
+    finally:
+        with _lock:
+            _stats["running"] -= 1
+
+
+def submit_job(fn: Callable, *args, **kwargs) -> Future:
+    """Queue a whole job (e.g. `process.handle_new_video`). Returns a Future with its result."""
+    with _lock:
+        _stats["queued"] += 1
+    return _get_pool("job").submit(_run_job, fn, args, kwargs)
+
+
+def stats() -> dict:
+    """Snapshot of queue depth and job counters."""
+    with _lock:
+        return dict(_stats)
+
+
+def shutdown(wait: bool = True):
+    global _cpu_slots
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        _cpu_slots = None
+    for p in pools:
+        p.shutdown(wait=wait)
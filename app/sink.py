@@ -0,0 +1,344 @@
+"""Output sink for S3-compatible object storage (AWS S3, MinIO, R2, ...).
+
+Finished shorts are uploaded to `S3_BUCKET` under `S3_PREFIX<video_id>/` and shared as presigned
+GET URLs (e.g. in the Telegram caption), so workers don't need to keep outputs on local disk.
+
+- Requests are signed with AWS Signature V4 directly on httpx (no SDK dependency); path-style
+  URLs, so MinIO and other S3 stand-ins work as-is.
+- `StreamUpload` uploads the final encode *while ffmpeg is still writing it*: a tail thread cuts
+  every S3_PART_MB of new bytes into a multipart part and uploads parts concurrently. To make
+  the file append-only, the ffmpeg command writing a streamed path is switched to fragmented
+  MP4 (`fragment_output`, called from `progress.run_ffmpeg`). On `finish()` the remaining bytes
+  become the last part and every part is re-checked against the file (CRC32); a part the muxer
+  rewrote after it was sent is uploaded again, so the object always equals the file on disk.
+- Small files (< one part) are sent with a single PUT.
+"""
+import datetime
+import hashlib
+import hmac
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from .config import (
+    S3_ENDPOINT,
+    S3_BUCKET,
+    S3_ACCESS_KEY,
+    S3_SECRET_KEY,
+    S3_REGION,
+    S3_PREFIX,
+    S3_PART_MB,
+    S3_UPLOAD_CONCURRENCY,
+    S3_PRESIGN_SECONDS,
+)
+
+# S3 rejects non-final parts smaller than this
+MIN_PART_SIZE = 5 * 1024 * 1024
+TAIL_POLL_SECONDS = 0.5
+FRAGMENT_FLAGS = ["-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+_pool = None
+_streaming = set()
+_streaming_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(S3_ENDPOINT and S3_BUCKET and S3_ACCESS_KEY and S3_SECRET_KEY)
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    # own pool: uploads are started from stages that already run in the scheduler's pools
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=max(1, S3_UPLOAD_CONCURRENCY), thread_name_prefix="upload-pool")
+    return _pool
+
+
+# --- Signature V4 -----------------------------------------------------------
+
+
+def _uri_encode(s: str, safe: str = "-_.~") -> str:
+    return quote(s, safe=safe)
+
+
+def _signing_key(secret_key: str, date: str, region: str, service: str = "s3") -> bytes:
+    k = hmac.new(("AWS4" + secret_key).encode(), date.encode(), hashlib.sha256).digest()
+    for part in (region, service, "aws4_request"):
+        k = hmac.new(k, part.encode(), hashlib.sha256).digest()
+    return k
+
+
+def _canonical_query(params: Dict[str, str]) -> str:
+    return "&".join(f"{_uri_encode(k)}={_uri_encode(str(v))}" for k, v in sorted(params.items()))
+
+
+def _signature(method, url, params, headers, payload_hash, access_key, secret_key, region, amz_date) -> Tuple[str, str, str]:
+    """(signature, credential scope, signed header names) for a request."""
+    parts = urlsplit(url)
+    canonical_headers = {k.lower(): " ".join(str(v).split()) for k, v in headers.items()}
+    signed = ";".join(sorted(canonical_headers))
+    canonical = "\n".join([
+        method,
+        # S3 encodes the object key exactly once
+        _uri_encode(unquote(parts.path) or "/", safe="-_.~/"),
+        _canonical_query(params),
+        "".join(f"{k}:{canonical_headers[k]}\n" for k in sorted(canonical_headers)),
+        signed,
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()])
+    sig = hmac.new(_signing_key(secret_key, amz_date[:8], region), to_sign.encode(), hashlib.sha256).hexdigest()
+    return sig, scope, signed
+
+
+def sign_headers(method: str, url: str, params: Dict[str, str], headers: Dict[str, str], payload_hash: str,
+                 access_key: str, secret_key: str, region: str, now: datetime.datetime = None) -> Dict[str, str]:
+    """Return `headers` plus host, x-amz-date, x-amz-content-sha256 and Authorization."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    out = dict(headers)
+    out.setdefault("host", urlsplit(url).netloc)
+    out.setdefault("x-amz-date", amz_date)
+    out.setdefault("x-amz-content-sha256", payload_hash)
+    sig, scope, signed = _signature(method, url, params, out, payload_hash, access_key, secret_key, region, out["x-amz-date"])
+    out["Authorization"] = f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={signed}, Signature={sig}"
+    return out
+
+
+def presign_url(method: str, url: str, access_key: str, secret_key: str, region: str, expires: int,
+                now: datetime.datetime = None) -> str:
+    """Query-string signed URL, valid for `expires` seconds (max 7 days on S3)."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    params = {
+        "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+        "X-Amz-Credential": f"{access_key}/{amz_date[:8]}/{region}/s3/aws4_request",
+        "X-Amz-Date": amz_date,
+        "X-Amz-Expires": str(int(expires)),
+        "X-Amz-SignedHeaders": "host",
+    }
+    headers = {"host": urlsplit(url).netloc}
+    sig, _, _ = _signature(method, url, params, headers, "UNSIGNED-PAYLOAD", access_key, secret_key, region, amz_date)
+    return f"{url}?{_canonical_query(params)}&X-Amz-Signature={sig}"
+
+
+# --- client -----------------------------------------------------------------
+
+
+class S3Client:
+    """Minimal S3 client: single PUT, multipart upload and presigned GETs (path-style URLs)."""
+
+    def __init__(self, endpoint: str = None, bucket: str = None, access_key: str = None, secret_key: str = None,
+                 region: str = None, transport=None):
+        import httpx
+
+        self.endpoint = (endpoint or S3_ENDPOINT).rstrip("/")
+        self.bucket = bucket or S3_BUCKET
+        self.access_key = access_key or S3_ACCESS_KEY
+        self.secret_key = secret_key or S3_SECRET_KEY
+        self.region = region or S3_REGION
+        self._http = httpx.Client(timeout=120, transport=transport)
+
+    def url(self, key: str) -> str:
+        return f"{self.endpoint}/{self.bucket}/{_uri_encode(key, safe='-_.~/')}"
+
+    def _request(self, method: str, key: str, params: Dict[str, str] = None, body: bytes = b"", headers: dict = None):
+        params = params or {}
+        payload_hash = hashlib.sha256(body).hexdigest() if body else EMPTY_SHA256
+        url = self.url(key)
+        signed = sign_headers(method, url, params, headers or {}, payload_hash, self.access_key, self.secret_key, self.region)
+        r = self._http.request(method, url, params=params, content=body, headers=signed)
+        if r.status_code >= 300:
+            raise RuntimeError(f"S3 {method} {key} failed ({r.status_code}): {r.text[:200]}")
+        return r
+
+    def put_object(self, key: str, data: bytes, content_type: str = "application/octet-stream"):
+        self._request("PUT", key, body=data, headers={"content-type": content_type})
+
+    def create_multipart(self, key: str, content_type: str = "application/octet-stream") -> str:
+        r = self._request("POST", key, params={"uploads": ""}, headers={"content-type": content_type})
+        m = re.search(r"<UploadId>([^<]+)</UploadId>", r.text)
+        if not m:
+            raise RuntimeError(f"S3 create multipart for {key}: no UploadId in response")
+        return m.group(1)
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        r = self._request("PUT", key, params={"partNumber": str(part_number), "uploadId": upload_id}, body=data)
+        return r.headers.get("etag", "")
+
+    def complete_multipart(self, key: str, upload_id: str, parts: List[Tuple[int, str]]):
+        body = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>" for n, etag in sorted(parts)
+        ) + "</CompleteMultipartUpload>"
+        self._request("POST", key, params={"uploadId": upload_id}, body=body.encode(), headers={"content-type": "application/xml"})
+
+    def abort_multipart(self, key: str, upload_id: str):
+        self._request("DELETE", key, params={"uploadId": upload_id})
+
+    def presign_get(self, key: str, expires: int = None) -> str:
+        return presign_url("GET", self.url(key), self.access_key, self.secret_key, self.region, expires or S3_PRESIGN_SECONDS)
+
+
+def _content_type(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    return {".mp4": "video/mp4", ".srt": "application/x-subrip", ".txt": "text/plain; charset=utf-8",
+            ".jpg": "image/jpeg"}.get(ext, "application/octet-stream")
+
+
+def key_for(video_id: str, path: str) -> str:
+    return f"{S3_PREFIX}{video_id}/{os.path.basename(path)}"
+
+
+# --- uploads ----------------------------------------------------------------
+
+
+class StreamUpload:
+    """Multipart upload of a file that is still being written (see module docstring)."""
+
+    def __init__(self, client: S3Client, path: str, key: str, part_size: int = None):
+        self.client = client
+        self.path = path
+        self.key = key
+        self.part_size = max(MIN_PART_SIZE, part_size or S3_PART_MB * 1024 * 1024)
+        self.upload_id = None
+        self.offset = 0
+        self._parts = {}  # part number -> (start, length, crc, future)
+        self._done = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._tail, name=f"upload-tail-{os.path.basename(path)}", daemon=True)
+
+    def start(self) -> "StreamUpload":
+        with _streaming_lock:
+            _streaming.add(os.path.abspath(self.path))
+        self._thread.start()
+        return self
+
+    def _send(self, n: int, start: int, data: bytes):
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart(self.key, _content_type(self.path))
+        fut = _get_pool().submit(self.client.upload_part, self.key, self.upload_id, n, data)
+        self._parts[n] = (start, len(data), zlib.crc32(data), fut)
+
+    def _cut_parts(self, final: bool):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        with open(self.path, "rb") as f:
+            while size - self.offset >= self.part_size or (final and size > self.offset):
+                length = self.part_size if size - self.offset >= self.part_size else size - self.offset
+                f.seek(self.offset)
+                data = f.read(length)
+                self._send(len(self._parts) + 1, self.offset, data)
+                self.offset += len(data)
+
+    def _tail(self):
+        try:
+            while not self._done.wait(TAIL_POLL_SECONDS):
+                self._cut_parts(final=False)
+        except Exception as e:
+            self._error = e
+
+    def _stop(self):
+        self._done.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+        with _streaming_lock:
+            _streaming.discard(os.path.abspath(self.path))
+
+    def finish(self) -> str:
+        """Upload the rest once the writer is done, repair rewritten parts and complete. Returns the key."""
+        self._stop()
+        if self._error:
+            self.abort()
+            raise self._error
+        size = os.path.getsize(self.path)
+        if not self._parts and size < self.part_size:
+            # never reached one part: a single PUT is cheaper
+            with open(self.path, "rb") as f:
+                self.client.put_object(self.key, f.read(), _content_type(self.path))
+            return self.key
+        self._cut_parts(final=True)
+        etags = []
+        try:
+            with open(self.path, "rb") as f:
+                for n, (start, length, crc, fut) in sorted(self._parts.items()):
+                    etag = fut.result()
+                    f.seek(start)
+                    data = f.read(length)
+                    if zlib.crc32(data) != crc:
+                        # the muxer went back and rewrote these bytes after they were sent
+                        etag = self.client.upload_part(self.key, self.upload_id, n, data)
+                    etags.append((n, etag))
+            if self.offset != size:
+                raise RuntimeError(f"{self.path} shrank while uploading ({size} < {self.offset} bytes)")
+            self.client.complete_multipart(self.key, self.upload_id, etags)
+        except Exception:
+            self.abort()
+            raise
+        return self.key
+
+    def abort(self):
+        if not self._done.is_set():
+            self._stop()
+        for _, _, _, fut in self._parts.values():
+            fut.cancel()
+        if self.upload_id:
+            try:
+                self.client.abort_multipart(self.key, self.upload_id)
+            except Exception as e:
+                print("S3 abort failed:", self.key, e)
+            self.upload_id = None
+
+
+def fragment_output(cmd: List[str]) -> List[str]:
+    """Make an ffmpeg command whose output is being streamed write fragmented (append-only) MP4."""
+    if not _streaming or not cmd or "-movflags" in cmd:
+        return cmd
+    with _streaming_lock:
+        streamed = os.path.abspath(cmd[-1]) in _streaming
+    if not streamed:
+        return cmd
+    return list(cmd[:-1]) + FRAGMENT_FLAGS + [cmd[-1]]
+
+
+def start_stream(video_id: str, path: str, client: S3Client = None) -> Optional[StreamUpload]:
+    """Begin streaming `path` (about to be written by the final encode), or None if S3 is off."""
+    if client is None and not enabled():
+        return None
+    return StreamUpload(client or S3Client(), path, key_for(video_id, path)).start()
+
+
+def upload_file(video_id: str, path: str, client: S3Client = None) -> str:
+    """Upload a finished file (multipart for anything above one part). Returns the key."""
+    client = client or S3Client()
+    # no tail thread: finish() cuts all parts at once
+    return StreamUpload(client, path, key_for(video_id, path)).finish()
+
+
+def publish(video_id: str, final_path: str, stream: Optional[StreamUpload] = None, extra: List[str] = (),
+            client: S3Client = None) -> Dict[str, dict]:
+    """Complete the streamed upload of the final short (or upload it now if the stream didn't end
+    up with it), upload the small deliverables and return {name: {key, url}}."""
+    if stream is None and client is None and not enabled():
+        return {}
+    client = client or (stream.client if stream else S3Client())
+    if stream is not None and os.path.abspath(stream.path) == os.path.abspath(final_path) and os.path.exists(final_path):
+        key = stream.finish()
+    else:
+        if stream is not None:
+            # the final encode failed and an earlier render became the short
+            stream.abort()
+        key = upload_file(video_id, final_path, client)
+    out = {"short": {"key": key, "url": client.presign_get(key)}}
+    for path in extra:
+        if path and os.path.exists(path):
+            k = upload_file(video_id, path, client)
+            out[os.path.splitext(os.path.basename(path))[0]] = {"key": k, "url": client.presign_get(k)}
+    return out
@@ -11,23 +11,31 @@ and audio normalization are left for future improvement.
 """
 import os
 import glob
-import subprocess
 from typing import List, Dict
+from .progress import run_ffmpeg
 
 SOUND_DIR = os.path.join(os.path.dirname(__file__), "..", "assets", "soundboard")
 
+# discover_sounds() result, refreshed when the directory changes
+_sound_cache = {"mtime": None, "mapping": {}}
+
 
 def discover_sounds() -> Dict[str, str]:
     """Return mapping keyword -> filepath (keyword is basename without extension).
     Files are matched by name: e.g. `ding.mp3` maps to keyword `ding`.
     """
-    mapping = {}
     if not os.path.isdir(SOUND_DIR):
-        return mapping
+        return {}
+    mtime = os.path.getmtime(SOUND_DIR)
+    if mtime == _sound_cache["mtime"]:
+        return dict(_sound_cache["mapping"])
+    mapping = {}
     for p in glob.glob(os.path.join(SOUND_DIR, "*.*")):
         name = os.path.splitext(os.path.basename(p))[0].lower()
         mapping[name] = p
-    return mapping
+    _sound_cache["mtime"] = mtime
+    _sound_cache["mapping"] = mapping
+    return dict(mapping)
 
 
 def detect_sound_events(segments: List[dict]) -> List[dict]:
@@ -57,7 +65,7 @@ def overlay_soundboard(video_in: str, events: List[dict], out_path: str) -> str:
     """
     if not events:
         # just copy
-        subprocess.run(["ffmpeg", "-y", "-i", video_in, "-c", "copy", out_path], check=False)
+        run_ffmpeg(["ffmpeg", "-y", "-i", video_in, "-c", "copy", out_path])
         return out_path
 
     # Build command with inputs
@@ -69,7 +77,7 @@ def overlay_soundboard(video_in: str, events: List[dict], out_path: str) -> str:
             cmd += ["-i", sf]
             sound_inputs.append(e)
     if not sound_inputs:
-        subprocess.run(["ffmpeg", "-y", "-i", video_in, "-c", "copy", out_path], check=False)
+        run_ffmpeg(["ffmpeg", "-y", "-i", video_in, "-c", "copy", out_path])
         return out_path
 
     # Build filter_complex
@@ -89,5 +97,5 @@ def overlay_soundboard(video_in: str, events: List[dict], out_path: str) -> str:
 
     filter_complex = ";".join(filter_parts + [amix])
     full_cmd = cmd + ["-filter_complex", filter_complex, "-map", "0:v", "-map", "[aout]", "-c:v", "copy", "-c:a", "aac", out_path]
-    subprocess.run(full_cmd, check=False)
+    run_ffmpeg(full_cmd)
     return out_path
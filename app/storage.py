@@ -1,28 +1,178 @@
+import fcntl
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
 from .config import OUTPUT_DIR
 
 STATE_FILE = os.path.join(OUTPUT_DIR, "state.json")
+# video ids already enqueued (by polling or WebSub), used to deduplicate notifications
+SEEN_FILE = os.path.join(OUTPUT_DIR, "seen_videos.json")
+# WebSub subscriptions per channel: {"state": "pending" | "active" | "unsubscribing", "expires": ts}
+WEBSUB_FILE = os.path.join(OUTPUT_DIR, "websub.json")
+# uploads rejected by the metadata prefilter: {video_id: {"reason", "details", "title", "ts"}}
+REJECTED_FILE = os.path.join(OUTPUT_DIR, "rejected_videos.json")
+# polled uploads the prefilter rejected for a reason that may change (live, upcoming, still
+# processing), offered to the prefilter again on every poll: {video_id: {"channel_id", "reason", "since"}}
+RECHECK_FILE = os.path.join(OUTPUT_DIR, "recheck_videos.json")
+# authorized Google accounts (OAuth tokens, subscriptions, quota spent): {account_id: {...}}
+ACCOUNTS_FILE = os.path.join(OUTPUT_DIR, "accounts.json")
 
+SEEN_MAX = 10000
 
-def _load_state():
-    if not os.path.exists(STATE_FILE):
+# polling, WebSub callbacks and jobs all touch these files from different threads
+_lock = threading.RLock()
+
+
+def _load_json(path):
+    if not os.path.exists(path):
         return {}
-    with open(STATE_FILE, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def _save_json(path, data, mode=None):
+    """Write `data` atomically; with `mode`, the file has those permissions from creation on."""
+    tmp = path + ".tmp"
+    if mode is None:
+        f = open(tmp, "w", encoding="utf-8")
+    else:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        f = os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode), "w", encoding="utf-8")
+    with f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _load_state():
+    return _load_json(STATE_FILE)
+
+
 def _save_state(state):
-    with open(STATE_FILE, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+    _save_json(STATE_FILE, state)
 
 
 def get_last_video_for_channel(channel_id: str):
-    state = _load_state()
+    with _lock:
+        state = _load_state()
     return state.get(channel_id)
 
 
 def set_last_video_for_channel(channel_id: str, video_id: str):
-    state = _load_state()
-    state[channel_id] = video_id
-    _save_state(state)
+    with _lock:
+        state = _load_state()
+        state[channel_id] = video_id
+        _save_state(state)
+
+
+def mark_video_seen(video_id: str) -> bool:
+    """Record `video_id` as enqueued. Returns False if it was already seen (duplicate)."""
+    with _lock:
+        seen = _load_json(SEEN_FILE)
+        if video_id in seen:
+            return False
+        seen[video_id] = time.time()
+        if len(seen) > SEEN_MAX:
+            # keep the most recent ids only
+            seen = dict(sorted(seen.items(), key=lambda kv: kv[1])[-SEEN_MAX:])
+        _save_json(SEEN_FILE, seen)
+        return True
+
+
+def forget_video_seen(video_id: str):
+    """Drop `video_id` from the seen set so a later notification or poll can enqueue it again."""
+    with _lock:
+        seen = _load_json(SEEN_FILE)
+        if seen.pop(video_id, None) is not None:
+            _save_json(SEEN_FILE, seen)
+
+
+def record_rejection(video_id: str, reason: str, details: str = "", **fields):
+    with _lock:
+        rejected = _load_json(REJECTED_FILE)
+        rejected[video_id] = dict(fields, reason=reason, details=details, ts=time.time())
+        if len(rejected) > SEEN_MAX:
+            rejected = dict(sorted(rejected.items(), key=lambda kv: kv[1]["ts"])[-SEEN_MAX:])
+        _save_json(REJECTED_FILE, rejected)
+
+
+def get_rejections() -> dict:
+    with _lock:
+        return _load_json(REJECTED_FILE)
+
+
+def get_rechecks() -> dict:
+    with _lock:
+        return _load_json(RECHECK_FILE)
+
+
+def set_recheck(video_id: str, **fields):
+    with _lock:
+        pending = _load_json(RECHECK_FILE)
+        pending.setdefault(video_id, {}).update(fields)
+        _save_json(RECHECK_FILE, pending)
+
+
+def remove_recheck(video_id: str):
+    with _lock:
+        pending = _load_json(RECHECK_FILE)
+        if pending.pop(video_id, None) is not None:
+            _save_json(RECHECK_FILE, pending)
+
+
+def get_websub_subscriptions() -> dict:
+    with _lock:
+        return _load_json(WEBSUB_FILE)
+
+
+def set_websub_subscription(channel_id: str, **fields):
+    with _lock:
+        subs = _load_json(WEBSUB_FILE)
+        subs.setdefault(channel_id, {}).update(fields)
+        _save_json(WEBSUB_FILE, subs)
+
+
+def remove_websub_subscription(channel_id: str):
+    with _lock:
+        subs = _load_json(WEBSUB_FILE)
+        if subs.pop(channel_id, None) is not None:
+            _save_json(WEBSUB_FILE, subs)
+
+
+def get_accounts() -> dict:
+    with _lock:
+        return _load_json(ACCOUNTS_FILE)
+
+
+def accounts_stamp() -> Optional[Tuple[int, int]]:
+    """(mtime, size) of the account store, to notice writes by other instances; None if missing."""
+    try:
+        st = os.stat(ACCOUNTS_FILE)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+@contextmanager
+def _file_lock(path):
+    # flock on a side file: held across processes, so instances sharing OUTPUT_DIR take turns
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def update_accounts(change: Callable[[dict], None]) -> dict:
+    """Read-modify-write the account store. `change` edits the accounts as currently stored, under
+    a file lock shared by every instance, so only its edits are written over what other instances
+    stored. The file holds refresh tokens: only the owner may read it. Returns the new accounts."""
+    with _lock, _file_lock(ACCOUNTS_FILE):
+        accounts = _load_json(ACCOUNTS_FILE)
+        change(accounts)
+        _save_json(ACCOUNTS_FILE, accounts, mode=0o600)
+        return accounts
@@ -1,31 +1,71 @@
 """Telegram helpers to notify and send generated shorts.
 
 Functions:
-- send_short_notification(short_path, transcript_path, highlights)
+- send_short_notification(short_path, transcript_path, highlights, links=None)
 - send_text(message)
 
 Requires `TELEGRAM_BOT_TOKEN` and `TELEGRAM_CHAT_ID` in config (or pass chat_id explicitly).
 """
+import asyncio
+import inspect
 import os
-from .config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
-
-try:
-    from telegram import Bot
-except Exception:
-    Bot = None
+from .config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API_BASE
 
 
 def _ensure_bot():
     if not TELEGRAM_BOT_TOKEN:
         raise RuntimeError("TELEGRAM_BOT_TOKEN not configured")
-    if Bot is None:
+    # imported lazily: python-telegram-bot (and httpx under it) is slow to import
+    try:
+        from telegram import Bot
+    except Exception:
         raise RuntimeError("python-telegram-bot not available; install requirements")
+    if TELEGRAM_API_BASE:
+        return Bot(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_BASE.rstrip("/") + "/bot")
     return Bot(token=TELEGRAM_BOT_TOKEN)
 
 
-def _generate_caption(transcript_path: str, highlights: list) -> str:
+class _Session:
+    """Bot calls that work with either python-telegram-bot API.
+
+    v13 methods return their result; v20+ methods are coroutines, which are run on one private
+    event loop per session (the bot's HTTP client is bound to the loop it first ran on).
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._loop = None
+
+    def call(self, method: str, **kwargs):
+        result = getattr(self.bot, method)(**kwargs)
+        if inspect.isawaitable(result):
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+            result = self._loop.run_until_complete(result)
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._loop is not None:
+            try:
+                if hasattr(self.bot, "shutdown"):
+                    self._loop.run_until_complete(self.bot.shutdown())
+            finally:
+                self._loop.close()
+
+
+# Telegram limit for media captions
+CAPTION_MAX = 1024
+
+
+def _generate_caption(transcript_path: str, highlights: list, links: dict = None) -> str:
     lines = []
     lines.append("Hasil Short otomatis")
+    # presigned download links (object storage sink) go first so they survive truncation
+    for name, url in (links or {}).items():
+        lines.append(f"Unduh {name}: {url}")
     if highlights:
         lines.append("Highlights:")
         for h in highlights:
@@ -38,7 +78,10 @@ def _generate_caption(transcript_path: str, highlights: list) -> str:
             if text:
                 lines.append("\nTranskrip (potongan):")
                 lines.append(text.replace('\n', ' ') + ("..." if len(text)>500 else ""))
-    return "\n".join(lines)
+    caption = "\n".join(lines)
+    if len(caption) > CAPTION_MAX:
+        caption = caption[: CAPTION_MAX - 3] + "..."
+    return caption
 
 
 def send_text(message: str, chat_id: str = None):
@@ -46,46 +89,67 @@ def send_text(message: str, chat_id: str = None):
     cid = chat_id or TELEGRAM_CHAT_ID
     if not cid:
         raise RuntimeError("TELEGRAM_CHAT_ID not configured")
-    bot.send_message(chat_id=cid, text=message)
-
-
-def _generate_thumbnail(video_path: str, thumb_path: str):
-    import subprocess
-    cmd = ["ffmpeg", "-y", "-i", video_path, "-ss", "00:00:01", "-vframes", "1", thumb_path]
-    subprocess.run(cmd, check=False)
+    with _Session(bot) as tg:
+        tg.call("send_message", chat_id=cid, text=message)
+
+
+def thumbnail_time(duration: float, avoid=()) -> float:
+    """Frame time for the thumbnail: ~1s in, moved past any (start, end) range in `avoid`
+    (e.g. flagged segments, which are blurred in the short but not in the trimmed render)."""
+    at = min(1.0, duration / 2) if duration else 1.0
+    for start, end in sorted(avoid):
+        if start <= at < end:
+            at = end + 0.1
+    if duration and at >= duration:
+        raise RuntimeError("no unflagged frame for the thumbnail")
+    return at
+
+
+def _generate_thumbnail(video_path: str, thumb_path: str, avoid=()):
+    from .probe import probe
+    from .progress import run_ffmpeg
+
+    # seek before -i (no decode from the start); stay inside very short clips
+    info = probe(video_path, until=0)
+    at = thumbnail_time(info.duration, avoid)
+    cmd = ["ffmpeg", "-y", "-ss", f"{at:.3f}", "-i", video_path, "-vframes", "1", thumb_path]
+    run_ffmpeg(cmd)
     return thumb_path
 
 
-def send_short_notification(short_path: str, transcript_path: str = None, highlights: list = None, chat_id: str = None):
+def send_short_notification(short_path: str, transcript_path: str = None, highlights: list = None, chat_id: str = None, links: dict = None,
+                            thumb_path: str = None):
     bot = _ensure_bot()
     cid = chat_id or TELEGRAM_CHAT_ID
     if not cid:
         raise RuntimeError("TELEGRAM_CHAT_ID not configured")
 
-    caption = _generate_caption(transcript_path, highlights or [])
-
-    # try to generate thumbnail
-    thumb = None
-    try:
-        thumb = os.path.splitext(short_path)[0] + ".thumb.jpg"
-        _generate_thumbnail(short_path, thumb)
-    except Exception:
-        thumb = None
-
-    with open(short_path, "rb") as vid:
-        # send video
-        bot.send_video(chat_id=cid, video=vid, caption=caption, supports_streaming=True)
-
-    # send thumbnail as separate message for preview if available
-    if thumb and os.path.exists(thumb):
-        with open(thumb, "rb") as ph:
-            bot.send_photo(chat_id=cid, photo=ph, caption="Preview gambar highlight")
-
-    # Send full transcript as a file if not too large
-    if transcript_path and os.path.exists(transcript_path):
-        size = os.path.getsize(transcript_path)
-        if size < 5000000:  # <5MB
-            with open(transcript_path, "rb") as tf:
-                bot.send_document(chat_id=cid, document=tf, filename=os.path.basename(transcript_path))
-        else:
-            bot.send_message(chat_id=cid, text="Transkrip terlalu besar untuk diunggah; simpan lokal pada server.")
+    caption = _generate_caption(transcript_path, highlights or [], links)
+
+    # try to generate thumbnail (unless the pipeline already extracted one)
+    thumb = thumb_path
+    if not thumb:
+        try:
+            thumb = os.path.splitext(short_path)[0] + ".thumb.jpg"
+            _generate_thumbnail(short_path, thumb)
+        except Exception:
+            thumb = None
+
+    with _Session(bot) as tg:
+        with open(short_path, "rb") as vid:
+            # send video
+            tg.call("send_video", chat_id=cid, video=vid, caption=caption, supports_streaming=True)
+
+        # send thumbnail as separate message for preview if available
+        if thumb and os.path.exists(thumb):
+            with open(thumb, "rb") as ph:
+                tg.call("send_photo", chat_id=cid, photo=ph, caption="Preview gambar highlight")
+
+        # Send full transcript as a file if not too large
+        if transcript_path and os.path.exists(transcript_path):
+            size = os.path.getsize(transcript_path)
+            if size < 5000000:  # <5MB
+                with open(transcript_path, "rb") as tf:
+                    tg.call("send_document", chat_id=cid, document=tf, filename=os.path.basename(transcript_path))
+            else:
+                tg.call("send_message", chat_id=cid, text="Transkrip terlalu besar untuk diunggah; simpan lokal pada server.")
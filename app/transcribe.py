@@ -5,12 +5,13 @@ This module extracts audio from a video file and sends it to OpenAI's
 openai SDK method name.
 """
 import os
-import subprocess
+import shutil
 import tempfile
 import httpx
-from .config import OPENAI_API_KEY
+from .config import OPENAI_API_KEY, OPENAI_API_BASE
+from .progress import run_ffmpeg
 
-OPENAI_TRANSCRIPT_URL = "https://api.openai.com/v1/audio/transcriptions"
+OPENAI_TRANSCRIPT_URL = f"{OPENAI_API_BASE}/audio/transcriptions"
 
 
 def _extract_audio(video_path: str, out_path: str):
@@ -29,7 +30,7 @@ def _extract_audio(video_path: str, out_path: str):
         "16000",
         out_path,
     ]
-    subprocess.run(cmd, check=False)
+    run_ffmpeg(cmd)
     return out_path
 
 
@@ -73,9 +74,17 @@ def transcribe_audio_file(audio_path: str, language: str = "id") -> str:
 
 
 def transcribe_from_video(video_path: str, language: str = "id") -> str:
-    """Extract audio from `video_path`, transcribe it, and return the text."""
+    """Extract audio from `video_path`, transcribe it, and return the text.
+
+    Timestamped segments (if Whisper returned them) are kept next to the video as
+    `<video>.segments.json`.
+    """
     with tempfile.TemporaryDirectory() as td:
         audio_path = os.path.join(td, "audio.mp3")
         _extract_audio(video_path, audio_path)
         text = transcribe_audio_file(audio_path, language=language)
+        seg_path = os.path.join(td, "audio.segments.json")
+        if os.path.exists(seg_path):
+            # the temp dir is removed on return: move the segments where the pipeline looks
+            shutil.move(seg_path, os.path.splitext(video_path)[0] + ".segments.json")
         return text
@@ -0,0 +1,178 @@
+"""Full-text index of transcripts (SQLite FTS5).
+
+Every job's timestamped segments are stored with the video's metadata (channel, title,
+duration, upload date) so past videos can be searched without re-downloading or
+re-transcribing them: `search("kata kunci")` returns the matching moments with their start/end
+times and a link that jumps to the moment, and `get_segments()` returns a transcript (or a time
+range of it) to build a short from.
+
+Schema:
+- `videos`: one row per video (metadata + when it was indexed);
+- `segments`: FTS5 table over the segment text, with video id, index and times as unindexed
+  columns. Re-indexing a video replaces its rows.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from .config import OUTPUT_DIR
+
+DB_PATH = os.path.join(OUTPUT_DIR, "transcripts.db")
+
+_lock = threading.Lock()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS videos (video_id TEXT PRIMARY KEY, channel_id TEXT, channel TEXT, title TEXT, "
+        "url TEXT, language TEXT, duration REAL, upload_date TEXT, indexed_at REAL)"
+    )
+    conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5("
+        "text, video_id UNINDEXED, seg UNINDEXED, t_start UNINDEXED, t_end UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    return conn
+
+
+def add_transcript(video_id: str, segments: List[dict], **meta):
+    """Index (or re-index) a video's segments `[{start, end, text}]` with its metadata.
+
+    `meta` may contain channel_id, channel, title, url, language, duration and upload_date.
+    """
+    rows = [
+        (s.get("text", "").strip(), video_id, i, float(s.get("start") or 0.0), float(s.get("end") or 0.0))
+        for i, s in enumerate(segments)
+        if (s.get("text") or "").strip()
+    ]
+    with _lock:
+        conn = _connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+                conn.executemany("INSERT INTO segments (text, video_id, seg, t_start, t_end) VALUES (?, ?, ?, ?, ?)", rows)
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (video_id, channel_id, channel, title, url, language, duration, "
+                    "upload_date, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        video_id,
+                        meta.get("channel_id"),
+                        meta.get("channel"),
+                        meta.get("title"),
+                        meta.get("url"),
+                        meta.get("language"),
+                        meta.get("duration"),
+                        meta.get("upload_date"),
+                        time.time(),
+                    ),
+                )
+        finally:
+            conn.close()
+    return len(rows)
+
+
+def index_job(video_id: str, segments: List[dict], job_dir: str, **meta) -> int:
+    """Index a job's segments, taking channel/title/duration from the saved yt-dlp info JSON."""
+    info_path = os.path.join(job_dir, "input.info.json")
+    if os.path.exists(info_path):
+        try:
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except ValueError:
+            info = {}
+        meta = dict(
+            {
+                "channel_id": info.get("channel_id"),
+                "channel": info.get("channel") or info.get("uploader"),
+                "title": info.get("title"),
+                "duration": info.get("duration"),
+                "upload_date": info.get("upload_date"),
+            },
+            **meta,
+        )
+    return add_transcript(video_id, segments, **meta)
+
+
+def _quote(query: str) -> str:
+    """Treat free text as a plain AND of terms (FTS5 syntax characters are quoted away)."""
+    return " ".join('"' + t.replace('"', '""') + '"' for t in query.split())
+
+
+def search(query: str, limit: int = 20, channel_id: str = None, video_id: str = None) -> List[dict]:
+    """Best-matching moments for `query` (FTS5 syntax, or plain words), ranked by bm25."""
+    if not query or not query.strip():
+        return []
+    sql = (
+        "SELECT s.video_id, s.seg, s.t_start, s.t_end, s.text, snippet(segments, 0, '[', ']', '…', 12), bm25(segments), "
+        "v.channel_id, v.channel, v.title "
+        "FROM segments s LEFT JOIN videos v ON v.video_id = s.video_id WHERE segments MATCH ?"
+    )
+    params = []
+    if channel_id:
+        sql += " AND v.channel_id = ?"
+        params.append(channel_id)
+    if video_id:
+        sql += " AND s.video_id = ?"
+        params.append(video_id)
+    sql += " ORDER BY bm25(segments) LIMIT ?"
+    with _lock:
+        conn = _connect()
+        try:
+            try:
+                rows = conn.execute(sql, [query] + params + [limit]).fetchall()
+            except sqlite3.OperationalError:
+                # not valid FTS5 syntax (e.g. stray quotes or operators): search the words instead
+                rows = conn.execute(sql, [_quote(query)] + params + [limit]).fetchall()
+        finally:
+            conn.close()
+    out = []
+    for vid, seg, start, end, text, snip, rank, ch_id, channel, title in rows:
+        out.append({
+            "video_id": vid,
+            "segment": seg,
+            "start": start,
+            "end": end,
+            "text": text,
+            "snippet": snip,
+            "score": -rank,
+            "channel_id": ch_id,
+            "channel": channel,
+            "title": title,
+            "url": f"https://www.youtube.com/watch?v={vid}&t={int(start)}s",
+        })
+    return out
+
+
+def get_video(video_id: str) -> Optional[dict]:
+    with _lock:
+        conn = _connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        finally:
+            conn.close()
+    return dict(row) if row else None
+
+
+def get_segments(video_id: str, start: float = None, end: float = None) -> List[dict]:
+    """Indexed segments of a video in order, optionally only those overlapping [start, end]."""
+    with _lock:
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT seg, t_start, t_end, text FROM segments WHERE video_id = ? ORDER BY seg", (video_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+    out = []
+    for seg, s, e, text in rows:
+        if start is not None and e < start:
+            continue
+        if end is not None and s > end:
+            continue
+        out.append({"segment": seg, "start": s, "end": e, "text": text})
+    return out
@@ -4,8 +4,9 @@ Prototype approach: apply overlays sequentially (one event per ffmpeg call) for
 Events format: [{"start": float, "end": float, "image": "/path/to/img.png"}, ...]
 """
 import os
-import subprocess
 from typing import List
+from .progress import run_ffmpeg
+from .chunked import render
 
 
 def overlay_images_on_video(video_in: str, events: List[dict], out_path: str) -> str:
@@ -21,23 +22,10 @@ def overlay_images_on_video(video_in: str, events: List[dict], out_path: str) ->
         # build an ffmpeg command to overlay image with enable between(t,start,end)
         out_tmp = f"{os.path.splitext(out_path)[0]}.ov{idx}.mp4"
         vf = f"overlay=(main_w-overlay_w)/2:(main_h-overlay_h)/2:enable='between(t,{start},{end})'"
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            tmp,
-            "-i",
-            img,
-            "-filter_complex",
-            vf,
-            "-c:a",
-            "copy",
-            out_tmp,
-        ]
-        subprocess.run(cmd, check=False)
+        render(tmp, out_tmp, filter_complex=vf, extra_inputs=[img])
         tmp = out_tmp
         idx += 1
     # final copy to out_path
     if tmp != out_path:
-        subprocess.run(["ffmpeg", "-y", "-i", tmp, "-c", "copy", out_path], check=False)
+        run_ffmpeg(["ffmpeg", "-y", "-i", tmp, "-c", "copy", out_path])
     return out_path
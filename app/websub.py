@@ -0,0 +1,230 @@
+"""Push-based upload detection via WebSub (PubSubHubbub).
+
+YouTube publishes each channel's upload feed through a WebSub hub. We subscribe our
+`/websub/callback` per channel and the hub POSTs an Atom entry seconds after an upload, instead
+of us finding it on the next poll.
+
+Flow:
+1. `subscribe(channel_id)` asks the hub for a lease (async verification).
+2. The hub GETs the callback with `hub.challenge`; `verify_challenge` echoes it only for
+   requests we actually sent (a subscribe for a pending/active topic, an unsubscribe we
+   asked for) and records the lease expiry.
+3. Notifications are signed with our secret (`X-Hub-Signature: sha1=...`); `verify_signature`
+   checks the HMAC, `parse_notification` reads the Atom feed and `handle_notification`
+   enqueues each new video once (ids are deduplicated in `storage`) that passes the metadata
+   prefilter.
+4. `renew_due()` re-subscribes leases that are about to expire; `run_renewal_loop` calls it
+   periodically for the channels of this instance's monitor shards. Polling (`youtube_monitor`) stays on as a slow reconciliation fallback.
+"""
+import calendar
+import hashlib
+import hmac
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .config import (
+    WEBSUB_HUB_URL,
+    WEBSUB_CALLBACK_URL,
+    WEBSUB_SECRET,
+    WEBSUB_LEASE_SECONDS,
+    WEBSUB_MAX_AGE_HOURS,
+)
+from . import storage
+
+TOPIC_URL = "https://www.youtube.com/xml/feeds/videos.xml?channel_id={channel_id}"
+# renew leases this long before they expire
+RENEW_MARGIN_SECONDS = 24 * 3600
+RENEW_CHECK_SECONDS = 3600
+
+NS = {
+    "atom": "http://www.w3.org/2005/Atom",
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+}
+
+
+def topic_for(channel_id: str) -> str:
+    return TOPIC_URL.format(channel_id=channel_id)
+
+
+def channel_from_topic(topic: str) -> Optional[str]:
+    ids = parse_qs(urlparse(topic or "").query).get("channel_id")
+    return ids[0] if ids else None
+
+
+def subscribe(channel_id: str, mode: str = "subscribe") -> bool:
+    """Send a (un)subscribe request to the hub. Returns True if the hub accepted it."""
+    if not WEBSUB_CALLBACK_URL:
+        return False
+    import httpx
+
+    data = {
+        "hub.callback": WEBSUB_CALLBACK_URL,
+        "hub.topic": topic_for(channel_id),
+        "hub.mode": mode,
+        "hub.verify": "async",
+        "hub.lease_seconds": str(WEBSUB_LEASE_SECONDS),
+    }
+    if WEBSUB_SECRET:
+        data["hub.secret"] = WEBSUB_SECRET
+    # remember the request first: the hub may verify before it even answers us
+    if mode == "subscribe":
+        storage.set_websub_subscription(channel_id, state="pending", requested=time.time())
+    elif mode == "unsubscribe":
+        storage.set_websub_subscription(channel_id, state="unsubscribing", requested=time.time())
+    try:
+        r = httpx.post(WEBSUB_HUB_URL, data=data, timeout=30)
+    except Exception as e:
+        print("WebSub subscribe failed:", channel_id, e)
+        return False
+    return r.status_code in (202, 204)
+
+
+def ensure_subscribed(channel_ids: List[str]) -> int:
+    """Subscribe channels that have no lease yet. Returns the number of requests sent."""
+    if not WEBSUB_CALLBACK_URL:
+        return 0
+    subs = storage.get_websub_subscriptions()
+    sent = 0
+    for cid in channel_ids:
+        if cid not in subs:
+            subscribe(cid)
+            sent += 1
+    return sent
+
+
+def renew_due(now: float = None, owned: Callable[[str], bool] = None) -> List[str]:
+    """Re-subscribe leases expiring within RENEW_MARGIN_SECONDS (and stale pending requests),
+    only of the channels `owned` accepts (default all). Stale unsubscribes are sent again."""
+    now = now or time.time()
+    renewed = []
+    for cid, sub in storage.get_websub_subscriptions().items():
+        if owned is not None and not owned(cid):
+            continue
+        if sub.get("state") == "unsubscribing":
+            if now - sub.get("requested", 0) > RENEW_CHECK_SECONDS:
+                subscribe(cid, mode="unsubscribe")
+            continue
+        if sub.get("state") == "active":
+            due = sub.get("expires", 0) - now < RENEW_MARGIN_SECONDS
+        else:
+            # hub never verified: try again after an hour
+            due = now - sub.get("requested", 0) > RENEW_CHECK_SECONDS
+        if due and subscribe(cid):
+            renewed.append(cid)
+    return renewed
+
+
+def run_renewal_loop(stop_event):
+    # each instance renews the leases of its own monitor shards
+    from .youtube_monitor import owns_channel
+
+    while not stop_event.wait(RENEW_CHECK_SECONDS):
+        try:
+            renew_due(owned=owns_channel)
+        except Exception as e:
+            print("WebSub renewal error:", e)
+
+
+def verify_challenge(params: dict) -> Tuple[bool, str]:
+    """Handle the hub's verification GET. Returns (ok, challenge to echo)."""
+    mode = params.get("hub.mode")
+    channel_id = channel_from_topic(params.get("hub.topic"))
+    challenge = params.get("hub.challenge", "")
+    if mode == "denied" and channel_id:
+        # the hub refused the subscription; forget it so a later poll can retry
+        storage.remove_websub_subscription(channel_id)
+        return True, ""
+    if not channel_id or not challenge:
+        return False, ""
+    state = (storage.get_websub_subscriptions().get(channel_id) or {}).get("state")
+    if mode == "subscribe":
+        if state not in ("pending", "active"):
+            return False, ""
+        try:
+            lease = int(params.get("hub.lease_seconds") or WEBSUB_LEASE_SECONDS)
+        except ValueError:
+            lease = WEBSUB_LEASE_SECONDS
+        storage.set_websub_subscription(channel_id, state="active", expires=time.time() + lease)
+        return True, challenge
+    if mode == "unsubscribe":
+        # only confirm an unsubscribe we asked for: anyone can make the hub send one
+        if state != "unsubscribing":
+            return False, ""
+        storage.remove_websub_subscription(channel_id)
+        return True, challenge
+    return False, ""
+
+
+def verify_signature(body: bytes, header: Optional[str], secret: str = None) -> bool:
+    """Check `X-Hub-Signature: <algo>=<hexdigest>` (HMAC of the raw body with our secret)."""
+    secret = WEBSUB_SECRET if secret is None else secret
+    if not secret:
+        # no secret configured: nothing to verify against (dev only)
+        return True
+    if not header or "=" not in header:
+        return False
+    algo, _, digest = header.partition("=")
+    if algo not in ("sha1", "sha256", "sha384", "sha512"):
+        return False
+    expected = hmac.new(secret.encode("utf-8"), body, getattr(hashlib, algo)).hexdigest()
+    return hmac.compare_digest(expected, digest.strip().lower())
+
+
+def _parse_time(value: str) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        # e.g. 2024-05-01T10:00:03+00:00 / 2024-05-01T10:00:03.123456Z
+        base = value[:19]
+        return float(calendar.timegm(time.strptime(base, "%Y-%m-%dT%H:%M:%S")))
+    except ValueError:
+        return None
+
+
+def parse_notification(body: bytes) -> List[dict]:
+    """Parse an Atom notification into [{video_id, channel_id, title, published, updated}]."""
+    try:
+        root = ET.fromstring(body)
+    except ET.ParseError:
+        return []
+    out = []
+    for entry in root.findall("atom:entry", NS):
+        vid = entry.findtext("yt:videoId", default="", namespaces=NS)
+        if not vid:
+            continue
+        out.append({
+            "video_id": vid,
+            "channel_id": entry.findtext("yt:channelId", default="", namespaces=NS),
+            "title": entry.findtext("atom:title", default="", namespaces=NS),
+            "published": _parse_time(entry.findtext("atom:published", default="", namespaces=NS)),
+            "updated": _parse_time(entry.findtext("atom:updated", default="", namespaces=NS)),
+        })
+    return out
+
+
+def handle_notification(body: bytes) -> List[str]:
+    """Enqueue new uploads from a notification. Returns the enqueued video ids.
+
+    The hub also notifies on title/description edits of old videos, so entries published more
+    than WEBSUB_MAX_AGE_HOURS ago are ignored, and every id is enqueued at most once. New ids
+    then go through the metadata prefilter.
+    """
+    from . import prefilter, process
+
+    new = []
+    now = time.time()
+    for e in parse_notification(body):
+        if e["published"] and now - e["published"] > WEBSUB_MAX_AGE_HOURS * 3600:
+            continue
+        # dedupe through the seen set only: the poll's last-seen pointer stays where polling left
+        # it, so an upload whose notification got lost is still found by the next poll
+        if not storage.mark_video_seen(e["video_id"]):
+            continue
+        new.append(e["video_id"])
+    # drop live streams, premieres, Shorts etc. before anything is downloaded
+    enqueued, _ = prefilter.filter_videos(new)
+    for vid in enqueued:
+        process.submit_video(f"https://www.youtube.com/watch?v={vid}")
+    return enqueued
@@ -1,66 +1,251 @@
 """YouTube monitoring helpers (dev).
 
-This file contains a small polling / one-off checker that uses the OAuth credentials
-stored in `oauth.TOKENS` to list subscriptions and detect new uploads. On new upload
-it will call into the main processing pipeline.
+Polls the subscriptions of every authorized account (`accounts.py`) for new uploads. New
+uploads go through the metadata prefilter (`prefilter.py`) and are then queued for processing.
+
+One pass (`check_subscriptions_once`):
+1. Each account's subscription list (`subscriptions.list`, 50 per page) is re-read when its
+   cached copy is older than MONITOR_SUBS_REFRESH_SECONDS, on its own schedule. Accounts are
+   sharded like channels: only the instance owning an account's shard re-reads its list, the
+   others take the stored copy.
+2. Channels are deduplicated across accounts: a channel followed by five accounts is polled
+   once, paid for by whichever of those accounts has the most quota left today. Accounts that
+   are out of quota, or whose token can no longer be refreshed, are skipped.
+3. Channels are split into MONITOR_SHARDS shards by a stable hash of the channel id. This
+   instance polls the shards in MONITOR_SHARD_IDS (default all), MONITOR_WORKERS at a time, so
+   several deployments can share the channel set without polling anything twice.
+4. A channel is polled by reading its uploads playlist (`playlistItems.list`, 1 unit, instead
+   of `search`'s 100). Every upload newer than the last one seen is found, up to
+   MONITOR_UPLOADS_DEPTH, not only the latest.
+5. New uploads go through the prefilter. The last-seen pointer has already moved past them, so
+   uploads rejected for a reason that can change (live, upcoming, still processing) are kept
+   in a re-check list and offered to the prefilter again on every poll, for up to
+   MONITOR_RECHECK_HOURS, until they are accepted or rejected for good.
+
+With WebSub enabled (see `websub.py`) uploads are pushed to us within seconds; polling then
+only runs every MONITOR_POLL_SECONDS as a reconciliation fallback for missed notifications,
+and also makes sure every channel of this instance's shards has a WebSub lease.
 """
-import requests
-from .oauth import TOKENS
-from . import process
-from .storage import get_last_video_for_channel, set_last_video_for_channel
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from . import accounts, prefilter, process, websub
+from .config import (
+    MONITOR_POLL_SECONDS,
+    MONITOR_SHARDS,
+    MONITOR_SHARD_IDS,
+    MONITOR_WORKERS,
+    MONITOR_UPLOADS_DEPTH,
+    MONITOR_SUBS_REFRESH_SECONDS,
+    MONITOR_RECHECK_HOURS,
+    YOUTUBE_API_BASE,
+)
+from . import storage
+from .storage import get_last_video_for_channel, set_last_video_for_channel, mark_video_seen
+
+# Data API units per call
+QUOTA_UNITS = {"subscriptions": 1, "playlistItems": 1, "videos": 1, "channels": 1, "search": 100}
+
+
+def _get(endpoint: str, account_id: str, params: dict):
+    """GET a Data API endpoint with `account_id`'s token, charging its quota.
+    A 401 (token revoked or expired early) is retried once with a refreshed token."""
+    import requests
+
+    url = f"{YOUTUBE_API_BASE}/{endpoint}"
+    accounts.charge(account_id, QUOTA_UNITS.get(endpoint, 1))
+    r = requests.get(url, headers=accounts.headers(account_id), params=params, timeout=30)
+    if r.status_code == 401:
+        accounts.charge(account_id, QUOTA_UNITS.get(endpoint, 1))
+        r = requests.get(url, headers=accounts.headers(account_id, force_refresh=True), params=params, timeout=30)
+    return r
+
+
+def refresh_subscriptions(account_id: str) -> List[str]:
+    """Re-read every channel `account_id` is subscribed to (all pages) and cache the list."""
+    channels, page = [], None
+    while True:
+        params = {"part": "snippet", "mine": "true", "maxResults": 50}
+        if page:
+            params["pageToken"] = page
+        r = _get("subscriptions", account_id, params)
+        if r.status_code != 200:
+            raise RuntimeError(f"subscriptions.list failed for {account_id}: {r.status_code} {r.text[:200]}")
+        data = r.json()
+        channels += [s["snippet"]["resourceId"]["channelId"] for s in data.get("items", [])]
+        page = data.get("nextPageToken")
+        if not page:
+            break
+    accounts.set_subscriptions(account_id, channels)
+    return channels
+
+
+def channel_owners(force: bool = False) -> Dict[str, List[str]]:
+    """Channel id -> accounts subscribed to it, re-reading the subscription lists that are due
+    of accounts in this instance's shards. An account whose list can't be read keeps its cached
+    one; lists of other shards' accounts are the ones their instances stored."""
+    owners = {}
+    for account_id in accounts.account_ids():
+        if force or accounts.subscriptions_due(account_id, MONITOR_SUBS_REFRESH_SECONDS):
+            # another instance owns this account's refresh; its list reaches us through storage
+            if owns_channel(account_id) and accounts.pick([account_id]):
+                try:
+                    refresh_subscriptions(account_id)
+                except Exception as e:
+                    print("Subscription refresh failed:", e)
+        for channel_id in accounts.subscriptions(account_id):
+            owners.setdefault(channel_id, []).append(account_id)
+    return owners
+
+
+def shard_of(channel_id: str, shards: int = None) -> int:
+    """Stable shard of a channel (the same on every instance and across restarts)."""
+    return zlib.crc32(channel_id.encode()) % max(1, shards or MONITOR_SHARDS)
+
+
+def my_shards() -> List[int]:
+    return [s for s in (MONITOR_SHARD_IDS or range(MONITOR_SHARDS)) if 0 <= s < MONITOR_SHARDS] or [0]
+
 
-YOUTUBE_API_BASE = "https://www.googleapis.com/youtube/v3"
+def owns_channel(channel_id: str) -> bool:
+    """True if `channel_id` (or account id) falls in one of this instance's shards."""
+    return shard_of(channel_id) in my_shards()
 
 
-def _auth_headers():
-    token = TOKENS.get("access_token")
-    if not token:
-        return None
-    return {"Authorization": f"Bearer {token}"}
+def uploads_playlist(channel_id: str) -> str:
+    # a channel's uploads playlist id is its channel id with UC -> UU
+    return "UU" + channel_id[2:] if channel_id.startswith("UC") else channel_id
+
+
+def new_uploads(channel_id: str, account_id: str) -> List[str]:
+    """Uploads of `channel_id` newer than the last one seen (oldest first), not yet enqueued.
+    The first poll of a channel only reports its latest upload."""
+    r = _get("playlistItems", account_id, {
+        "part": "contentDetails", "playlistId": uploads_playlist(channel_id), "maxResults": MONITOR_UPLOADS_DEPTH,
+    })
+    if r.status_code != 200:
+        raise RuntimeError(f"playlistItems.list failed for {channel_id}: {r.status_code}")
+    ids = [it["contentDetails"]["videoId"] for it in r.json().get("items", [])]
+    last_seen = get_last_video_for_channel(channel_id)
+    if not ids:
+        if last_seen is None:
+            # polled before its first upload: that one will be new
+            set_last_video_for_channel(channel_id, "")
+        return []
+    new = []
+    for video_id in ids:
+        if video_id == last_seen:
+            break
+        new.append(video_id)
+    if last_seen is None:
+        new = new[:1]
+    if ids[0] != last_seen:
+        # mark immediately to avoid duplicate processing
+        set_last_video_for_channel(channel_id, ids[0])
+    # mark_video_seen: skip uploads already enqueued by a WebSub notification
+    return [v for v in reversed(new) if mark_video_seen(v)]
+
+
+def _rechecks(found: List[dict], shards) -> List[dict]:
+    """Re-check entries of this instance's shards not found again by this poll. Expired entries
+    are dropped, and so are ids enqueued meanwhile (by a WebSub notification)."""
+    now = time.time()
+    ids = {f["video_id"] for f in found}
+    out = []
+    for video_id, r in storage.get_rechecks().items():
+        if video_id in ids or shard_of(r.get("channel_id") or "") not in shards:
+            continue
+        if now - r.get("since", now) > MONITOR_RECHECK_HOURS * 3600 or not mark_video_seen(video_id):
+            storage.remove_recheck(video_id)
+            continue
+        out.append({"channel_id": r.get("channel_id"), "video_id": video_id, "since": r.get("since", now)})
+    return out
+
+
+def poll_shard(channels: List[str], owners: Dict[str, List[str]]) -> dict:
+    """Poll `channels` one after another, each paid for by the owner with the most quota left."""
+    out = {"polled": 0, "skipped_quota": 0, "errors": 0, "found": []}
+    for channel_id in channels:
+        account_id = accounts.pick(owners[channel_id], QUOTA_UNITS["playlistItems"])
+        if account_id is None:
+            out["skipped_quota"] += 1
+            continue
+        try:
+            videos = new_uploads(channel_id, account_id)
+        except Exception as e:
+            print("Channel poll failed:", e)
+            out["errors"] += 1
+            continue
+        out["polled"] += 1
+        out["found"] += [{"channel_id": channel_id, "video_id": v, "account": account_id} for v in videos]
+    return out
 
 
 def check_subscriptions_once():
-    """One-off check: list the authenticated user's subscriptions and look for new uploads.
-    This is meant for dev/testing; production should be event-driven or scheduled.
-    """
-    headers = _auth_headers()
-    if not headers:
+    """One pass over the channels of every authorized account (see the module docstring)."""
+    if not accounts.account_ids():
         # not authorized
         return {"error": "not_authorized"}
 
-    # 1) Get subscriptions (paginated, simple dev version 50 max)
-    subs_url = f"{YOUTUBE_API_BASE}/subscriptions?part=snippet&mine=true&maxResults=50"
-    r = requests.get(subs_url, headers=headers)
-    if r.status_code != 200:
-        return {"error": "api_error", "details": r.text}
+    try:
+        owners = channel_owners()
+        mine = set(my_shards())
+        websub.ensure_subscribed([c for c in owners if shard_of(c) in mine])
+        shards = {}
+        for channel_id in sorted(owners):
+            shard = shard_of(channel_id)
+            if shard in mine:
+                shards.setdefault(shard, []).append(channel_id)
+        with ThreadPoolExecutor(max_workers=max(1, min(MONITOR_WORKERS, len(shards))), thread_name_prefix="monitor") as pool:
+            results = list(pool.map(lambda chs: poll_shard(chs, owners), shards.values()))
 
-    subs = r.json().get("items", [])
-    found = []
-    for s in subs:
-        channel_id = s["snippet"]["resourceId"]["channelId"]
+        found = [f for r in results for f in r["found"]]
+        rechecks = _rechecks(found, mine)
+        # metadata prefilter (one videos.list call per 50 ids) before anything is downloaded
+        accepted, rejected = prefilter.filter_videos([f["video_id"] for f in found + rechecks])
+    finally:
+        accounts.flush()
+    now = time.time()
+    for f in found + rechecks:
+        reason = (rejected.get(f["video_id"]) or {}).get("reason")
+        if reason in prefilter.RETRYABLE:
+            storage.set_recheck(f["video_id"], channel_id=f["channel_id"], reason=reason, since=f.get("since", now))
+        else:
+            storage.remove_recheck(f["video_id"])
+    for video_id in accepted:
+        # trigger processing: queue on the scheduler so several uploads overlap
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        try:
+            process.submit_video(video_url)
+        except Exception as e:
+            # in production use logging
+            print("Error processing video:", e)
 
-        # 2) Fetch latest video for channel (search endpoint)
-        search_url = f"{YOUTUBE_API_BASE}/search?part=snippet&channelId={channel_id}&order=date&type=video&maxResults=1"
-        rs = requests.get(search_url, headers=headers)
-        if rs.status_code != 200:
-            continue
-        items = rs.json().get("items", [])
-        if not items:
+    return {
+        "accounts": len(accounts.account_ids()),
+        "subscriptions": sum(len(v) for v in owners.values()),
+        "channels": len(owners),
+        "shards": sorted(shards),
+        "checked": sum(r["polled"] for r in results),
+        "skipped_quota": sum(r["skipped_quota"] for r in results),
+        "errors": sum(r["errors"] for r in results),
+        "new": len(found),
+        "found": found,
+        "rechecked": len(rechecks),
+        "rejected": rejected,
+    }
+
+
+def run_reconciliation_loop(stop_event):
+    """Poll every MONITOR_POLL_SECONDS (when any account is authorized) to catch anything WebSub missed."""
+    if not MONITOR_POLL_SECONDS:
+        return
+    while not stop_event.wait(MONITOR_POLL_SECONDS):
+        if not accounts.account_ids():
             continue
-        latest = items[0]
-        video_id = latest["id"]["videoId"]
-        last_seen = get_last_video_for_channel(channel_id)
-        if last_seen != video_id:
-            # new video found
-            found.append({"channel_id": channel_id, "video_id": video_id})
-            # mark immediately to avoid duplicate processing
-            set_last_video_for_channel(channel_id, video_id)
-            # trigger processing (simple, synchronous call may be replaced by background task)
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            try:
-                process.handle_new_video(video_url)
-            except Exception as e:
-                # in production use logging
-                print("Error processing video:", e)
-
-    return {"checked": len(subs), "new": len(found), "found": found}
+        try:
+            check_subscriptions_once()
+        except Exception as e:
+            print("Reconciliation poll failed:", e)
@@ -0,0 +1,55 @@
+"""Batch / backfill CLI: run the pipeline over many videos with a resumable manifest.
+
+Usage:
+    python scripts/batch_process.py --urls urls.txt [--parallel 4]
+    python scripts/batch_process.py --channel UCxxxx [--limit 300] [--manifest outputs/backfill.json]
+
+Re-running with the same manifest skips videos that are already done; failures are recorded
+per stage in the manifest (and retried unless --no-retry-failed).
+"""
+import argparse
+import sys
+from app.batch import DEFAULT_MANIFEST, list_channel_videos, read_url_file, run_batch
+from app.config import SHORT_MAX_SECONDS
+
+
+def _print_progress(p):
+    print(
+        f"[{p['finished']}/{p['total']}] {p['video_id']}: {p['status']} | "
+        f"done={p['done']} dup={p['duplicate']} failed={p['failed']} | "
+        f"{p['per_minute']:.2f} videos/min, ETA {p['eta_seconds'] / 60:.1f} min",
+        flush=True,
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--urls", help="file with one YouTube URL per line")
+    src.add_argument("--channel", help="channel id to backfill (all uploads)")
+    ap.add_argument("--limit", type=int, default=None, help="only the newest N uploads of --channel")
+    ap.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    ap.add_argument("--parallel", type=int, default=2, help="jobs in flight at once")
+    ap.add_argument("--max-duration", type=int, default=SHORT_MAX_SECONDS)
+    ap.add_argument("--no-retry-failed", action="store_true")
+    args = ap.parse_args()
+
+    urls = read_url_file(args.urls) if args.urls else list_channel_videos(args.channel, limit=args.limit)
+    if not urls:
+        print("No videos to process")
+        return 1
+    print(f"{len(urls)} videos, manifest {args.manifest}")
+    summary = run_batch(
+        urls,
+        manifest_path=args.manifest,
+        parallelism=args.parallel,
+        max_duration=args.max_duration,
+        retry_failed=not args.no_retry_failed,
+        on_progress=_print_progress,
+    )
+    print("Summary:", summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
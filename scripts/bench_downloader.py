@@ -0,0 +1,102 @@
+"""Benchmark downloads: yt-dlp subprocess per download vs the in-process downloader.
+
+Runs the same download jobs through the download stage (`formats.download`) twice:
+
+- `subprocess`: a `yt-dlp -J` process for the format list, then a second process for the
+  download, which is how every download used to run;
+- `inprocess`: `app/downloader.py`, with long-lived YoutubeDL instances, the info cache and
+  concurrent fragments.
+
+For each mode it prints the per-download latency (p50/p95) and the throughput. Each URL is
+used `--repeat` times, so later jobs for the same video show what the info cache saves.
+Without URLs a local web server serves a generated file, which isolates the per-download
+overhead: process start-up, extractor import, extraction and connection setup.
+
+Usage:
+    python scripts/bench_downloader.py [url ...] [--jobs 16] [--concurrency 4] [--repeat 2]
+"""
+import argparse
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from app import downloader, formats
+from app.loadtest import percentiles
+
+
+def _serve(directory: str, size_mb: float) -> str:
+    with open(os.path.join(directory, "clip.mp4"), "wb") as f:
+        f.write(os.urandom(int(size_mb * 1e6)))
+
+    class Quiet(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            # yt-dlp drops connections it no longer needs
+            pass
+
+    server = Server(("127.0.0.1", 0), functools.partial(Quiet, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"
+
+
+def _run(mode: str, urls, root: str, concurrency: int) -> dict:
+    downloader.DOWNLOADER = mode
+    downloader.CACHE_DIR = os.path.join(root, f"info_cache_{mode}")
+    downloader._memory.clear()
+    downloader._url_ids.clear()
+
+    def job(i_url):
+        i, url = i_url
+        work = os.path.join(root, mode, str(i))
+        os.makedirs(work)
+        t0 = time.perf_counter()
+        formats.download(url, os.path.join(work, "input.%(ext)s"))
+        elapsed = time.perf_counter() - t0
+        if not [f for f in os.listdir(work) if f.startswith("input.") and not f.endswith(".json")]:
+            raise RuntimeError(f"{mode}: download of {url} produced no file")
+        return elapsed
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(job, enumerate(urls)))
+    wall = time.perf_counter() - t0
+    return {"latency": percentiles(latencies, (50, 95)), "wall": wall, "per_minute": len(urls) / wall * 60}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("urls", nargs="*", help="videos to download (default: a local test file)")
+    ap.add_argument("--jobs", type=int, default=16, help="downloads per mode")
+    ap.add_argument("--concurrency", type=int, default=4, help="parallel downloads (like the IO pool)")
+    ap.add_argument("--repeat", type=int, default=2, help="jobs per URL before moving to the next")
+    ap.add_argument("--size-mb", type=float, default=5.0, help="size of the local test file")
+    args = ap.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_downloader_")
+    try:
+        urls = args.urls or [_serve(root, args.size_mb)]
+        order = [urls[(i // max(1, args.repeat)) % len(urls)] for i in range(args.jobs)]
+        rows = {mode: _run(mode, order, root, args.concurrency) for mode in ("subprocess", "inprocess")}
+    finally:
+        downloader.close()
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{args.jobs} downloads, {args.concurrency} at a time, {len(urls)} url(s) x{args.repeat}")
+    print(f"{'mode':<11} {'p50 s':>8} {'p95 s':>8} {'wall s':>8} {'per min':>9}")
+    for mode, r in rows.items():
+        print(f"{mode:<11} {r['latency']['p50']:>8.3f} {r['latency']['p95']:>8.3f} {r['wall']:>8.2f} {r['per_minute']:>9.1f}")
+    sub, inp = rows["subprocess"], rows["inprocess"]
+    print(f"inprocess vs subprocess: {sub['latency']['p50'] - inp['latency']['p50']:+.3f}s saved per download (p50), "
+          f"{inp['per_minute'] / sub['per_minute']:.1f}x throughput")
+
+
+if __name__ == "__main__":
+    main()
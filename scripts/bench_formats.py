@@ -0,0 +1,80 @@
+"""Benchmark download format selection: bytes downloaded and decode time.
+
+Downloads the same video with the legacy `-f best` and with the target-aware selection
+(`app/formats.py`), then decodes each file to the render profile with ffmpeg (scale into the
+short's frame, output discarded) and prints bytes, download time and decode time.
+
+Usage:
+    python scripts/bench_formats.py <youtube_url> [--seconds 120] [--keep]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from app import formats
+from app.config import RENDER_WIDTH, RENDER_HEIGHT
+
+
+def _download(cmd, work):
+    t0 = time.perf_counter()
+    subprocess.run(cmd, check=False)
+    elapsed = time.perf_counter() - t0
+    files = [os.path.join(work, f) for f in os.listdir(work) if f.startswith("input.") and not f.endswith(".json")]
+    if not files:
+        raise RuntimeError(f"download failed: {' '.join(cmd)}")
+    return files[0], elapsed
+
+
+def _decode(path, seconds):
+    vf = f"scale={RENDER_WIDTH}:{RENDER_HEIGHT}:force_original_aspect_ratio=decrease"
+    cmd = ["ffmpeg", "-v", "error", "-t", str(seconds), "-i", path, "-vf", vf, "-f", "null", "-"]
+    t0 = time.perf_counter()
+    subprocess.run(cmd, check=False)
+    return time.perf_counter() - t0
+
+
+def _describe(path):
+    from app.probe import probe
+
+    info = probe(path)
+    return f"{info.width}x{info.height}@{info.fps or 0:.0f} {info.video_codec}/{info.audio_codec}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("url")
+    ap.add_argument("--seconds", type=float, default=120, help="seconds of video to decode")
+    ap.add_argument("--keep", action="store_true", help="keep the downloaded files")
+    args = ap.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_formats_")
+    rows = []
+    try:
+        for name in ("best", "auto"):
+            work = os.path.join(root, name)
+            os.makedirs(work)
+            template = os.path.join(work, "input.%(ext)s")
+            if name == "best":
+                cmd = ["yt-dlp", "-f", "best", "-o", template, args.url]
+            else:
+                cmd = formats.download_command(args.url, template)
+            path, dl_time = _download(cmd, work)
+            rows.append((name, os.path.getsize(path), dl_time, _decode(path, args.seconds), _describe(path)))
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+        else:
+            print("files kept in", root)
+
+    print(f"{'format':<6} {'MB':>9} {'download s':>11} {'decode s':>9}  stream")
+    for name, size, dl, dec, desc in rows:
+        print(f"{name:<6} {size / 1e6:>9.1f} {dl:>11.1f} {dec:>9.2f}  {desc}")
+    if len(rows) == 2 and rows[1][1]:
+        best, auto = rows
+        print(f"auto vs best: {best[1] / auto[1]:.1f}x fewer bytes, {best[3] / max(auto[3], 1e-6):.1f}x faster decode")
+
+
+if __name__ == "__main__":
+    main()
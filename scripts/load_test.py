@@ -0,0 +1,101 @@
+"""Load test: bursts of simulated uploads against local stand-ins for every external service.
+
+Starts stand-ins for the YouTube Data API, OpenAI, Telegram and yt-dlp (see app/loadtest.py),
+runs the app in this process pointed at them (with its own OUTPUT_DIR), publishes bursts of
+uploads and drives them through /monitor/run_once or /simulate_video. Prints and saves a
+report with detection-to-notification latency percentiles, throughput, queue depth over time
+and resource use. Real ffmpeg encodes run, so CPU numbers are representative.
+
+Usage:
+    python scripts/load_test.py --channels 50 --bursts 3 --burst-size 20 --interval 60
+    python scripts/load_test.py --channels 500 --accounts 20 --burst-size 50
+    python scripts/load_test.py --mode simulate --latency openai=1.5,yt-dlp=3 --errors openai=0.05
+    python scripts/load_test.py ... --compare outputs/loadtest/previous.json
+
+With --app-url the stand-ins are started but the app is not: start it yourself with the
+printed environment (then /monitor/run_once needs an authorized account, and resource use is
+only sampled with --app-pid).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from app.loadtest import StandIns, compare, parse_profiles, run_load, serve_in_process
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--mode", choices=("monitor", "simulate"), default="monitor")
+    ap.add_argument("--channels", type=int, default=50, help="subscribed channels on the stand-in Data API")
+    ap.add_argument("--accounts", type=int, default=1, help="authorized accounts, following overlapping shares of the channels")
+    ap.add_argument("--bursts", type=int, default=3)
+    ap.add_argument("--burst-size", type=int, default=20, help="uploads per burst")
+    ap.add_argument("--interval", type=float, default=60.0, help="seconds between bursts")
+    ap.add_argument("--media-seconds", type=float, default=60.0, help="length of every stand-in video")
+    ap.add_argument("--latency", default="youtube=0.2,openai=1.0,telegram=0.3,yt-dlp=2.0",
+                    help="mean latency per stand-in, service=seconds,...")
+    ap.add_argument("--errors", default="", help="error rate per stand-in, service=fraction,...")
+    ap.add_argument("--jitter", type=float, default=0.5, help="latency jitter as a fraction of the mean")
+    ap.add_argument("--flag-rate", type=float, default=0.02, help="share of segments the moderation stand-in flags")
+    ap.add_argument("--poll-every", type=float, default=15.0, help="seconds between /monitor/run_once while uploads are unseen")
+    ap.add_argument("--timeout", type=float, default=1800.0)
+    ap.add_argument("--work-dir", default=os.path.join("outputs", "loadtest", time.strftime("%Y%m%d-%H%M%S")))
+    ap.add_argument("--app-url", help="drive an already running app instead of starting one")
+    ap.add_argument("--app-pid", type=int, help="pid of that app, for resource sampling")
+    ap.add_argument("--compare", metavar="REPORT", help="previous report to compare against")
+    args = ap.parse_args()
+
+    work_dir = os.path.abspath(args.work_dir)
+    os.makedirs(work_dir, exist_ok=True)
+    standins = StandIns(
+        channels=args.channels,
+        profiles=parse_profiles(args.latency, args.errors, args.jitter),
+        media_seconds=args.media_seconds,
+        work_dir=work_dir,
+        flag_rate=args.flag_rate,
+        accounts=args.accounts,
+    ).start()
+    standins.prepare()
+    env = standins.env()
+
+    if args.app_url:
+        print("Start the app with:")
+        for k, v in env.items():
+            print(f"  export {k}={v}")
+        input("Press Enter when the app is running... ")
+        app_url, pid = args.app_url, args.app_pid
+    else:
+        env.update(OUTPUT_DIR=os.path.join(work_dir, "outputs"), MONITOR_POLL_SECONDS="0", WEBSUB_CALLBACK_URL="")
+        app_url, pid = serve_in_process(env, accounts=args.accounts), os.getpid()
+    print(f"stand-ins at {standins.url}, app at {app_url}")
+
+    def progress(p):
+        print(f"\r[{p['elapsed']:6.0f}s] bursts={p['bursts']} videos={p['expected']} pending={p['pending']} "
+              f"undetected={p['undetected']} missed={p['missed']}   ", end="", flush=True)
+
+    report = run_load(
+        app_url, standins, bursts=args.bursts, burst_size=args.burst_size, interval=args.interval, mode=args.mode,
+        timeout=args.timeout, poll_every=args.poll_every, pid=pid, on_progress=progress,
+    )
+    print()
+    out = os.path.join(work_dir, "report.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps({k: report[k] for k in ("status", "notified", "latency_seconds", "throughput_per_minute")}, indent=2))
+    print("max queue depth:", report["queue_depth"]["max"], "| resources:",
+          {k: v for k, v in report["resources"].items() if k != "timeline"})
+    print("stand-ins:", {k: v for k, v in report["stand_ins"].items() if k != "profiles"})
+    print("report:", out)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            before = json.load(f)
+        print(f"\ncompared with {args.compare}:")
+        print("\n".join(compare(before, report)))
+    standins.stop()
+    return 0 if report["status"]["failed"] == 0 and not report["config"]["timed_out"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
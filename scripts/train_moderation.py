@@ -0,0 +1,36 @@
+"""Retrain the local moderation classifier and print its evaluation report.
+
+Trains on `sara_keywords.txt` plus the moderation API verdicts collected in
+`outputs/moderation_verdicts.jsonl`, cross-validates on the verdicts, then saves the model
+(`outputs/moderation_model.json`, picked up by running workers on their next segment) and the
+report (`outputs/moderation_eval.json`).
+
+Usage:
+    python scripts/train_moderation.py [--folds 5] [--dry-run] [--explain "teks segmen"]
+"""
+import argparse
+import json
+from app import moderation_model
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Retrain the local moderation classifier")
+    ap.add_argument("--folds", type=int, default=5, help="cross-validation folds for the report")
+    ap.add_argument("--dry-run", action="store_true", help="evaluate only, don't overwrite the model")
+    ap.add_argument("--explain", metavar="TEXT", help="classify TEXT with the new model and show the deciding n-grams")
+    args = ap.parse_args()
+
+    report = moderation_model.retrain(folds=args.folds, save=not args.dry_run)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if not report["usable"]:
+        print(f"not enough examples per class yet (need {report['min_examples']}): all segments still go to the API")
+    if args.explain:
+        model = moderation_model.train(moderation_model.training_examples())
+        label, p = moderation_model.classify(model, args.explain)
+        print(f"{label} (P(unsafe)={p:.3f})")
+        for gram, weight in moderation_model.explain(model, args.explain):
+            print(f"  {gram!r}: {weight:+.2f}")
+
+
+if __name__ == "__main__":
+    main()
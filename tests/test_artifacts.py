@@ -0,0 +1,42 @@
+import os
+import time
+
+from app import artifacts
+
+
+def _write(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_finalize_and_quota_eviction(tmp_path, monkeypatch):
+    jobs = tmp_path / "jobs"
+    monkeypatch.setattr(artifacts, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(artifacts, "JOBS_DIR", str(jobs))
+
+    dirs = []
+    for name in ("old", "new"):
+        d = jobs / name
+        d.mkdir(parents=True)
+        _write(d / "input.mp4", 4000)
+        _write(d / "short.mp4", 2000)
+        _write(d / "short_censored.ov0.mp4", 500)
+        final = _write(d / "short_with_sounds.mp4", 3000)
+        srt = _write(d / "subtitles.srt", 100)
+        assert artifacts.finalize_job(str(d), [str(final), str(srt)]) == 6500
+        assert sorted(os.listdir(d)) == ["artifacts.json", "short_with_sounds.mp4", "subtitles.srt"]
+        dirs.append(d)
+        time.sleep(0.01)
+
+    report = {j["job"]: j for j in artifacts.usage()["jobs"]}
+    assert report["old"]["deliverable_bytes"] == 3100 and report["old"]["intermediate_bytes"] == 0
+
+    # quota fits one job: the least recently used one is evicted, running jobs are kept
+    monkeypatch.setattr(artifacts, "OUTPUT_QUOTA_MB", 0.005)
+    artifacts.start_job(str(dirs[0]))
+    assert artifacts.enforce_quota() == ["new"]
+    artifacts.end_job(str(dirs[0]))
+    assert artifacts.enforce_quota() == []  # already under quota
+    assert not (dirs[1] / "short_with_sounds.mp4").exists()
+    assert (dirs[0] / "short_with_sounds.mp4").exists()
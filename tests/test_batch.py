@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+
+from app import batch, process
+
+
+def test_manifest_resume_and_stage_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(process, "job_dir_for", lambda url: str(tmp_path / "jobs" / process.video_id_from_url(url)))
+    calls = []
+
+    def fake_handle(url, max_duration=None, out_dir=None):
+        calls.append(url)
+        assert not os.path.exists(os.path.join(out_dir, "download_error.txt"))
+        os.makedirs(out_dir, exist_ok=True)
+        if url.endswith("bad001") and len(calls) <= 3:
+            with open(os.path.join(out_dir, "input.mp4.part"), "w") as f:
+                f.write("partial")
+            with open(os.path.join(out_dir, "download_error.txt"), "w") as f:
+                f.write("connection reset")
+            raise RuntimeError("download failed or no file found")
+        if url.endswith("warn01"):
+            with open(os.path.join(out_dir, "censor_error.txt"), "w") as f:
+                f.write("ffmpeg exploded")
+        return {"short": os.path.join(out_dir, "short.mp4")}
+
+    monkeypatch.setattr(process, "handle_new_video", fake_handle)
+    urls = [f"https://www.youtube.com/watch?v={v}" for v in ("good01", "warn01", "bad001")]
+    # processed by the live service before the backfill: not run again, nothing deleted
+    live = tmp_path / "jobs" / "live01"
+    live.mkdir(parents=True)
+    (live / "processed.txt").write_text("done")
+    (live / "short_final.mp4").write_bytes(b"deliverable")
+    urls.append("https://www.youtube.com/watch?v=live01")
+    manifest = str(tmp_path / "manifest.json")
+
+    summary = batch.run_batch(urls, manifest_path=manifest, parallelism=2)
+    assert (summary["done"], summary["failed"]) == (3, 1)
+    assert urls[3] not in calls and (live / "short_final.mp4").exists()
+    items = json.load(open(manifest))["items"]
+    assert items["warn01"]["errors"] == {"censor": "ffmpeg exploded"}
+    assert items["bad001"]["status"] == "failed" and "download failed" in items["bad001"]["errors"]["pipeline"]
+    assert items["bad001"]["errors"]["download"] == "connection reset"
+
+    # restart: only the failed item runs again, in a clean job dir
+    summary = batch.run_batch(urls, manifest_path=manifest, parallelism=2)
+    assert calls[3:] == [urls[2]] and summary["skipped"] == 3 and summary["done"] == 1
+    item = json.load(open(manifest))["items"]["bad001"]
+    assert item["attempts"] == 2 and item["errors"] == {}
+    assert os.listdir(tmp_path / "jobs" / "bad001") == []
+
+
+def test_jobs_running_in_the_service_are_skipped(tmp_path, monkeypatch):
+    from app import artifacts
+
+    monkeypatch.setattr(process, "job_dir_for", lambda url: str(tmp_path / "jobs" / process.video_id_from_url(url)))
+    monkeypatch.setattr(process, "handle_new_video", lambda *a, **k: pytest.fail("ran a job the service is running"))
+    url = "https://www.youtube.com/watch?v=busy01"
+    job_dir = process.job_dir_for(url)
+    os.makedirs(job_dir)
+    open(os.path.join(job_dir, "input.mp4"), "wb").close()
+    artifacts.start_job(job_dir)
+    try:
+        summary = batch.run_batch([url], manifest_path=str(tmp_path / "manifest.json"))
+    finally:
+        artifacts.end_job(job_dir)
+    assert summary["skipped"] == 1 and os.path.exists(os.path.join(job_dir, "input.mp4"))
+    assert json.load(open(tmp_path / "manifest.json"))["items"]["busy01"]["status"] == "skipped"
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import threading
+import time
+
+from app import chunked, probe, scheduler
+
+
+def test_plan_chunks_snaps_to_keyframes():
+    kfs = [i * 2.0 for i in range(50)]  # keyframe every 2s, 100s total
+    chunks = chunked.plan_chunks(kfs, 0.0, 100.0, chunk_seconds=25)
+    assert chunks[0][0] == 0.0 and chunks[-1][1] == 100.0
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert all(s in kfs for s, _ in chunks)
+    # without keyframes the plain targets are used
+    assert chunked.plan_chunks([], 0.0, 60.0, chunk_seconds=20) == [(0.0, 20.0), (20.0, 40.0), (40.0, 60.0)]
+
+
+def test_render_encodes_chunks_in_parallel_and_concats(tmp_path, monkeypatch):
+    src = tmp_path / "short.mp4"
+    src.write_bytes(b"x")
+    info = probe.MediaInfo(path=str(src), duration=90.0, keyframes=[float(i) for i in range(0, 90, 3)])
+    monkeypatch.setattr(probe, "probe", lambda path, until=None, loudness=False: info)
+    monkeypatch.setattr(chunked, "RENDER_CHUNKED", "1")
+    monkeypatch.setattr(chunked, "RENDER_CHUNK_WORKERS", 4)
+    monkeypatch.setattr(chunked, "_pool", None)
+
+    cmds, threads = [], set()
+
+    def fake_run(cmd, **kwargs):
+        cmds.append(cmd)
+        threads.add(threading.current_thread().name)
+        if "-copyts" in cmd:
+            # long enough for the helpers to pick up chunks too
+            time.sleep(0.05)
+        open(cmd[-1], "wb").close()
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr("subprocess.run", fake_run)
+    out = str(tmp_path / "short_censored.mp4")
+    chunked.render(str(src), out, vf="boxblur=10:1:enable='between(t,40,42)'")
+
+    parts = [c for c in cmds if "-copyts" in c]
+    assert len(parts) == 4
+    assert all(c[c.index("-vf") + 1].endswith(",setpts=PTS-STARTPTS") and "-an" in c for c in parts)
+    assert any(t.startswith("chunk-pool") for t in threads)
+    concat = cmds[-1]
+    assert concat[concat.index("-f") + 1] == "concat" and concat[-1] == out
+    assert concat[concat.index("-c:v") + 1] == "copy"
+    assert os.path.exists(out) and not os.path.exists(out + ".chunks")
+
+
+def test_chunks_only_use_free_cpu_slots(tmp_path, monkeypatch):
+    src = tmp_path / "short.mp4"
+    src.write_bytes(b"x")
+    info = probe.MediaInfo(path=str(src), duration=120.0, keyframes=[float(i) for i in range(0, 120, 2)])
+    monkeypatch.setattr(probe, "probe", lambda path, until=None, loudness=False: info)
+    monkeypatch.setattr(chunked, "RENDER_CHUNKED", "1")
+    monkeypatch.setattr(chunked, "RENDER_CHUNK_WORKERS", 8)
+    monkeypatch.setattr(chunked, "_pool", None)
+    scheduler.shutdown()
+    monkeypatch.setattr(scheduler, "SCHED_CPU_WORKERS", 2)
+
+    lock = threading.Lock()
+    encodes = {"now": 0, "max": 0}
+
+    def fake_run(cmd, **kwargs):
+        with lock:
+            encodes["now"] += 1
+            encodes["max"] = max(encodes["max"], encodes["now"])
+        time.sleep(0.02)
+        open(cmd[-1], "wb").close()
+        with lock:
+            encodes["now"] -= 1
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr("subprocess.run", fake_run)
+    release = threading.Event()
+    try:
+        # another CPU stage holds one of the two slots: the render gets its own and nothing more
+        busy = scheduler.submit_stage(scheduler.CPU, release.wait, 5)
+        out = str(tmp_path / "short_subtitled.mp4")
+        scheduler.run_stage(scheduler.CPU, chunked.render, str(src), out, vf="null")
+        assert encodes["max"] == 1
+        release.set()
+        busy.result(timeout=5)
+        # with the slot free again one helper joins in
+        scheduler.run_stage(scheduler.CPU, chunked.render, str(src), out, vf="null")
+        assert encodes["max"] == 2
+    finally:
+        release.set()
+        scheduler.shutdown()
@@ -0,0 +1,122 @@
+import functools
+import json
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import downloader, formats, progress
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    """A local web server with one direct media file; counts requests."""
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "clip.mp4").write_bytes(b"\0" * 200000)
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def send_head(self):
+            requests.append((self.command, self.path))
+            return super().send_head()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(served)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(downloader, "CACHE_DIR", str(tmp_path / "info_cache"))
+    monkeypatch.setattr(downloader, "_memory", type(downloader._memory)())
+    monkeypatch.setattr(downloader, "_url_ids", type(downloader._url_ids)())
+    yield f"http://127.0.0.1:{server.server_address[1]}/clip.mp4", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_info_is_extracted_once_and_download_reuses_it(media, tmp_path):
+    url, requests = media
+    info, from_cache = downloader.extract_info(url)
+    extraction = len(requests)
+    assert info["id"] == "clip" and not from_cache and extraction >= 1
+    assert downloader.extract_info(url) == (info, True) and len(requests) == extraction
+    assert json.loads((tmp_path / "info_cache" / "clip.json").read_text())["info"]["id"] == "clip"
+
+    events = []
+    path = downloader.download(url, str(tmp_path / "out" / "input.%(ext)s"), progress=events.append)
+    assert path.endswith("input.mp4") and (tmp_path / "out" / "input.mp4").stat().st_size == 200000
+    # only the media itself was fetched: no second extraction
+    assert requests[extraction:] == [("GET", "/clip.mp4")]
+    assert events[-1]["status"] == "finished"
+
+
+def test_expired_entries_are_dropped(media, tmp_path):
+    url, _ = media
+    info, _ = downloader.extract_info(url)
+    assert downloader.cached_info("clip") == info
+    downloader._memory["clip"]["expires"] = time.time() - 1
+    assert downloader.cached_info("clip") is None
+    assert not (tmp_path / "info_cache" / "clip.json").exists()
+
+    # signed stream URLs cap the entry's lifetime
+    signed = {"formats": [{"url": f"https://r1.googlevideo.com/videoplayback?expire={int(time.time()) + 1200}"}]}
+    assert downloader._expires(signed, time.time()) < time.time() + 601
+
+
+def test_formats_download_in_process_writes_info_json(media, tmp_path, monkeypatch):
+    url, _ = media
+    monkeypatch.setattr(formats, "DOWNLOAD_FORMAT", "auto")
+    monkeypatch.setattr(downloader, "DOWNLOADER", "inprocess")
+    out = tmp_path / "job"
+    out.mkdir()
+    path = formats.download(url, str(out / "input.%(ext)s"))
+    assert path == str(out / "input.mp4")
+    assert json.loads((out / "input.info.json").read_text())["id"] == "clip"
+
+
+def test_stale_cached_info_is_extracted_again(media, tmp_path, monkeypatch):
+    from yt_dlp.utils import DownloadError
+
+    url, requests = media
+    monkeypatch.setattr(formats, "DOWNLOAD_FORMAT", "auto")
+    monkeypatch.setattr(downloader, "DOWNLOADER", "inprocess")
+    info, _ = downloader.extract_info(url)
+    # the cached stream URLs stopped working
+    downloader.store_info(json.loads(json.dumps(info).replace("/clip.mp4", "/gone.mp4")))
+    out = tmp_path / "job"
+    out.mkdir()
+    path = formats.download(url, str(out / "input.%(ext)s"))
+    assert path == str(out / "input.mp4")
+    assert "/gone.mp4" not in (out / "input.info.json").read_text()
+    # re-extracted: the same formats (only the extraction `epoch` may differ)
+    assert downloader.cached_info("clip")["formats"] == info["formats"]
+
+    # an info dict that was just extracted is not extracted again
+    broken = json.loads(json.dumps(info).replace("/clip.mp4", "/gone.mp4"))
+    before = len(requests)
+    with pytest.raises(DownloadError):
+        downloader.download(url, str(tmp_path / "again" / "input.%(ext)s"), info=broken)
+    assert all(p == "/gone.mp4" for _, p in requests[before:])
+
+
+def test_download_hook_publishes_job_progress():
+    job = "dlhook-job"
+    progress.queue_job(job)
+    token = progress.start_job(job)
+    try:
+        hook = progress.download_hook(min_interval=0)
+        hook({"status": "downloading", "downloaded_bytes": 50, "total_bytes": 200, "speed": 1e6, "eta": 1})
+        assert progress.get_job(job)["percent"] == 25.0
+        hook({"status": "finished", "downloaded_bytes": 200, "total_bytes": 200})
+        assert progress.get_job(job)["percent"] == 100.0
+    finally:
+        progress.finish_job(token)
+
+
+def test_url_id_map_is_bounded(media, monkeypatch):
+    url, _ = media
+    monkeypatch.setattr(downloader, "MEMORY_ENTRIES", 1)
+    downloader.extract_info(url)
+    downloader.extract_info(url + "?copy=1")
+    assert list(downloader._url_ids) == [url + "?copy=1"]
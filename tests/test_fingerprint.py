@@ -0,0 +1,32 @@
+import numpy as np
+
+from app import fingerprint
+
+
+def _signal(seed, seconds=40):
+    # random tone bursts: distinctive enough for spectral peaks
+    rng = np.random.default_rng(seed)
+    sr = fingerprint.SAMPLE_RATE
+    out = []
+    for _ in range(int(seconds * 4)):
+        t = np.arange(sr // 4) / sr
+        freqs = rng.uniform(100, 3500, size=3)
+        out.append(sum(np.sin(2 * np.pi * f * t) for f in freqs) / 3)
+    return np.concatenate(out).astype(np.float32)
+
+
+def test_reupload_matches_and_other_content_does_not(tmp_path, monkeypatch):
+    monkeypatch.setattr(fingerprint, "DB_PATH", str(tmp_path / "fp.db"))
+    original = _signal(1)
+    fingerprint.add_video("orig", fingerprint.fingerprint_samples(original), {"short": "x.mp4"})
+
+    # re-upload: intro trimmed by 5 seconds and a bit of noise added
+    sr = fingerprint.SAMPLE_RATE
+    noise = np.random.default_rng(7).normal(0, 0.05, len(original) - 5 * sr).astype(np.float32)
+    reupload = original[5 * sr :] + noise
+    match = fingerprint.find_match(fingerprint.fingerprint_samples(reupload))
+    assert match and match["video_id"] == "orig"
+    assert abs(match["offset_seconds"] - 5) < 0.2
+    assert fingerprint.get_result("orig") == {"short": "x.mp4"}
+
+    assert fingerprint.find_match(fingerprint.fingerprint_samples(_signal(2))) is None
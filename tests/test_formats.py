@@ -0,0 +1,73 @@
+import json
+
+from app import downloader, formats
+
+
+def _fmt(fid, w, h, fps=30, vcodec="avc1.4d401f", acodec="none", ext="mp4", size=None, abr=None):
+    return {"format_id": fid, "width": w, "height": h, "fps": fps, "vcodec": vcodec, "acodec": acodec,
+            "ext": ext, "filesize": size, "abr": abr}
+
+
+def _audio(fid, abr, ext, size):
+    return {"format_id": fid, "vcodec": "none", "acodec": "opus" if ext == "webm" else "mp4a.40.2",
+            "abr": abr, "ext": ext, "filesize": size}
+
+
+LANDSCAPE = {
+    "duration": 600,
+    "formats": [
+        _fmt("18", 640, 360, acodec="mp4a.40.2", size=30e6),     # pre-muxed, what -f best used to pick among
+        _fmt("22", 1280, 720, acodec="mp4a.40.2", size=90e6),
+        _fmt("134", 640, 360, size=15e6),
+        _fmt("135", 854, 480, size=25e6),
+        _fmt("244", 854, 480, vcodec="vp9", ext="webm", size=20e6),
+        _fmt("397", 854, 480, vcodec="av01.0.04M.08", size=18e6),
+        _fmt("298", 1280, 720, fps=60, size=80e6),
+        _fmt("136", 1280, 720, size=45e6),
+        _fmt("313", 3840, 2160, vcodec="vp9", ext="webm", size=900e6),
+        _audio("139", 48, "m4a", 3.6e6),
+        _audio("140", 129, "m4a", 9.7e6),
+        _audio("249", 50, "webm", 3.5e6),
+        _audio("251", 135, "webm", 9.5e6),
+    ],
+}
+
+
+def test_landscape_source_gets_smallest_filling_stream():
+    # fitted into 720x1280 a 16:9 frame is 720 wide, so 854x480 already fills it;
+    # among the 480p streams H.264 is the cheapest to decode even though AV1 is smaller
+    video, audio = formats.pick_formats(LANDSCAPE)
+    assert video["format_id"] == "135"
+    assert audio["format_id"] == "140"
+    assert formats.merge_format(video, audio) == "mp4"
+
+
+def test_vertical_source_frame_rate_and_fallbacks():
+    info = {"duration": 60, "formats": [
+        _fmt("a", 360, 640, fps=30), _fmt("b", 720, 1280, fps=24), _fmt("c", 720, 1280, fps=30, size=9e6),
+        _fmt("d", 1080, 1920, fps=30, size=20e6), _audio("251", 135, "webm", 1e6),
+    ]}
+    video, audio = formats.pick_formats(info)
+    assert video["format_id"] == "c" and audio["format_id"] == "251"
+    assert formats.merge_format(video, audio) == "mkv"
+    # nothing fills the profile: take the largest available
+    small = {"formats": [_fmt("x", 320, 240, acodec="aac"), _fmt("y", 640, 480, acodec="aac")]}
+    assert formats.pick_formats(small) == (small["formats"][1], None)
+    assert formats.pick_formats({"formats": [_audio("140", 129, "m4a", 1)]}) is None
+
+
+def test_download_command_reuses_info_json(tmp_path, monkeypatch):
+    class R:
+        stdout = json.dumps(LANDSCAPE)
+
+    monkeypatch.setattr("subprocess.run", lambda *a, **k: R())
+    monkeypatch.setattr(formats, "DOWNLOAD_FORMAT", "auto")
+    monkeypatch.setattr(downloader, "DOWNLOADER", "subprocess")
+    cmd = formats.download_command("https://www.youtube.com/watch?v=abcdefghijk", str(tmp_path / "input.%(ext)s"))
+    assert cmd[cmd.index("-f") + 1] == "135+140"
+    assert json.loads((tmp_path / "input.info.json").read_text())["duration"] == 600
+    assert "--load-info-json" in cmd
+
+    monkeypatch.setattr("subprocess.run", lambda *a, **k: None)
+    cmd = formats.download_command("https://www.youtube.com/watch?v=abcdefghijk", str(tmp_path / "input.%(ext)s"))
+    assert "-S" in cmd and cmd[-1].endswith("abcdefghijk")
@@ -0,0 +1,136 @@
+import threading
+import time
+
+import pytest
+
+from app import graph
+from app.graph import Stage
+from app.scheduler import CPU, IO
+
+
+def test_ready_stages_run_concurrently_and_critical_path():
+    # both branches only need "text": they must be running at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def branch(text):
+        barrier.wait()
+        return text.upper()
+
+    def slow(text):
+        barrier.wait()
+        time.sleep(0.1)
+        return len(text)
+
+    stages = [
+        Stage("load", lambda: "halo", (), ("text",), IO),
+        Stage("upper", branch, ("text",), ("upper",), IO),
+        Stage("length", slow, ("text",), ("length",), CPU),
+        Stage("join", lambda upper, length: f"{upper}:{length}", ("upper", "length"), ("out",), IO),
+    ]
+    values, report = graph.run(stages)
+    assert values["out"] == "HALO:4"
+    assert report["critical_path"] == ["load", "length", "join"]
+    assert report["stages"]["join"]["after"] == "length"
+    assert report["wall_seconds"] < report["busy_seconds"] + 0.05
+
+
+def test_fallback_keeps_dependents_running(tmp_path):
+    def broken(x):
+        raise RuntimeError("api down")
+
+    stages = [
+        Stage("moderation", broken, ("x",), ("flags",), IO, fallback=lambda x: None),
+        Stage("srt", lambda flags: "none" if flags is None else "srt", ("flags",), ("srt",), IO),
+    ]
+    values, report = graph.run(stages, {"x": 1}, job_dir=str(tmp_path))
+    assert values["srt"] == "none"
+    assert report["stages"]["moderation"]["status"] == graph.FALLBACK
+    assert (tmp_path / "moderation_error.txt").read_text() == "api down"
+
+
+def test_fatal_failure_skips_the_rest():
+    def broken():
+        raise RuntimeError("no file")
+
+    stages = [
+        Stage("download", broken, (), ("in_file",), IO),
+        Stage("trim", lambda in_file: in_file, ("in_file",), ("short",), CPU),
+    ]
+    with pytest.raises(RuntimeError, match="no file"):
+        graph.run(stages)
+
+
+def test_stop_ends_the_run_early():
+    def dup(x):
+        raise graph.Stop({"duplicate_of": "abc"})
+
+    ran = []
+    stages = [
+        Stage("fingerprint", dup, ("x",), ("fp",), CPU, fallback=lambda x: []),
+        Stage("trim", lambda: ran.append(1), (), (), CPU, after=("fp",)),
+    ]
+    with pytest.raises(graph.Stop) as e:
+        graph.run(stages, {"x": 1})
+    assert e.value.result == {"duplicate_of": "abc"}
+    assert e.value.report["stages"]["trim"]["status"] == graph.SKIPPED
+    assert not ran
+
+
+def test_validate_rejects_cycles_and_missing_inputs():
+    with pytest.raises(ValueError, match="cycle"):
+        graph.validate([Stage("a", len, ("b",), ("a",)), Stage("b", len, ("a",), ("b",))])
+    with pytest.raises(ValueError, match="no stage produces"):
+        graph.validate([Stage("a", len, ("missing",), ("a",))])
+
+
+def test_pipeline_graph_is_valid():
+    from app import process
+
+    graph.validate(process.pipeline_stages(), ["url", "video_id", "out_dir", "max_duration"])
+
+
+def test_encode_without_output_falls_back(tmp_path, monkeypatch):
+    from app import process
+
+    # the encode "succeeds" (ffmpeg runs unchecked) but writes nothing
+    monkeypatch.setattr("app.censor.blur_video_segments", lambda src, segs, out: None)
+    bleeped = tmp_path / "short_bleeped.mp4"
+    bleeped.write_bytes(b"media")
+    stages = [
+        Stage("blur", process._blur, ("bleeped_video", "segments", "flagged_idxs", "out_dir"),
+              ("censored_video",), CPU, process._keep("bleeped_video")),
+    ]
+    values, report = graph.run(stages, {"bleeped_video": str(bleeped), "segments": [{"start": 0, "end": 1}],
+                                        "flagged_idxs": [0], "out_dir": str(tmp_path)}, job_dir=str(tmp_path))
+    assert values["censored_video"] == str(bleeped)
+    assert report["stages"]["blur"]["status"] == graph.FALLBACK
+    assert "no output written" in (tmp_path / "blur_error.txt").read_text()
+
+
+def test_subtitles_do_not_wait_for_highlights_without_a_sink(tmp_path, monkeypatch):
+    from app import process, sink
+
+    burned = threading.Event()
+
+    def burn(vin, srt, out):
+        open(out, "wb").write(b"media")
+        burned.set()
+
+    def events():
+        # stands in for GPT highlights + assets: only finishes once the burn has run
+        assert burned.wait(timeout=5), "subtitles waited for the events"
+        return [], []
+
+    monkeypatch.setattr("app.subtitles.burn_subtitles_into_video", burn)
+    monkeypatch.setattr(sink, "enabled", lambda: False)
+    stages = [s for s in process.pipeline_stages() if s.name in ("stream", "subtitles")]
+    stages.append(Stage("events", events, (), ("sound_events", "image_events"), IO))
+    values, report = graph.run(stages, {"video_id": "vid", "out_dir": str(tmp_path), "censored_video": "c.mp4",
+                                        "srt_path": "s.srt"}, job_dir=str(tmp_path))
+    assert values["subtitled"] == str(tmp_path / "short_subtitled.mp4")
+    assert report["stages"]["events"]["status"] == graph.OK
+
+    # with a sink the stream (and so the events) still go first
+    monkeypatch.setattr(sink, "enabled", lambda: True)
+    subtitles = next(s for s in process.pipeline_stages() if s.name == "subtitles")
+    assert "stream" in subtitles.needs
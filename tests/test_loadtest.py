@@ -0,0 +1,61 @@
+import pytest
+
+from app import loadtest, moderation, prefilter, telegram
+
+
+@pytest.fixture
+def standins(tmp_path):
+    s = loadtest.StandIns(channels=3, profiles=loadtest.parse_profiles("youtube=0,openai=0,telegram=0"),
+                          media_seconds=20, work_dir=str(tmp_path)).start()
+    yield s
+    s.stop()
+
+
+def test_youtube_stand_in_serves_prefilter_metadata(standins, monkeypatch):
+    monkeypatch.setattr(prefilter, "YOUTUBE_API_BASE", f"{standins.url}/youtube/v3")
+    vids = standins.publish(2)
+    meta = prefilter.fetch_metadata(vids + ["unknown0001"], params={"key": "x"})
+    assert sorted(meta) == sorted(vids)
+    assert all(prefilter.evaluate(item) is None for item in meta.values())
+    assert standins.summary()["youtube_quota_units"] == 1
+    # a later upload on the same channel hides the first one from `search`: once a search ran
+    # after the upload, it can't be found by polling any more
+    again = standins.new_video(standins.channel_of[vids[0]])
+    assert not standins.missed(vids[0])
+    standins.youtube("search", {"channelId": [standins.channel_of[vids[0]]]})
+    assert standins.missed(vids[0]) and not standins.missed(again)
+
+
+def test_error_rate_and_telegram_stand_in(standins, monkeypatch):
+    standins.profiles["openai"].error_rate = 1.0
+    monkeypatch.setattr(moderation, "MODERATION_URL", f"{standins.url}/openai/v1/moderations")
+    monkeypatch.setattr(moderation, "OPENAI_API_KEY", "test")
+    assert moderation.moderate_text("halo") == {}
+    assert standins.summary()["errors"] == {"openai": {"moderations": 1}}
+
+    monkeypatch.setattr(telegram, "TELEGRAM_API_BASE", f"{standins.url}/telegram")
+    monkeypatch.setattr(telegram, "TELEGRAM_BOT_TOKEN", "0:test")
+    telegram.send_text("halo", chat_id="1")
+    assert [m for _, m in standins.notifications] == ["sendMessage"]
+
+
+def test_percentiles_and_summary():
+    assert loadtest.percentiles([]) is None
+    p = loadtest.percentiles([float(i) for i in range(1, 101)])
+    assert (p["p50"], p["p95"], p["max"]) == (50.0, 95.0, 100.0)
+
+    published = {"a": 100.0, "b": 100.0, "c": 100.0}
+    jobs = {
+        "a": {"status": "done", "queued": 101.0, "started": 102.0, "updated": 130.0,
+              "stages": [{"name": "notify", "started": 125.0, "finished": 128.0, "status": "ok"}]},
+        "b": {"status": "failed", "queued": 103.0, "started": 104.0, "updated": 110.0, "stages": []},
+        "c": None,
+    }
+    samples = [{"t": 0, "queued": 2, "cpu_seconds": 1.0}, {"t": 10, "queued": 0, "cpu_seconds": 6.0}]
+    r = loadtest.summarize(jobs, published, samples, missed=["c"])
+    assert r["status"]["done"] == 1 and r["status"]["failed"] == 1 and r["status"]["missed"] == 1
+    assert r["latency_seconds"]["end_to_end"]["p50"] == 28.0
+    assert r["latency_seconds"]["detect"]["max"] == 3.0
+    assert r["queue_depth"]["max"] == 2
+    assert r["resources"]["mean_cpu_percent"] == 50.0
+    assert r["throughput_per_minute"] == 4.0
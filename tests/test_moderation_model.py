@@ -0,0 +1,58 @@
+import random
+
+from app import moderation, moderation_model
+
+SAFE_WORDS = ["halo", "semuanya", "terima", "kasih", "sudah", "menonton", "hari", "ini", "kita", "makan",
+              "bakso", "jalan", "pagi", "cuaca", "cerah", "jangan", "lupa", "subscribe", "video", "seru"]
+# made-up slurs stand in for real SARA terms
+UNSAFE_WORDS = ["zorgblat", "kravnik", "plumox", "dasar", "kaum", "usir", "benci"]
+
+
+def _sentence(rng, words, extra=()):
+    return " ".join(rng.choice(words) for _ in range(rng.randint(3, 7))) + " " + " ".join(extra)
+
+
+def test_retrain_evaluate_and_route_segments(tmp_path, monkeypatch):
+    for name, fname in (("MODEL_PATH", "m.json"), ("VERDICTS_PATH", "v.jsonl"), ("REPORT_PATH", "r.json")):
+        monkeypatch.setattr(moderation_model, name, str(tmp_path / fname))
+    monkeypatch.setattr(moderation_model, "MODERATION_MIN_EXAMPLES", 20)
+    kw_file = tmp_path / "sara_keywords.txt"
+    kw_file.write_text("# test\nzorgblat\nkravnik\nplumox\n", encoding="utf-8")
+    monkeypatch.setattr(moderation, "KEYWORDS_FILE", str(kw_file))
+
+    rng = random.Random(1)
+    for _ in range(80):
+        moderation_model.record_verdict(_sentence(rng, SAFE_WORDS), False)
+    for _ in range(40):
+        moderation_model.record_verdict(_sentence(rng, UNSAFE_WORDS, [rng.choice(["zorgblatt", "kravniks", "plumoxx"])]), True)
+
+    report = moderation_model.retrain(folds=4)
+    assert report["usable"] and report["examples"] == 120
+    assert report["local_fraction"] > 0.7 and report["missed_unsafe"] == 0
+    assert (tmp_path / "r.json").exists()
+
+    model = moderation_model.get_model()
+    assert moderation_model.classify(model, "halo semuanya terima kasih")[0] == "safe"
+    assert moderation_model.classify(model, "dasar kaum kravniks usir")[0] == "unsafe"
+    assert moderation_model.explain(model, "dasar kravniks")[0][1] > 0
+
+    # only uncertain segments reach the API; clear ones are decided locally
+    calls = []
+
+    def fake_api(text):
+        calls.append(text)
+        return {"results": [{"flagged": False}]}
+
+    monkeypatch.setattr(moderation, "OPENAI_API_KEY", "k")
+    monkeypatch.setattr(moderation, "moderate_text", fake_api)
+    monkeypatch.setattr(moderation, "_keyword_cache", {"mtime": None, "keywords": []})
+    segments = [
+        {"text": "halo semuanya jangan lupa subscribe"},
+        {"text": "dasar kaum kravniks benci usir"},
+        {"text": "plumox"},
+        {"text": "quantum xylofon rhapsody"},
+    ]
+    assert moderation.moderate_segments(segments) == [1, 2]
+    assert calls == ["quantum xylofon rhapsody"]
+    # the API verdict is kept as training data
+    assert ("quantum xylofon rhapsody", False) in moderation_model.load_verdicts()
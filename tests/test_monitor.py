@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from app import accounts, loadtest, prefilter, process, storage, youtube_monitor
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    for name in ("STATE_FILE", "SEEN_FILE", "REJECTED_FILE", "RECHECK_FILE", "ACCOUNTS_FILE"):
+        monkeypatch.setattr(storage, name, str(tmp_path / f"{name}.json"))
+    monkeypatch.setattr(accounts, "_accounts", None)
+    monkeypatch.setattr(accounts, "_charged", {})
+    s = loadtest.StandIns(channels=12, accounts=3, profiles=loadtest.parse_profiles("youtube=0"),
+                          work_dir=str(tmp_path)).start()
+    for module in (accounts, youtube_monitor, prefilter):
+        monkeypatch.setattr(module, "YOUTUBE_API_BASE", f"{s.url}/youtube/v3")
+    queued = []
+    monkeypatch.setattr(process, "submit_video", lambda url, **kw: queued.append(url))
+    for token in s.accounts:
+        accounts.add_account(token, "refresh-" + token, time.time() + 3600)
+    yield s, queued
+    s.stop()
+
+
+def test_channels_shared_by_accounts_are_polled_once(monitor, monkeypatch):
+    standins, queued = monitor
+    subscriptions = sum(len(c) for c in standins.accounts.values())
+    assert subscriptions > len(standins.channels)
+
+    first = youtube_monitor.check_subscriptions_once()
+    assert first["accounts"] == 3 and first["subscriptions"] == subscriptions
+    assert first["channels"] == first["checked"] == 12 and first["new"] == 0
+    assert standins.summary()["calls"]["youtube"]["playlistItems"] == 12
+
+    # two uploads on one channel between polls are both found, oldest first
+    ch = standins.channels[0]
+    vids = [standins.new_video(ch), standins.new_video(ch), standins.new_video(standins.channels[1])]
+    second = youtube_monitor.check_subscriptions_once()
+    assert [f["video_id"] for f in second["found"]] == vids
+    assert queued == [f"https://www.youtube.com/watch?v={v}" for v in vids]
+    # subscription lists are cached; 12 + 12 channel polls, prefilter batch, 3 channels + 3 subscriptions
+    calls = standins.summary()["calls"]["youtube"]
+    assert (calls["playlistItems"], calls["subscriptions"], calls["videos"]) == (24, 3, 1)
+    used = {a["id"]: a["quota"]["used"] for a in accounts.list_accounts()}
+    assert sum(used.values()) == 24 + 3 + 1 + 3
+    # quota was spread: the account with the most left pays for each channel
+    assert max(used.values()) - min(used.values()) <= 2
+
+
+def test_upcoming_uploads_are_rechecked_on_later_polls(monitor, monkeypatch):
+    standins, queued = monitor
+    youtube_monitor.check_subscriptions_once()
+    vid = standins.new_video(standins.channels[0])
+    live = {vid}
+    evaluate = prefilter.evaluate
+    monkeypatch.setattr(prefilter, "evaluate", lambda item: ("upcoming", "premiere") if item["id"] in live else evaluate(item))
+
+    r = youtube_monitor.check_subscriptions_once()
+    assert r["rejected"][vid]["reason"] == "upcoming" and queued == []
+    # the channel's pointer moved past it: only the re-check list offers it again
+    r = youtube_monitor.check_subscriptions_once()
+    assert r["new"] == 0 and r["rechecked"] == 1 and queued == []
+    live.clear()
+    r = youtube_monitor.check_subscriptions_once()
+    assert r["rechecked"] == 1 and queued == [f"https://www.youtube.com/watch?v={vid}"]
+    assert storage.get_rechecks() == {}
+    assert youtube_monitor.check_subscriptions_once()["rechecked"] == 0
+
+
+def test_shards_split_the_channels(monitor, monkeypatch):
+    standins, _ = monitor
+    monkeypatch.setattr(youtube_monitor, "MONITOR_SHARDS", 3)
+    # first round: each account's subscriptions are read once, by the instance owning its shard
+    for shard in range(3):
+        monkeypatch.setattr(youtube_monitor, "MONITOR_SHARD_IDS", [shard])
+        youtube_monitor.check_subscriptions_once()
+    assert standins.summary()["calls"]["youtube"]["subscriptions"] == 3
+    polled = 0
+    for shard in range(3):
+        monkeypatch.setattr(youtube_monitor, "MONITOR_SHARD_IDS", [shard])
+        r = youtube_monitor.check_subscriptions_once()
+        assert r["shards"] == [shard]
+        polled += r["checked"]
+    assert polled == 12
+    assert {youtube_monitor.shard_of(ch, 3) for ch in standins.channels} == {0, 1, 2}
+
+
+def test_out_of_quota_accounts_are_skipped(monitor, monkeypatch):
+    standins, _ = monitor
+    monkeypatch.setattr(accounts, "ACCOUNT_DAILY_QUOTA", 2)
+    # every account already spent 1 unit (channels.list) and has 1 left after refreshing subscriptions
+    r = youtube_monitor.check_subscriptions_once()
+    assert r["checked"] == 0 and r["skipped_quota"] == 12
+    assert accounts.pick() is None
+
+
+def test_access_token_refresh_and_revocation(monitor, monkeypatch):
+    account_id = accounts.account_ids()[0]
+    accounts._load()[account_id]["expiry"] = time.time() + 10
+
+    class Resp:
+        def __init__(self, status, body):
+            self.status_code, self._body, self.text = status, body, str(body)
+
+        def json(self):
+            return self._body
+
+        def raise_for_status(self):
+            assert self.status_code == 200
+
+    posts = []
+
+    def fake_post(url, data=None, timeout=None):
+        posts.append(data)
+        if len(posts) == 1:
+            return Resp(200, {"access_token": "fresh", "expires_in": 3599})
+        return Resp(400, {"error": "invalid_grant"})
+
+    monkeypatch.setattr(requests, "post", fake_post)
+    assert accounts.access_token(account_id) == "fresh"
+    assert accounts.access_token(account_id) == "fresh" and len(posts) == 1
+    assert posts[0]["grant_type"] == "refresh_token" and posts[0]["refresh_token"].startswith("refresh-")
+    # persisted across restarts, readable by the owner only
+    assert os.stat(storage.ACCOUNTS_FILE).st_mode & 0o777 == 0o600
+    monkeypatch.setattr(accounts, "_accounts", None)
+    assert accounts.access_token(account_id) == "fresh"
+
+    with pytest.raises(RuntimeError, match="rejected"):
+        accounts.access_token(account_id, force_refresh=True)
+    assert account_id not in accounts.account_ids()
+    public = {a["id"]: a for a in accounts.list_accounts()}[account_id]
+    assert public["error"] and "refresh_token" not in public and "access_token" not in public
+
+
+def test_token_refresh_does_not_block_other_accounts(monitor, monkeypatch):
+    first, other = accounts.account_ids()[:2]
+    accounts._load()[first]["expiry"] = time.time() + 10
+    started, release, posts = threading.Event(), threading.Event(), []
+
+    class Resp:
+        status_code = 200
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"access_token": "fresh", "expires_in": 3599}
+
+    def slow_post(url, data=None, timeout=None):
+        posts.append(data)
+        started.set()
+        assert release.wait(5)
+        return Resp()
+
+    monkeypatch.setattr(requests, "post", slow_post)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        tokens = [pool.submit(accounts.access_token, first)]
+        assert started.wait(5)
+        tokens.append(pool.submit(accounts.access_token, first))
+        # the refresh is in flight: other accounts (and quota bookkeeping) carry on
+        assert accounts.access_token(other) != "fresh"
+        accounts.charge(other, 1)
+        release.set()
+        assert [t.result(5) for t in tokens] == ["fresh", "fresh"]
+    # the second caller waited for the first refresh instead of starting its own
+    assert len(posts) == 1
+
+
+def test_instances_sharing_the_account_store_merge_their_writes(monitor):
+    first, second = accounts.account_ids()[:2]
+    accounts.charge(first, 5)
+    used = accounts.remaining(first)
+
+    # meanwhile another instance authorizes an account, spends quota and refreshes a token
+    def other_instance(stored):
+        stored["acct-other"] = {"added": time.time(), "refresh_token": "r", "access_token": "t", "expiry": time.time() + 3600}
+        stored[first]["quota"]["used"] += 7
+        stored[second]["access_token"] = "from-other"
+
+    storage.update_accounts(other_instance)
+    # the new account reaches this instance without a restart; unflushed charges still count
+    assert "acct-other" in accounts.account_ids()
+    assert accounts.remaining(first) == used - 7
+    assert accounts.access_token(second) == "from-other"
+
+    accounts.flush()
+    stored = storage.get_accounts()
+    assert "acct-other" in stored and stored[second]["access_token"] == "from-other"
+    assert accounts.ACCOUNT_DAILY_QUOTA - stored[first]["quota"]["used"] == used - 7
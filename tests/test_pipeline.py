@@ -28,12 +28,27 @@ def touch_dummy_input():
     return p
 
 
-def test_handle_new_video_with_mocks(monkeypatch):
+def _written(out):
+    # stand-in for an encode: stages check that their output exists
+    pathlib.Path(out).write_bytes(b"media")
+    return out
+
+
+def _fake_ffmpeg(cmd, *a, **k):
+    if cmd and os.path.basename(cmd[0]) == "ffmpeg" and cmd[-1] != "-":
+        _written(cmd[-1])
+
+
+def test_handle_new_video_with_mocks(monkeypatch, tmp_path):
     # Prepare dummy input file
     in_file = touch_dummy_input()
+    # keep the transcript search index and fingerprint store out of the real outputs dir
+    monkeypatch.setattr("app.transcript_index.DB_PATH", str(tmp_path / "transcripts.db"))
+    monkeypatch.setattr("app.fingerprint.DB_PATH", str(tmp_path / "fp.db"))
 
-    # Patch subprocess.run to no-op
-    monkeypatch.setattr("subprocess.run", lambda *a, **k: None)
+    # Patch subprocess.run (ffmpeg only writes its output) and download through it, not the in-process yt-dlp
+    monkeypatch.setattr("subprocess.run", _fake_ffmpeg)
+    monkeypatch.setattr("app.downloader.DOWNLOADER", "subprocess")
 
     # Patch transcribe to return sample text
     monkeypatch.setattr("app.transcribe.transcribe_from_video", lambda vp, language="id": "Ini adalah momen lucu dan menarik.")
@@ -42,17 +57,17 @@ def test_handle_new_video_with_mocks(monkeypatch):
     monkeypatch.setattr("app.moderation.moderate_segments", lambda segments: [0])
 
     # Patch censor functions to just return provided paths
-    monkeypatch.setattr("app.censor.bleep_audio_for_segments", lambda vp, s, f, out: out)
-    monkeypatch.setattr("app.censor.replace_audio_in_video", lambda v, a, out: out)
-    monkeypatch.setattr("app.censor.blur_video_segments", lambda v, segs, out: out)
+    monkeypatch.setattr("app.censor.bleep_audio_for_segments", lambda vp, s, f, out: _written(out))
+    monkeypatch.setattr("app.censor.replace_audio_in_video", lambda v, a, out: _written(out))
+    monkeypatch.setattr("app.censor.blur_video_segments", lambda v, segs, out: _written(out))
 
     # Patch subtitles and soundboard/visual overlay to be no-op
-    monkeypatch.setattr("app.subtitles.burn_subtitles_into_video", lambda vin, srt, out: out)
-    monkeypatch.setattr("app.soundboard.overlay_soundboard", lambda vin, ev, out: out)
-    monkeypatch.setattr("app.visual_overlay.overlay_images_on_video", lambda vin, ev, out: out)
+    monkeypatch.setattr("app.subtitles.burn_subtitles_into_video", lambda vin, srt, out: _written(out))
+    monkeypatch.setattr("app.soundboard.overlay_soundboard", lambda vin, ev, out: _written(out))
+    monkeypatch.setattr("app.visual_overlay.overlay_images_on_video", lambda vin, ev, out: _written(out))
 
     # Patch highlight extraction to return a funny highlight
-    monkeypatch.setattr("app.highlight.extract_highlights", lambda txt: [{"start": 0.5, "end": 2.5, "label": "funny", "caption": "Momen lucu!"}])
+    monkeypatch.setattr("app.highlight.extract_highlights", lambda txt, **kw: [{"start": 0.5, "end": 2.5, "label": "funny", "caption": "Momen lucu!"}])
 
     # Patch telegram sender to avoid network
     monkeypatch.setattr("app.telegram.send_short_notification", lambda *a, **k: None)
@@ -68,3 +83,7 @@ def test_handle_new_video_with_mocks(monkeypatch):
     assert os.path.exists(os.path.join(TMP_DIR, "subtitles.srt"))
     # Transcript file should be present
     assert res.get("transcript_file") is not None
+    # every encode wrote its output: no stage fell back
+    for stage in ("trim", "replace_audio", "blur", "subtitles", "soundboard", "image_overlay"):
+        assert not os.path.exists(os.path.join(TMP_DIR, f"{stage}_error.txt"))
+    assert os.path.exists(res["short"])
@@ -0,0 +1,85 @@
+import requests
+
+from app import prefilter, storage
+
+
+def _item(vid, duration="PT10M", live=None, broadcast="none", category="22", size=(1280, 720), title="Video"):
+    item = {
+        "id": vid,
+        "snippet": {"title": title, "categoryId": category, "liveBroadcastContent": broadcast},
+        "contentDetails": {"duration": duration},
+        "player": {"embedWidth": str(size[0]), "embedHeight": str(size[1])},
+    }
+    if live:
+        item["liveStreamingDetails"] = live
+    return item
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, items):
+        self._items = items
+
+    def json(self):
+        return {"items": self._items}
+
+
+def test_parse_duration():
+    assert prefilter.parse_duration("PT1H2M3S") == 3723
+    assert prefilter.parse_duration("P1DT2H") == 93600
+    assert prefilter.parse_duration("P0D") == 0
+    assert prefilter.parse_duration("") is None and prefilter.parse_duration("PT") is None
+
+
+def test_filter_batches_and_records_rejections(tmp_path, monkeypatch):
+    for name in ("SEEN_FILE", "REJECTED_FILE"):
+        monkeypatch.setattr(storage, name, str(tmp_path / f"{name}.json"))
+    monkeypatch.setattr(prefilter, "_auth", lambda calls=1: ({"Authorization": "Bearer t"}, {}))
+    monkeypatch.setattr(prefilter, "PREFILTER_BLOCKED_CATEGORIES", ["10"])
+
+    catalog = {f"ok{i:09d}": _item(f"ok{i:09d}") for i in range(60)}
+    catalog.update({
+        "live00000001": _item("live00000001", "P0D", {"actualStartTime": "2024-01-01T00:00:00Z"}, "live"),
+        "prem00000001": _item("prem00000001", "PT0S", {"scheduledStartTime": "2030-01-01T00:00:00Z"}, "upcoming"),
+        "long00000001": _item("long00000001", "PT5H"),
+        "short0000001": _item("short0000001", "PT45S", size=(405, 720)),
+        "music0000001": _item("music0000001", category="10"),
+    })
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        ids = params["id"].split(",")
+        calls.append(ids)
+        return FakeResponse([catalog[i] for i in ids if i in catalog])
+
+    monkeypatch.setattr(requests, "get", fake_get)
+    ids = list(catalog) + ["gone00000001"]
+    for vid in ids:
+        storage.mark_video_seen(vid)
+
+    accepted, rejected = prefilter.filter_videos(ids)
+
+    assert [len(c) for c in calls] == [50, 16]
+    assert accepted == [f"ok{i:09d}" for i in range(60)]
+    reasons = {vid: r["reason"] for vid, r in rejected.items()}
+    assert reasons == {
+        "live00000001": "live", "prem00000001": "upcoming", "long00000001": "too_long",
+        "short0000001": "vertical", "music0000001": "category", "gone00000001": "unavailable",
+    }
+    assert storage.get_rejections().keys() == rejected.keys()
+    # live / upcoming / unavailable can be enqueued again later; the others stay seen
+    assert storage.mark_video_seen("prem00000001")
+    assert not storage.mark_video_seen("long00000001")
+
+
+def test_filter_fails_open_without_credentials_or_api(monkeypatch):
+    monkeypatch.setattr(prefilter, "_auth", lambda calls=1: (None, {}))
+    assert prefilter.filter_videos(["abcdefghijk"]) == (["abcdefghijk"], {})
+
+    def broken(*a, **k):
+        raise requests.ConnectionError("down")
+
+    monkeypatch.setattr(prefilter, "_auth", lambda calls=1: ({}, {"key": "k"}))
+    monkeypatch.setattr(requests, "get", broken)
+    assert prefilter.filter_videos(["abcdefghijk"]) == (["abcdefghijk"], {})
@@ -0,0 +1,46 @@
+import numpy as np
+
+from app import highlight, prescore
+
+
+def test_noisy_loud_burst_is_top_candidate(monkeypatch):
+    sr = prescore.SAMPLE_RATE
+    rng = np.random.default_rng(0)
+    t = np.arange(60 * sr) / sr
+    # quiet "speech-like" tone, with a loud broadband burst (applause/laughter) at 30-36s
+    samples = 0.05 * np.sin(2 * np.pi * 220 * t)
+    samples[30 * sr : 36 * sr] += rng.normal(0, 0.5, 6 * sr)
+    segments = [{"start": float(i), "end": float(i + 5), "text": f"kalimat nomor {i}"} for i in range(0, 60, 5)]
+
+    features = prescore.frame_features(samples.astype(np.float32))
+    cands = prescore.pick_candidates(prescore.score_windows(features, segments, window=10.0), top_k=2)
+    best = max(cands, key=lambda c: c["score"])
+    assert best["start"] <= 30 and best["end"] >= 36
+    assert best["label"] == "funny"
+
+    # local mode: no API call, candidates become highlights with transcript captions
+    monkeypatch.setattr(highlight, "HIGHLIGHT_MODE", "local")
+    hl = highlight.extract_highlights("", segments=segments, candidates=cands)
+    assert any(h["label"] == "funny" and "kalimat" in h["caption"] for h in hl)
+
+
+def test_candidates_stay_inside_the_clip(monkeypatch):
+    from types import SimpleNamespace
+
+    calls = {}
+
+    def decode(path, sample_rate, max_seconds=None):
+        calls["decode"] = max_seconds
+        return np.zeros(int(max_seconds * sample_rate), dtype=np.float32)
+
+    def probe(path, until=None, loudness=False):
+        calls["probe"] = until
+        return SimpleNamespace(loudness=None)
+
+    monkeypatch.setattr(prescore, "decode_pcm", decode)
+    monkeypatch.setattr("app.probe.probe", probe)
+    # the transcript runs on past the clip; the short is only its first 25s
+    segments = [{"start": float(i), "end": float(i + 5), "text": "kata " * (i % 7 + 1)} for i in range(0, 120, 5)]
+    cands = prescore.candidate_windows("in.mp4", segments, clip_duration=25.0, top_k=5)
+    assert calls == {"decode": 25.0, "probe": 25.0}
+    assert cands and all(c["end"] <= 25.0 for c in cands)
@@ -0,0 +1,109 @@
+import json
+import subprocess
+
+from app import probe
+
+FFPROBE_JSON = {
+    "format": {"duration": "30.5"},
+    "streams": [
+        {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080, "avg_frame_rate": "30000/1001"},
+        {"codec_type": "audio", "codec_name": "aac"},
+    ],
+}
+PACKETS = b"0.000000,K__\n0.033000,___\n2.002000,K__\n4.004000,K__\n4.037000,___\n"
+
+
+def test_probe_parses_and_caches(tmp_path, monkeypatch):
+    media = tmp_path / "input.mp4"
+    media.write_bytes(b"dummy")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        out = json.dumps(FFPROBE_JSON).encode() if "-show_format" in cmd else PACKETS
+        return subprocess.CompletedProcess(cmd, 0, stdout=out, stderr=b"")
+
+    monkeypatch.setattr("subprocess.run", fake_run)
+    info = probe.probe(str(media))
+    assert info.duration == 30.5
+    assert (info.width, info.height) == (1920, 1080)
+    assert round(info.fps, 2) == 29.97
+    assert info.has_audio and not info.is_vertical
+    assert info.keyframes == [0.0, 2.002, 4.004]
+    assert info.keyframe_before(3.0) == 2.002
+    assert info.keyframe_after(3.0) == 4.004
+    assert (tmp_path / "input.mp4.probe.json").exists()
+
+    # second probe (fresh process: empty memory cache) is served from the side-file
+    probe._cache.clear()
+    n = len(calls)
+    assert probe.probe(str(media)).keyframes == info.keyframes
+    assert len(calls) == n
+
+
+def test_keyframe_index_is_limited_to_the_window(tmp_path, monkeypatch):
+    media = tmp_path / "input.mp4"
+    media.write_bytes(b"dummy")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        out = json.dumps(FFPROBE_JSON).encode() if "-show_format" in cmd else PACKETS
+        return subprocess.CompletedProcess(cmd, 0, stdout=out, stderr=b"")
+
+    monkeypatch.setattr("subprocess.run", fake_run)
+    info = probe.probe(str(media), until=10.0)
+    assert calls[-1][calls[-1].index("-read_intervals") + 1] == "%+10.000"
+    assert info.keyframes_until == 10.0
+    # a window inside the indexed one is served from the cache
+    n = len(calls)
+    probe.probe(str(media), until=5.0)
+    assert len(calls) == n
+    # a longer one (here: the whole file) extends the index
+    assert probe.probe(str(media)).keyframes_until is None
+    assert "-read_intervals" not in calls[-1] and len(calls) == n + 1
+    probe._cache.clear()
+
+
+LOUDNORM = b"""[Parsed_loudnorm_0 @ 0x1]
+{
+	"input_i" : "-19.50",
+	"input_tp" : "-1.20",
+	"input_lra" : "6.10",
+	"input_thresh" : "-29.80",
+	"output_i" : "-24.00"
+}
+"""
+
+
+def test_loudness_is_measured_once_and_duration_only_probes_skip_keyframes(tmp_path, monkeypatch):
+    from app import censor
+
+    media = tmp_path / "short.mp4"
+    media.write_bytes(b"dummy")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        if "-show_format" in cmd:
+            return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(FFPROBE_JSON).encode(), stderr=b"")
+        if "loudnorm=print_format=json" in cmd:
+            return subprocess.CompletedProcess(cmd, 0, stdout=b"", stderr=LOUDNORM)
+        return subprocess.CompletedProcess(cmd, 0, stdout=PACKETS, stderr=b"")
+
+    monkeypatch.setattr("subprocess.run", fake_run)
+    # duration only: no packet scan
+    assert probe.probe(str(media), until=0).duration == 30.5
+    assert len(calls) == 1
+
+    info = probe.probe(str(media), until=12.0, loudness=True)
+    assert info.loudness["integrated_lufs"] == -19.5 and info.loudness["until"] == 12.0
+    assert calls[-1][calls[-1].index("-t") + 1] == "12.000"
+    n = len(calls)
+    # cached, in memory and in the side-file
+    probe._cache.clear()
+    assert probe.probe(str(media), until=12.0, loudness=True).loudness == info.loudness
+    assert len(calls) == n
+    # the beep is levelled to the measured programme loudness
+    assert censor.beep_gain(str(media)) == -19.5 - censor.SINE_LUFS
+    probe._cache.clear()
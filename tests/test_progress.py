@@ -0,0 +1,78 @@
+import os
+import stat
+import sys
+
+from fastapi.testclient import TestClient
+
+from app import main, progress
+
+FAKE_FFMPEG = """#!{python}
+import os, sys, time
+fd = int(sys.argv[sys.argv.index("-progress") + 1].split(":")[1])
+for us, state in ((2500000, "continue"), (5000000, "continue"), (10000000, "end")):
+    os.write(fd, f"frame=10\\nfps=48.5\\nout_time_us={{us}}\\nspeed=2.0x\\nprogress={{state}}\\n".encode())
+    time.sleep(0.01)
+"""
+
+
+def test_ffmpeg_progress_is_streamed_to_job_state(tmp_path, monkeypatch):
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+
+    seen = []
+    orig_publish = progress.publish
+    monkeypatch.setattr(progress, "publish", lambda ev: (seen.append(dict(ev)), orig_publish(ev)))
+    token = progress.start_job("job12345", "https://www.youtube.com/watch?v=job12345")
+    progress.set_stage("trim")
+    progress.run_ffmpeg([str(ffmpeg), "-y", "-i", "in.mp4", "-t", "10", "out.mp4"])
+    encodes = [e for e in seen if e["type"] == "encode"]
+    assert [e["percent"] for e in encodes] == [25.0, 50.0, 100.0]
+    assert encodes[0]["fps"] == 48.5 and encodes[0]["stage"] == "trim"
+    assert encodes[0]["eta_seconds"] is not None
+
+    job = TestClient(main.app).get("/jobs/job12345").json()
+    assert job["status"] == "running" and job["stage"] == "trim" and job["percent"] == 100.0
+    progress.finish_job(token)
+
+    client = TestClient(main.app)
+    assert client.get("/jobs/job12345").json()["status"] == "done"
+    # SSE stream of a finished job: the snapshot, then the stream closes
+    body = client.get("/jobs/job12345/events").text
+    assert body.startswith("event: snapshot") and '"status": "done"' in body
+    assert client.get("/jobs/nope").status_code == 404
+
+
+FAKE_DECODER = """#!{python}
+import os, struct, sys
+if "-progress" in sys.argv:
+    fd = int(sys.argv[sys.argv.index("-progress") + 1].split(":")[1])
+    os.write(fd, b"out_time_us=2000000\\nprogress=end\\n")
+pcm = struct.pack("<4000h", *([16384, -16384] * 2000))
+# odd-sized writes: samples get split across the blocks the reader sees
+for i in range(0, len(pcm), 333):
+    sys.stdout.buffer.write(pcm[i : i + 333])
+    sys.stdout.buffer.flush()
+"""
+
+
+def test_pcm_decode_streams_through_the_progress_runner(tmp_path, monkeypatch):
+    from app import audio
+
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_DECODER.format(python=sys.executable))
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(progress, "STDOUT_BLOCK", 1000)
+
+    seen = []
+    orig_publish = progress.publish
+    monkeypatch.setattr(progress, "publish", lambda ev: (seen.append(dict(ev)), orig_publish(ev)))
+    token = progress.start_job("job67890", "https://www.youtube.com/watch?v=job67890")
+    progress.set_stage("prescore")
+    samples = audio.decode_pcm("in.mp4", max_seconds=0.25)
+    progress.finish_job(token)
+
+    assert len(samples) == 4000
+    assert samples[:4].tolist() == [0.5, -0.5, 0.5, -0.5]
+    assert any(e["type"] == "encode" and e["stage"] == "prescore" for e in seen)
@@ -0,0 +1,25 @@
+import threading
+
+from app import scheduler
+
+
+def test_stages_run_in_their_pool():
+    cpu_name = scheduler.run_stage(scheduler.CPU, lambda: threading.current_thread().name)
+    io_name = scheduler.run_stage(scheduler.IO, lambda: threading.current_thread().name)
+    assert cpu_name.startswith("cpu-pool")
+    assert io_name.startswith("io-pool")
+
+
+def test_job_waits_for_admission(monkeypatch):
+    checks = {"n": 0}
+
+    def fake_free_disk(path=None):
+        checks["n"] += 1
+        # first check reports a full disk, then space frees up
+        return 0 if checks["n"] == 1 else 10 ** 9
+
+    monkeypatch.setattr(scheduler, "free_disk_mb", fake_free_disk)
+    monkeypatch.setattr(scheduler, "ADMISSION_POLL_SECONDS", 0.01)
+    fut = scheduler.submit_job(lambda x: x * 2, 21)
+    assert fut.result(timeout=5) == 42
+    assert checks["n"] >= 2
@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+# cold-start budget for `import app.main` (seconds); override on slow CI hosts
+IMPORT_BUDGET = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+# heavy dependencies that must only be imported at first use
+LAZY_MODULES = ["google_auth_oauthlib", "telegram", "pydub", "numpy", "httpx", "requests", "yt_dlp"]
+
+SNIPPET = """
+import json, sys, time
+t = time.perf_counter()
+import app.main
+print(json.dumps({"seconds": time.perf_counter() - t, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def test_cold_import_is_lazy_and_within_budget():
+    # fresh interpreter: nothing cached in sys.modules
+    out = subprocess.run([sys.executable, "-c", SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True)
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    assert res["loaded"] == []
+    assert res["seconds"] < IMPORT_BUDGET, f"import app.main took {res['seconds']:.2f}s (budget {IMPORT_BUDGET}s)"
+
+
+def test_warm_workers_preloads_stage_modules():
+    from app import process, scheduler
+
+    process.warm_workers()
+    assert "app.censor" in sys.modules and "pydub" in sys.modules
+    assert scheduler.stats()["queued"] == 0
@@ -0,0 +1,34 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app import main, transcript_index
+
+
+def test_index_search_and_endpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(transcript_index, "DB_PATH", str(tmp_path / "transcripts.db"))
+    job = tmp_path / "job"
+    job.mkdir()
+    (job / "input.info.json").write_text(json.dumps({"channel_id": "UCa", "channel": "Kanal A", "title": "Vlog", "duration": 600}))
+    segments = [
+        {"start": 0.0, "end": 4.0, "text": "Halo semuanya"},
+        {"start": 4.0, "end": 9.5, "text": "ini momen paling lucu di perjalanan"},
+        {"start": 9.5, "end": 12.0, "text": "  "},
+    ]
+    assert transcript_index.index_job("vidA0000001", segments, str(job), url="https://youtu.be/vidA0000001") == 2
+    transcript_index.add_transcript("vidB0000001", [{"start": 30, "end": 33, "text": "Lucu banget!"}], channel_id="UCb")
+    # re-indexing replaces the old rows
+    transcript_index.add_transcript("vidB0000001", [{"start": 60, "end": 62, "text": "sangat lucu"}], channel_id="UCb")
+
+    hits = transcript_index.search("lucu")
+    assert sorted((h["video_id"], h["start"]) for h in hits) == [("vidA0000001", 4.0), ("vidB0000001", 60.0)]
+    assert [h["title"] for h in transcript_index.search("lucu", channel_id="UCa")] == ["Vlog"]
+    # stray FTS syntax falls back to a plain word search
+    assert transcript_index.search('momen "lucu') and transcript_index.search("") == []
+
+    client = TestClient(main.app)
+    r = client.get("/transcripts/search", params={"q": "perjalanan"}).json()
+    assert r["results"][0]["url"].endswith("v=vidA0000001&t=4s") and "[perjalanan]" in r["results"][0]["snippet"]
+    r = client.get("/transcripts/vidA0000001", params={"start": 5}).json()
+    assert r["video"]["channel"] == "Kanal A" and [s["start"] for s in r["segments"]] == [4.0]
+    assert client.get("/transcripts/unknown").status_code == 404
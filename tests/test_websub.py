@@ -0,0 +1,139 @@
+import hashlib
+import hmac
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, process, storage, websub, youtube_monitor
+
+CHANNEL = "UCabcdefghijklmnopqrstuv"
+
+ATOM = """<?xml version='1.0' encoding='UTF-8'?>
+<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>yt:video:{vid}</id>
+    <yt:videoId>{vid}</yt:videoId>
+    <yt:channelId>{channel}</yt:channelId>
+    <title>Video baru</title>
+    <published>{published}</published>
+    <updated>{published}</updated>
+  </entry>
+</feed>"""
+
+
+class StandInHub:
+    """Local stand-in for the WebSub hub: verifies intent against our callback and publishes."""
+
+    def __init__(self, client):
+        self.client = client
+        self.secrets = {}
+
+    def post(self, url, data=None, timeout=None):
+        # async verification: call back with a challenge, the subscriber must echo it
+        challenge = "chal-" + data["hub.topic"][-6:]
+        r = self.client.get("/websub/callback", params={
+            "hub.mode": data["hub.mode"],
+            "hub.topic": data["hub.topic"],
+            "hub.challenge": challenge,
+            "hub.lease_seconds": data["hub.lease_seconds"],
+        })
+        assert r.status_code == 200 and r.text == challenge
+        self.secrets[data["hub.topic"]] = data.get("hub.secret")
+        return httpx.Response(202)
+
+    def publish(self, topic, body, secret=None):
+        secret = secret or self.secrets[topic]
+        sig = "sha1=" + hmac.new(secret.encode(), body, hashlib.sha1).hexdigest()
+        return self.client.post("/websub/callback", content=body, headers={"X-Hub-Signature": sig})
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    for name in ("STATE_FILE", "SEEN_FILE", "WEBSUB_FILE"):
+        monkeypatch.setattr(storage, name, str(tmp_path / f"{name}.json"))
+    monkeypatch.setattr(websub, "WEBSUB_CALLBACK_URL", "http://testserver/websub/callback")
+    monkeypatch.setattr(websub, "WEBSUB_SECRET", "s3cret")
+    stand_in = StandInHub(TestClient(main.app))
+    monkeypatch.setattr(httpx, "post", stand_in.post)
+    return stand_in
+
+
+def _atom(vid, published=None):
+    published = published or time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+    return ATOM.format(vid=vid, channel=CHANNEL, published=published).encode()
+
+
+def test_subscribe_verify_and_deduplicated_enqueue(hub, monkeypatch):
+    queued = []
+    monkeypatch.setattr(process, "submit_video", lambda url, **kw: queued.append(url))
+
+    assert websub.subscribe(CHANNEL)
+    sub = storage.get_websub_subscriptions()[CHANNEL]
+    assert sub["state"] == "active" and sub["expires"] > time.time()
+
+    topic = websub.topic_for(CHANNEL)
+    assert hub.publish(topic, _atom("vid000000001")).status_code == 204
+    # redelivery of the same entry and a forged notification are both ignored
+    hub.publish(topic, _atom("vid000000001"))
+    hub.publish(topic, _atom("vid000000002"), secret="wrong")
+    # edits of an old upload are ignored too
+    hub.publish(topic, _atom("vid000000003", published="2015-01-01T00:00:00+00:00"))
+    assert queued == ["https://www.youtube.com/watch?v=vid000000001"]
+    # the poll's pointer is left to polling
+    assert storage.get_last_video_for_channel(CHANNEL) is None
+
+
+def test_poll_finds_upload_whose_notification_was_lost(hub, monkeypatch):
+    queued = []
+    monkeypatch.setattr(process, "submit_video", lambda url, **kw: queued.append(url))
+    playlist = ["vidOLD000001"]
+
+    class Resp:
+        status_code = 200
+
+        def json(self):
+            return {"items": [{"contentDetails": {"videoId": v}} for v in playlist]}
+
+    monkeypatch.setattr(youtube_monitor, "_get", lambda endpoint, account_id, params: Resp())
+    assert youtube_monitor.new_uploads(CHANNEL, "acct") == ["vidOLD000001"]
+
+    # upload A's notification is lost, upload B's arrives
+    playlist[:0] = ["vidB00000001", "vidA00000001"]
+    websub.subscribe(CHANNEL)
+    hub.publish(websub.topic_for(CHANNEL), _atom("vidB00000001"))
+    assert queued == ["https://www.youtube.com/watch?v=vidB00000001"]
+    # reconciliation still finds A; B is not enqueued twice
+    assert youtube_monitor.new_uploads(CHANNEL, "acct") == ["vidA00000001"]
+    assert storage.get_last_video_for_channel(CHANNEL) == "vidB00000001"
+
+
+def test_unknown_topic_is_not_verified_and_leases_renew(hub):
+    client = hub.client
+    r = client.get("/websub/callback", params={
+        "hub.mode": "subscribe", "hub.topic": websub.topic_for("UCunknown"), "hub.challenge": "x",
+    })
+    assert r.status_code == 404
+
+    websub.subscribe(CHANNEL)
+    expires = storage.get_websub_subscriptions()[CHANNEL]["expires"]
+    assert websub.renew_due(now=time.time()) == []
+    # leases of channels in another instance's shards are left to it
+    assert websub.renew_due(now=expires - 60, owned=lambda cid: cid != CHANNEL) == []
+    assert websub.renew_due(now=expires - 60) == [CHANNEL]
+
+
+def test_only_requested_unsubscribes_are_confirmed(hub):
+    client = hub.client
+    websub.subscribe(CHANNEL)
+    # an unsubscribe nobody asked for (e.g. forged at the hub by a third party) is refused
+    r = client.get("/websub/callback", params={
+        "hub.mode": "unsubscribe", "hub.topic": websub.topic_for(CHANNEL), "hub.challenge": "x",
+    })
+    assert r.status_code == 404
+    assert storage.get_websub_subscriptions()[CHANNEL]["state"] == "active"
+
+    # our own request is confirmed (the stand-in hub asserts the echo) and the lease dropped
+    assert websub.subscribe(CHANNEL, mode="unsubscribe")
+    assert CHANNEL not in storage.get_websub_subscriptions()